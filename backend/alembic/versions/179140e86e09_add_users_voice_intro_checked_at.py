@@ -0,0 +1,30 @@
+"""add voice_intro_checked_at to users
+
+Revision ID: 179140e86e09
+Revises: 1e8e3b094970
+Create Date: 2026-10-17 13:52:18.640127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '179140e86e09'
+down_revision: Union[str, Sequence[str], None] = '1e8e3b094970'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("voice_intro_checked_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.drop_column("voice_intro_checked_at")
@@ -0,0 +1,47 @@
+"""add denormalized verification status to users
+
+Revision ID: 1e8e3b094970
+Revises: 7d4f2a9c1e06
+Create Date: 2026-10-17 13:31:42.508213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1e8e3b094970'
+down_revision: Union[str, Sequence[str], None] = '7d4f2a9c1e06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("verification_status", sa.String(length=50), server_default="none", nullable=False))
+        batch_op.add_column(sa.Column("verification_rejection_reason", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("verification_instruction", sa.String(), nullable=True))
+
+    # Backfill desde la verificación más reciente (mayor id) de cada usuario
+    latest = (
+        "(SELECT v.{col} FROM user_verifications v "
+        "WHERE v.user_id = users.id ORDER BY v.id DESC LIMIT 1)"
+    )
+    op.execute(
+        "UPDATE users SET "
+        f"verification_status = {latest.format(col='status')}, "
+        f"verification_rejection_reason = {latest.format(col='rejection_reason')}, "
+        f"verification_instruction = {latest.format(col='instruction')} "
+        "WHERE EXISTS (SELECT 1 FROM user_verifications v WHERE v.user_id = users.id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.drop_column("verification_instruction")
+        batch_op.drop_column("verification_rejection_reason")
+        batch_op.drop_column("verification_status")
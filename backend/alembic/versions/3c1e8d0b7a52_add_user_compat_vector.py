@@ -0,0 +1,80 @@
+"""add compat vector to user_compat
+
+Revision ID: 3c1e8d0b7a52
+Revises: 589b754608f7
+Create Date: 2026-10-17 12:02:19.884310
+
+"""
+from typing import Sequence, Union
+import hashlib
+import json
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+# Copia congelada de app/services/compat_scoring.py (encode_answers/to_bytes, 64 dims) al crear esta migración: no se importa app/
+# para que el backfill no cambie si ese módulo cambia después.
+_COMPAT_VECTOR_DIM = 64
+
+
+def _bucket(token: str) -> tuple:
+    h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+    return h % _COMPAT_VECTOR_DIM, (1.0 if (h >> 63) & 1 == 0 else -1.0)
+
+
+def _encode_answers(answers):
+    vec = np.zeros(_COMPAT_VECTOR_DIM, dtype=np.float32)
+    for question, value in (answers or {}).items():
+        options = value if isinstance(value, (list, tuple, set)) else [value]
+        options = [str(o).strip().lower() for o in options if o is not None and str(o).strip()]
+        if not options:
+            continue
+        weight = 1.0 / np.sqrt(len(options))
+        for opt in options:
+            pos, sign = _bucket(f"{str(question).strip().lower()}={opt}")
+            vec[pos] += sign * weight
+
+    norm = float(np.linalg.norm(vec))
+    if norm == 0.0:
+        return None
+    return vec / norm
+
+
+def _to_bytes(vec) -> bytes:
+    return np.asarray(vec, dtype="<f4").tobytes()
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1e8d0b7a52'
+down_revision: Union[str, Sequence[str], None] = '589b754608f7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("user_compat", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("vector", sa.LargeBinary(), nullable=True))
+
+    # Backfill desde las respuestas ya guardadas
+    bind = op.get_bind()
+    rows = bind.execute(sa.text("SELECT id, answers FROM user_compat")).fetchall()
+    for compat_id, answers in rows:
+        if isinstance(answers, str):
+            try:
+                answers = json.loads(answers)
+            except ValueError:
+                continue
+        vec = _encode_answers(answers if isinstance(answers, dict) else None)
+        if vec is not None:
+            bind.execute(
+                sa.text("UPDATE user_compat SET vector = :v WHERE id = :id"),
+                {"v": _to_bytes(vec), "id": compat_id},
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("user_compat", schema=None) as batch_op:
+        batch_op.drop_column("vector")
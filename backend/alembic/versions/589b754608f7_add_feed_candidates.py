@@ -0,0 +1,38 @@
+"""add feed_candidates table for precomputed feed
+
+Revision ID: 589b754608f7
+Revises: 628338561eb6
+Create Date: 2026-10-17 11:20:47.530916
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '589b754608f7'
+down_revision: Union[str, Sequence[str], None] = '628338561eb6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('feed_candidates',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('candidate_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['candidate_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'candidate_id')
+    )
+    op.create_index('idx_feed_candidate_user_score', 'feed_candidates', ['user_id', 'score', 'candidate_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_feed_candidate_user_score', table_name='feed_candidates')
+    op.drop_table('feed_candidates')
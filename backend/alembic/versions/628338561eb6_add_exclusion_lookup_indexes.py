@@ -0,0 +1,30 @@
+"""add exclusion lookup indexes on reports and blocks
+
+Revision ID: 628338561eb6
+Revises: a9ff2bad4288
+Create Date: 2026-10-17 10:03:11.402518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '628338561eb6'
+down_revision: Union[str, Sequence[str], None] = 'a9ff2bad4288'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("idx_report_reporter_reported", "reports", ["reporter_id", "reported_id"], unique=False)
+    op.create_index("idx_block_blocked_blocker", "blocks", ["blocked_id", "blocker_id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("idx_block_blocked_blocker", table_name="blocks")
+    op.drop_index("idx_report_reporter_reported", table_name="reports")
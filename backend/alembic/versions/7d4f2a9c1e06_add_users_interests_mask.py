@@ -0,0 +1,102 @@
+"""add interests bitset to users
+
+Revision ID: 7d4f2a9c1e06
+Revises: 3c1e8d0b7a52
+Create Date: 2026-10-17 12:41:05.216734
+
+"""
+from typing import Sequence, Union
+import json
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+# Copia congelada de app/interests.py (INTERESTS/interests_to_mask) al crear esta migración: no se importa app/
+# para que el backfill no cambie si ese módulo cambia después.
+_INTERESTS = [
+    "templo",
+    "misionero",
+    "genealogia",
+    "noche de hogar",
+    "servicio",
+    "escrituras",
+    "instituto",
+    "coro",
+    "himnos",
+    "conferencia general",
+    "actividades de barrio",
+    "baile",
+    "cocina",
+    "deporte",
+    "naturaleza",
+    "cine",
+    "musica",
+    "lectura",
+    "tecnologia",
+    "arte",
+    "viajes",
+    "fotografia",
+    "idiomas",
+    "juegos de mesa",
+    "camping",
+    "senderismo",
+    "ciclismo",
+    "mascotas",
+    "voluntariado",
+    "teatro",
+]
+_INTEREST_BITS = {name: i for i, name in enumerate(_INTERESTS)}
+_NON_LETTERS = re.compile(r"[^a-z0-9 ]+")
+_SPACES = re.compile(r"\s+")
+
+
+def _normalize_interest(value: str) -> str:
+    text = unicodedata.normalize("NFKD", str(value)).encode("ascii", "ignore").decode("ascii")
+    text = _NON_LETTERS.sub(" ", text.lower())
+    return _SPACES.sub(" ", text).strip()
+
+
+def _interests_to_mask(interests) -> int:
+    mask = 0
+    for value in interests or []:
+        bit = _INTEREST_BITS.get(_normalize_interest(value))
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d4f2a9c1e06'
+down_revision: Union[str, Sequence[str], None] = '3c1e8d0b7a52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("interests_mask", sa.BigInteger(), server_default="0", nullable=False))
+
+    # Backfill desde la lista JSON de intereses
+    bind = op.get_bind()
+    rows = bind.execute(sa.text("SELECT id, interests FROM users WHERE interests IS NOT NULL")).fetchall()
+    for user_id, interests in rows:
+        if isinstance(interests, str):
+            try:
+                interests = json.loads(interests)
+            except ValueError:
+                continue
+        mask = _interests_to_mask(interests if isinstance(interests, list) else None)
+        if mask:
+            bind.execute(
+                sa.text("UPDATE users SET interests_mask = :m WHERE id = :id"),
+                {"m": mask, "id": user_id},
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.drop_column("interests_mask")
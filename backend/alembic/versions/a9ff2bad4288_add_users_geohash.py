@@ -0,0 +1,96 @@
+"""add geohash to users
+
+Revision ID: a9ff2bad4288
+Revises: 0fbcdb5520db
+Create Date: 2026-10-17 09:12:40.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# Copia congelada de app/geo.py (encode_geohash/geohash_for, precisión 9) al crear esta migración: no se importa app/
+# para que el backfill no cambie si ese módulo cambia después.
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def _encode_geohash(lat: float, lon: float, precision: int = 9) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    ch = 0
+    even = True  # bits pares -> longitud, impares -> latitud
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = (ch << 1) | 1
+                lon_lo = mid
+            else:
+                ch = ch << 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch = ch << 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[ch])
+            bits = 0
+            ch = 0
+    return "".join(chars)
+
+
+def _geohash_for(lat, lon):
+    if lat is None or lon is None:
+        return None
+    try:
+        lat = float(lat)
+        lon = float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        return None
+    return _encode_geohash(lat, lon)
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9ff2bad4288'
+down_revision: Union[str, Sequence[str], None] = '0fbcdb5520db'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("geohash", sa.String(length=12), nullable=True))
+        batch_op.create_index(batch_op.f("ix_users_geohash"), ["geohash"], unique=False)
+
+    # Backfill para usuarios que ya tienen coordenadas
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.text("SELECT id, lat, lon FROM users WHERE lat IS NOT NULL AND lon IS NOT NULL")
+    ).fetchall()
+    for user_id, lat, lon in rows:
+        gh = _geohash_for(lat, lon)
+        if gh:
+            bind.execute(
+                sa.text("UPDATE users SET geohash = :gh WHERE id = :id"),
+                {"gh": gh, "id": user_id},
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_users_geohash"))
+        batch_op.drop_column("geohash")
@@ -0,0 +1,34 @@
+"""add row_version to users and conversations for ETags
+
+Revision ID: cee3f709a626
+Revises: d499057ba04e
+Create Date: 2026-10-17 16:05:12.418230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'cee3f709a626'
+down_revision: Union[str, Sequence[str], None] = 'd499057ba04e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("row_version", sa.Integer(), server_default="1", nullable=False))
+    with op.batch_alter_table("conversations", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("row_version", sa.Integer(), server_default="1", nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("conversations", schema=None) as batch_op:
+        batch_op.drop_column("row_version")
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.drop_column("row_version")
@@ -0,0 +1,31 @@
+"""replace messages conversation_id index with (conversation_id, id)
+
+Revision ID: d499057ba04e
+Revises: 368bdbc6c096
+Create Date: 2026-10-17 15:21:44.093517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd499057ba04e'
+down_revision: Union[str, Sequence[str], None] = '368bdbc6c096'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("idx_messages_conversation_id_id", "messages", ["conversation_id", "id"], unique=False)
+    # Prefijo del compuesto: ya no hace falta
+    op.drop_index("ix_messages_conversation_id", table_name="messages")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index("ix_messages_conversation_id", "messages", ["conversation_id"], unique=False)
+    op.drop_index("idx_messages_conversation_id_id", table_name="messages")
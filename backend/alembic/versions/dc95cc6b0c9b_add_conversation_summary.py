@@ -0,0 +1,50 @@
+"""add denormalized last message and unread counters to conversations
+
+Revision ID: dc95cc6b0c9b
+Revises: 179140e86e09
+Create Date: 2026-10-17 14:10:37.214906
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'dc95cc6b0c9b'
+down_revision: Union[str, Sequence[str], None] = '179140e86e09'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("conversations", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("last_message_id", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("last_message_at", sa.DateTime(timezone=True), nullable=True))
+        batch_op.add_column(sa.Column("unread_a", sa.Integer(), server_default="0", nullable=False))
+        batch_op.add_column(sa.Column("unread_b", sa.Integer(), server_default="0", nullable=False))
+
+    # Backfill desde messages: último mensaje (mayor id) y no leídos de cada lado
+    last_id = "(SELECT MAX(m.id) FROM messages m WHERE m.conversation_id = conversations.id)"
+    unread = (
+        "(SELECT COUNT(*) FROM messages m WHERE m.conversation_id = conversations.id "
+        "AND m.sender_id != conversations.{reader} AND m.read_at IS NULL)"
+    )
+    op.execute(
+        "UPDATE conversations SET "
+        f"last_message_id = {last_id}, "
+        f"last_message_at = (SELECT m.created_at FROM messages m WHERE m.id = {last_id}), "
+        f"unread_a = {unread.format(reader='user_a_id')}, "
+        f"unread_b = {unread.format(reader='user_b_id')}"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("conversations", schema=None) as batch_op:
+        batch_op.drop_column("unread_b")
+        batch_op.drop_column("unread_a")
+        batch_op.drop_column("last_message_at")
+        batch_op.drop_column("last_message_id")
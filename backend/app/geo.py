@@ -0,0 +1,169 @@
+import math
+from typing import List, Optional, Tuple
+
+# Alfabeto base32 estándar de geohash
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Precisión guardada en users.geohash (~4.8m x 4.8m)
+GEOHASH_PRECISION = 9
+
+# Límite de celdas por consulta: si el radio necesita más, bajamos de precisión
+MAX_COVER_CELLS = 16
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def encode_geohash(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    """
+    Codifica (lat, lon) en un geohash de `precision` caracteres.
+    Los prefijos de un geohash son celdas que lo contienen, así que un
+    rango sobre una columna indexada cubre la celda (geohash_prefix_range).
+    """
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    ch = 0
+    even = True  # bits pares -> longitud, impares -> latitud
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = (ch << 1) | 1
+                lon_lo = mid
+            else:
+                ch = ch << 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch = ch << 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[ch])
+            bits = 0
+            ch = 0
+    return "".join(chars)
+
+
+def geohash_for(lat: Optional[float], lon: Optional[float]) -> Optional[str]:
+    """Geohash para guardar en users.geohash, o None si faltan coordenadas."""
+    if lat is None or lon is None:
+        return None
+    try:
+        lat = float(lat)
+        lon = float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        return None
+    return encode_geohash(lat, lon)
+
+
+def geohash_prefix_range(prefix: str) -> Tuple[str, Optional[str]]:
+    """
+    [desde, hasta) de los geohashes que empiezan con `prefix`: `hasta` es el
+    siguiente prefijo del mismo largo en el alfabeto ("9v" -> "9w",
+    "9z" -> "b"), None si no hay (todo "z"). Solo usa caracteres del
+    alfabeto, que ordenan igual en collations no-C (Postgres) que en bytes;
+    un centinela como "{" no.
+    """
+    chars = list(prefix)
+    while chars:
+        i = _BASE32.index(chars[-1])
+        if i + 1 < len(_BASE32):
+            chars[-1] = _BASE32[i + 1]
+            return prefix, "".join(chars)
+        chars.pop()
+    return prefix, None
+
+
+def sync_user_geohash(user) -> None:
+    """Recalcula user.geohash a partir de user.lat/user.lon."""
+    user.geohash = geohash_for(user.lat, user.lon)
+
+
+def _cell_size_deg(precision: int):
+    """(alto, ancho) en grados de una celda geohash de `precision` caracteres."""
+    total_bits = precision * 5
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def bounding_box(lat: float, lon: float, radius_km: float):
+    """(min_lat, max_lat, min_lon, max_lon) que contiene el círculo de radio `radius_km`."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat = max(-90.0, lat - dlat)
+    max_lat = min(90.0, lat + dlat)
+
+    # Cerca de los polos el círculo cubre todas las longitudes
+    max_abs_lat = max(abs(min_lat), abs(max_lat))
+    if max_abs_lat >= 89.9:
+        return min_lat, max_lat, -180.0, 180.0
+    dlon = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(max_abs_lat))))
+    if dlon >= 180.0:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, lon - dlon, lon + dlon
+
+
+def _cells_in_box(min_lat, max_lat, min_lon, max_lon, precision) -> List[str]:
+    cell_h, cell_w = _cell_size_deg(precision)
+    cells = []
+    seen = set()
+
+    lat = min_lat
+    while True:
+        lon = min_lon
+        while True:
+            # Normaliza la longitud para cruzar el antimeridiano
+            wrapped = ((lon + 180.0) % 360.0) - 180.0
+            gh = encode_geohash(min(lat, 90.0 - 1e-9), wrapped, precision)
+            if gh not in seen:
+                seen.add(gh)
+                cells.append(gh)
+            if lon >= max_lon:
+                break
+            lon = min(lon + cell_w, max_lon)
+        if lat >= max_lat:
+            break
+        lat = min(lat + cell_h, max_lat)
+    return cells
+
+
+def covering_cells(lat: float, lon: float, radius_km: float) -> List[str]:
+    """
+    Prefijos geohash que cubren el círculo (lat, lon, radius_km).
+    Usa la precisión más fina que no exceda MAX_COVER_CELLS celdas.
+    Devuelve [] si el radio cubre prácticamente todo el planeta.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    if min_lon <= -180.0 and max_lon >= 180.0 and min_lat <= -90.0 and max_lat >= 90.0:
+        return []
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cell_h, cell_w = _cell_size_deg(precision)
+        rows = int((max_lat - min_lat) / cell_h) + 2
+        cols = int((max_lon - min_lon) / cell_w) + 2
+        if rows * cols > MAX_COVER_CELLS * 4:
+            continue
+        cells = _cells_in_box(min_lat, max_lat, min_lon, max_lon, precision)
+        if len(cells) <= MAX_COVER_CELLS:
+            return cells
+    return []
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    # all args in degrees
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2.0) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2.0) ** 2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return EARTH_RADIUS_KM * c
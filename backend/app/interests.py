@@ -0,0 +1,88 @@
+"""
+Diccionario canónico de intereses (espejo de kInterestOptions en la app) y
+su codificación como bitset de 64 bits para comparar intereses sin parsear
+el JSON de User.interests.
+
+⚠️ El orden define la posición del bit y está persistido en
+users.interests_mask: solo se agregan intereses AL FINAL, nunca se
+reordenan ni se borran (si se retira uno, se deja su lugar).
+"""
+import re
+import unicodedata
+from typing import Iterable, Optional
+
+import numpy as np
+
+INTERESTS = [
+    "templo",
+    "misionero",
+    "genealogia",
+    "noche de hogar",
+    "servicio",
+    "escrituras",
+    "instituto",
+    "coro",
+    "himnos",
+    "conferencia general",
+    "actividades de barrio",
+    "baile",
+    "cocina",
+    "deporte",
+    "naturaleza",
+    "cine",
+    "musica",
+    "lectura",
+    "tecnologia",
+    "arte",
+    "viajes",
+    "fotografia",
+    "idiomas",
+    "juegos de mesa",
+    "camping",
+    "senderismo",
+    "ciclismo",
+    "mascotas",
+    "voluntariado",
+    "teatro",
+]
+
+MAX_INTEREST_BITS = 63  # columna BigInteger con signo
+assert len(INTERESTS) <= MAX_INTEREST_BITS
+
+INTEREST_BITS = {name: i for i, name in enumerate(INTERESTS)}
+
+_NON_LETTERS = re.compile(r"[^a-z0-9 ]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_interest(value: str) -> str:
+    """'Genealogía 🌳' -> 'genealogia' (sin acentos, emojis ni mayúsculas)."""
+    text = unicodedata.normalize("NFKD", str(value)).encode("ascii", "ignore").decode("ascii")
+    text = _NON_LETTERS.sub(" ", text.lower())
+    return _SPACES.sub(" ", text).strip()
+
+
+def interests_to_mask(interests: Optional[Iterable[str]]) -> int:
+    """Bitset de los intereses conocidos; los desconocidos se ignoran."""
+    mask = 0
+    for value in interests or []:
+        bit = INTEREST_BITS.get(normalize_interest(value))
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
+def sync_user_interests_mask(user) -> None:
+    """Recalcula user.interests_mask desde user.interests (antes del commit)."""
+    user.interests_mask = interests_to_mask(user.interests)
+
+
+_POPCOUNT_LUT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount64(values: np.ndarray) -> np.ndarray:
+    """Bits encendidos por elemento de un array uint64/int64 (vectorizado)."""
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):  # numpy >= 2.0
+        return np.bitwise_count(values).astype(np.int64)
+    return _POPCOUNT_LUT[values.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.int64)
@@ -6,8 +6,11 @@ from datetime import datetime, timedelta
 import structlog
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 import pytz
 
+from .feed_precompute import run_feed_precompute_job, FEED_PRECOMPUTE_INTERVAL_MINUTES
+
 logger = structlog.get_logger("backup_scheduler")
 
 # Configuration
@@ -93,6 +96,18 @@ def setup_scheduler(app=None):
         replace_existing=True
     )
     
+    # Feed precalculado (feed_candidates) para usuarios activos
+    if os.getenv("FEED_PRECOMPUTE_ENABLED", "1") == "1":
+        scheduler.add_job(
+            run_feed_precompute_job,
+            trigger=IntervalTrigger(minutes=FEED_PRECOMPUTE_INTERVAL_MINUTES),
+            id="feed_precompute",
+            name="Precompute ranked feed candidates",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+
     scheduler.start()
     logger.info("scheduler_started", timezone=TIMEZONE, schedule="02:00 daily")
 
@@ -0,0 +1,80 @@
+import time
+
+import structlog
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.orm.attributes import flag_modified
+
+from ..database import SessionLocal
+from .. import models
+
+logger = structlog.get_logger("conversation_summary_check")
+
+
+def _unread_for(reader_id_column):
+    return func.sum(case(
+        (and_(models.Message.sender_id != reader_id_column, models.Message.read_at == None), 1),
+        else_=0
+    ))
+
+
+def run_conversation_summary_check_job(fix: bool = False, sample: int = 20) -> dict:
+    """
+    Compara el resumen denormalizado de cada conversación (last_message_id,
+    last_message_at, unread_a, unread_b) contra lo que dice la tabla
+    messages, en una sola consulta agregada. Con fix=True reescribe las que
+    no cuadren. Devuelve conteos y hasta `sample` ids inconsistentes.
+    """
+    started = time.perf_counter()
+    Conv = models.Conversation
+    actual = (
+        select(
+            models.Message.conversation_id.label("conversation_id"),
+            func.max(models.Message.id).label("last_id"),
+            _unread_for(Conv.user_a_id).label("unread_a"),
+            _unread_for(Conv.user_b_id).label("unread_b"),
+        )
+        .join(Conv, Conv.id == models.Message.conversation_id)
+        .group_by(models.Message.conversation_id)
+        .subquery()
+    )
+    last_msg = models.Message.__table__.alias("last_msg")
+
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(Conv, actual.c.last_id, last_msg.c.created_at, actual.c.unread_a, actual.c.unread_b)
+            .outerjoin(actual, actual.c.conversation_id == Conv.id)
+            .outerjoin(last_msg, last_msg.c.id == actual.c.last_id)
+            .all()
+        )
+
+        bad = []
+        for conv, last_id, last_at, unread_a, unread_b in rows:
+            expected = (last_id, last_at, unread_a or 0, unread_b or 0)
+            if (conv.last_message_id, conv.last_message_at, conv.unread_a, conv.unread_b) == expected:
+                continue
+            bad.append(conv.id)
+            if fix:
+                conv.last_message_id, conv.last_message_at, conv.unread_a, conv.unread_b = expected
+                # Corregir no reordena la bandeja (sin esto aplica onupdate)
+                flag_modified(conv, "updated_at")
+
+        if fix and bad:
+            db.commit()
+        else:
+            db.rollback()
+
+        stats = {
+            "checked": len(rows),
+            "inconsistent": len(bad),
+            "sample": bad[:sample],
+            "fixed": fix,
+        }
+        logger.info(
+            "conversation_summary_check_done",
+            ms=f"{(time.perf_counter() - started) * 1000:.2f}",
+            checked=stats["checked"], inconsistent=stats["inconsistent"], fixed=fix,
+        )
+        return stats
+    finally:
+        db.close()
@@ -0,0 +1,79 @@
+import os
+import time
+from datetime import timedelta
+
+import structlog
+from sqlalchemy import exists
+
+from ..database import SessionLocal
+from .. import models
+from ..security import utcnow
+
+logger = structlog.get_logger("feed_precompute")
+
+# Configuration
+FEED_PRECOMPUTE_INTERVAL_MINUTES = int(os.getenv("FEED_PRECOMPUTE_INTERVAL_MINUTES", "30"))
+# Rankings de usuarios sin actividad en estos días se borran
+FEED_PRECOMPUTE_ACTIVE_DAYS = int(os.getenv("FEED_PRECOMPUTE_ACTIVE_DAYS", "14"))
+# Solo se recalcula a quien entró en estas horas, hasta MAX_USERS por corrida
+# (los más recientes primero): cada usuario cuesta un rank sobre todo el índice
+FEED_PRECOMPUTE_ACTIVE_HOURS = int(os.getenv("FEED_PRECOMPUTE_ACTIVE_HOURS", "48"))
+FEED_PRECOMPUTE_MAX_USERS = int(os.getenv("FEED_PRECOMPUTE_MAX_USERS", "2000"))
+
+
+def run_feed_precompute_job():
+    """
+    Recalcula feed_candidates para los usuarios recientes (last_seen dentro de
+    FEED_PRECOMPUTE_ACTIVE_HOURS, hasta FEED_PRECOMPUTE_MAX_USERS por corrida)
+    cuyo ranking tenga más de un intervalo (los que ya se recalcularon al
+    editar perfil o quiz se saltan), y borra rankings de usuarios inactivos
+    por FEED_PRECOMPUTE_ACTIVE_DAYS. Quien no tiene ranking usa el feed en
+    vivo (ver _fetch_page en routes/matches.py).
+    """
+    # Import diferido: routes.matches importa routes.users
+    from ..routes.matches import recompute_user_feed
+
+    started = time.perf_counter()
+    now = utcnow()
+    cutoff = now - timedelta(days=FEED_PRECOMPUTE_ACTIVE_DAYS)
+    # Recalculado hace menos de medio intervalo (al editar perfil/quiz): se salta
+    fresh_ranking = exists().where(
+        models.FeedCandidate.user_id == models.User.id,
+        models.FeedCandidate.computed_at >= now - timedelta(minutes=FEED_PRECOMPUTE_INTERVAL_MINUTES / 2),
+    )
+    db = SessionLocal()
+    users_done = 0
+    rows = 0
+    try:
+        active = (
+            db.query(models.User)
+            .filter(models.User.last_seen >= now - timedelta(hours=FEED_PRECOMPUTE_ACTIVE_HOURS), ~fresh_ranking)
+            .order_by(models.User.last_seen.desc())
+            .limit(FEED_PRECOMPUTE_MAX_USERS)
+            .all()
+        )
+        for user in active:
+            try:
+                rows += recompute_user_feed(db, user)
+                users_done += 1
+            except Exception as e:
+                db.rollback()
+                logger.error("feed_precompute_user_failed", user_id=user.id, error=str(e))
+
+        # Rankings viejos de usuarios que dejaron de estar activos
+        pruned = db.query(models.FeedCandidate).filter(
+            models.FeedCandidate.computed_at < cutoff
+        ).delete(synchronize_session=False)
+        db.commit()
+
+        logger.info(
+            "feed_precompute_done",
+            users=users_done,
+            rows=rows,
+            pruned=pruned,
+            ms=f"{(time.perf_counter() - started) * 1000:.2f}",
+        )
+    except Exception as e:
+        logger.error("feed_precompute_job_error", error=str(e))
+    finally:
+        db.close()
@@ -0,0 +1,55 @@
+import time
+
+import structlog
+
+from ..database import SessionLocal
+from .. import models
+from ..security import utcnow
+from ..services.r2_client import iter_object_keys
+from ..services.voice_intro import parse_voice_intro_key, pick_voice_intro_key
+
+logger = structlog.get_logger("voice_intro_backfill")
+
+
+def run_voice_intro_backfill_job(dry_run: bool = False) -> dict:
+    """
+    Reparación en bloque de voice_intro_key: lista una sola vez (paginado)
+    el prefijo users/ del bucket, asigna la key a quien tenga audio en R2 y
+    no en BD, y marca voice_intro_checked_at a todos los revisados para que
+    GET /users/me no vuelva a consultar R2 por ellos.
+    Si el listado falla no se toca la BD.
+    """
+    started = time.perf_counter()
+    found = {}
+    for key in iter_object_keys("users/"):
+        parsed = parse_voice_intro_key(key)
+        if parsed:
+            found.setdefault(parsed[0], []).append(key)
+
+    db = SessionLocal()
+    try:
+        now = utcnow()
+        missing = db.query(models.User).filter(models.User.voice_intro_key == None).all()
+        repaired = 0
+        for user in missing:
+            key = pick_voice_intro_key(found.get(user.id, []))
+            if key:
+                user.voice_intro_key = key
+                repaired += 1
+            user.voice_intro_checked_at = now
+
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+
+        stats = {
+            "objects": sum(len(v) for v in found.values()),
+            "checked": len(missing),
+            "repaired": repaired,
+            "dry_run": dry_run,
+        }
+        logger.info("voice_intro_backfill_done", ms=f"{(time.perf_counter() - started) * 1000:.2f}", **stats)
+        return stats
+    finally:
+        db.close()
@@ -22,6 +22,9 @@ from .limiter import limiter
 from .middleware import SecurityHeadersMiddleware
 from .config import validate_config
 from .jobs.backup_scheduler import setup_scheduler
+from .services.candidate_index import candidate_index
+from .services.chat_events import start_chat_events, stop_chat_events
+from .services.chat_changes import prune_chat_changes
 
 # ✅ Base del proyecto (carpeta donde está /app)
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -72,7 +75,13 @@ async def daily_cleanup_job():
                 
                 db.commit()
                 if deleted > 0:
+                    candidate_index.invalidate()
                     logger.info(f"[JOB] Limpieza automática completada: {deleted} usuarios eliminados.")
+
+                # Cambios de chat más viejos que la retención (GET /chats/changes)
+                pruned = prune_chat_changes(db)
+                if pruned > 0:
+                    logger.info(f"[JOB] chat_changes purgados: {pruned}")
         except Exception as e:
             logger.error(f"[JOB] Error en limpieza automática: {e}")
         
@@ -188,6 +197,9 @@ def create_app() -> FastAPI:
         # Configurar y arrancar el scheduler de backups
         app.state.scheduler = setup_scheduler(app)
 
+        # Broker de eventos de chat (/chats/ws)
+        await start_chat_events()
+
     # ✅ Security Headers
     app.add_middleware(SecurityHeadersMiddleware)
 
@@ -201,6 +213,7 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "X-Chat-Cursor", "ETag"],
     )
 
     # ✅ Middleware logging + catch 500 (Structlog)
@@ -320,6 +333,7 @@ def create_app() -> FastAPI:
     @app.on_event("shutdown")
     async def shutdown_event():
         logger.info("app_shutdown_start")
+        await stop_chat_events()
         if hasattr(app.state, "scheduler"):
             logger.info("scheduler_shutdown_start")
             app.state.scheduler.shutdown()
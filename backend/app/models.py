@@ -1,19 +1,21 @@
 from sqlalchemy import (
     Column,
     Integer,
+    BigInteger,
     String,
     Date,
     DateTime,
     Enum,
     Boolean,
     Float,
+    LargeBinary,
     ForeignKey,
     func,
     UniqueConstraint,
     Index,
+    literal_column,
 )
 from sqlalchemy.orm import relationship, backref
-from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.types import JSON  # ✅ para guardar respuestas como dict/list
 
 from .database import Base
@@ -38,6 +40,8 @@ class User(Base):
     stake = Column(String(255), nullable=True)  # “estaca” opcional
     lat = Column(Float, nullable=True)
     lon = Column(Float, nullable=True)
+    # Celda geohash de (lat, lon) para prefiltrar por distancia con índice (ver app/geo.py)
+    geohash = Column(String(12), nullable=True, index=True)
 
     bio = Column(String, nullable=True)
     wants_adjacent_bucket = Column(Boolean, default=False, nullable=False)
@@ -51,6 +55,8 @@ class User(Base):
     education = Column(String(255), nullable=True)
     occupation = Column(String(255), nullable=True)
     interests = Column(JSON, nullable=False, default=list) # ✅ Lista de intereses
+    # Bitset de intereses canónicos (ver app/interests.py), mantenido en update_me
+    interests_mask = Column(BigInteger, nullable=False, default=0, server_default="0")
 
     mission_served = Column(String(255), nullable=True)
     mission_years = Column(String(50), nullable=True)
@@ -88,8 +94,20 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     # ✅ recomendado: que tenga default al crear y update automático
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    # Contador de escrituras (+1 en cada UPDATE, también los masivos): versión
+    # para ETags; updated_at en SQLite solo tiene resolución de segundos
+    row_version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=literal_column("row_version + 1"))
     last_seen = Column(DateTime(timezone=True), nullable=True)
     voice_intro_key = Column(String(255), nullable=True, index=True)
+    # Última vez que se buscó en R2 un voice intro sin key en BD (ver services/voice_intro.py)
+    voice_intro_checked_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Estado de la verificación más reciente (copia de user_verifications,
+    # mantenida por sync_verification_status en la misma transacción)
+    # 'none' | 'pending_upload' | 'pending_review' | 'approved' | 'rejected'
+    verification_status = Column(String(50), nullable=False, default="none", server_default="none")
+    verification_rejection_reason = Column(String, nullable=True)
+    verification_instruction = Column(String, nullable=True)
 
     # Relación 1 a 1 con compat
     compat = relationship(
@@ -100,19 +118,6 @@ class User(Base):
         uselist=False,
     )
 
-    @hybrid_property
-    def verification_status(self) -> str:
-        """
-        Calcula el estado de verificación basado en la solicitud más reciente.
-        'none' | 'pending_upload' | 'pending_review' | 'approved' | 'rejected'
-        """
-        if not self.verifications:
-            return "none"
-        
-        # Obtener la más reciente por ID
-        latest = sorted(self.verifications, key=lambda v: v.id, reverse=True)[0]
-        return latest.status
-
     # Relación con verifications
     verifications = relationship("UserVerification", back_populates="user", cascade="all, delete-orphan")
 
@@ -133,6 +138,9 @@ class UserCompat(Base):
     # {"q1": 3, "q2": "introvertido", "q3": true, ...}
     answers = Column(JSON, nullable=False, default=dict)
 
+    # Vector float32 de las respuestas (services/compat_scoring.py)
+    vector = Column(LargeBinary, nullable=True)
+
     user = relationship("User", back_populates="compat")
 
 
@@ -159,6 +167,24 @@ class Match(Base):
     )
 
 
+class FeedCandidate(Base):
+    """
+    Feed precalculado: candidatos rankeados por usuario (top-N por score).
+    Lo llena el job de jobs/feed_precompute.py; /matches/suggested lo lee
+    por rango (user_id, score desc) y aplica exclusiones al leer.
+    """
+    __tablename__ = "feed_candidates"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    candidate_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    score = Column(Float, nullable=False)
+    computed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("idx_feed_candidate_user_score", "user_id", "score", "candidate_id"),
+    )
+
+
 class Conversation(Base):
     """
     Sala de chat entre dos usuarios.
@@ -174,6 +200,16 @@ class Conversation(Base):
 
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    # +1 en cada UPDATE (ver User.row_version)
+    row_version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=literal_column("row_version + 1"))
+
+    # Resumen denormalizado para la bandeja (se actualiza en send_message y
+    # mark_read, en la misma transacción que el mensaje). Sin FK a messages
+    # para no crear un ciclo conversations <-> messages.
+    last_message_id = Column(Integer, nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    unread_a = Column(Integer, nullable=False, default=0, server_default="0")  # no leídos por user_a
+    unread_b = Column(Integer, nullable=False, default=0, server_default="0")  # no leídos por user_b
 
     # Relaciones
     user_a = relationship("User", foreign_keys=[user_a_id])
@@ -191,7 +227,7 @@ class Message(Base):
     __tablename__ = "messages"
 
     id = Column(Integer, primary_key=True, index=True)
-    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False, index=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
     sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
     body = Column(String(1000), nullable=False)  # Max 1000 chars
@@ -202,6 +238,36 @@ class Message(Base):
     conversation = relationship("Conversation", back_populates="messages")
     sender = relationship("User", foreign_keys=[sender_id])
 
+    # Paginación keyset por conversación (before_id / after_id) sin ordenar;
+    # también cubre las búsquedas solo por conversation_id
+    __table_args__ = (
+        Index("idx_messages_conversation_id_id", "conversation_id", "id"),
+    )
+
+
+class ChatChange(Base):
+    """
+    Registro de cambios de chat por destinatario (GET /chats/changes).
+    `id` es el cursor: crece monótonamente (AUTOINCREMENT en SQLite, no
+    reutiliza ids tras la purga) y se lee por rango con (user_id, id).
+    kind: conversation (creada), message, read, removed (borrada/bloqueada).
+    """
+    __tablename__ = "chat_changes"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # Sin FK: el cambio "removed" sobrevive al borrado de la conversación
+    conversation_id = Column(Integer, nullable=False)
+    kind = Column(String(20), nullable=False)
+    actor_id = Column(Integer, nullable=True)    # quién lo hizo
+    message_id = Column(Integer, nullable=True)  # message: el mensaje; read: hasta cuál (null = todos)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("idx_chat_changes_user_id", "user_id", "id"),
+        {"sqlite_autoincrement": True},
+    )
+
 
 class Report(Base):
     __tablename__ = "reports"
@@ -216,6 +282,10 @@ class Report(Base):
     reporter = relationship("User", foreign_keys=[reporter_id])
     reported = relationship("User", foreign_keys=[reported_id])
 
+    __table_args__ = (
+        Index("idx_report_reporter_reported", "reporter_id", "reported_id"),
+    )
+
 
 class Block(Base):
     __tablename__ = "blocks"
@@ -230,6 +300,8 @@ class Block(Base):
 
     __table_args__ = (
         UniqueConstraint('blocker_id', 'blocked_id', name='uq_block_active'),
+        # "¿Quién me bloqueó?" (el unique solo cubre búsquedas por blocker_id)
+        Index("idx_block_blocked_blocker", "blocked_id", "blocker_id"),
     )
 
 
@@ -8,9 +8,10 @@ from ..database import get_db, DATABASE_URL
 from ..security import utcnow
 from ..models import UserVerification, User
 from ..schemas import AdminVerificationOut, AdminRejectIn
-from ..services.r2_client import presigned_get_url
+from ..services.r2_client import presigned_get_url, signed_url_cache
 from .auth import get_current_user
 from ..review_access import is_reviewer_admin, get_dummy_admin_verifications
+from .verification import sync_verification_status
 
 router = APIRouter()
 logger = structlog.get_logger("admin")
@@ -114,6 +115,9 @@ def get_admin_stats(db: Session = Depends(get_db)):
     except Exception as e:
         stats["alembic_head_rev"] = f"error: {str(e)}"
 
+    # 2.6 Caches en memoria (por proceso)
+    stats["signed_url_cache"] = signed_url_cache.stats()
+
     # 3. Backups check
     backup_dir = os.getenv("BACKUP_DIR", "/data/backups")
     if os.path.exists(backup_dir):
@@ -252,6 +256,7 @@ def approve_verification(id: int, db: Session = Depends(get_db)):
     v.status = "approved"
     v.reviewed_at = utcnow()
     v.rejection_reason = None
+    sync_verification_status(db, v.user_id)
     
     db.commit()
     logger.info("admin_approve_verification", verification_id=id, user_id=v.user_id)
@@ -269,6 +274,7 @@ def reject_verification(id: int, body: AdminRejectIn, db: Session = Depends(get_
     v.status = "rejected"
     v.rejection_reason = body.reason
     v.reviewed_at = utcnow()
+    sync_verification_status(db, v.user_id)
     
     db.commit()
     logger.info("admin_reject_verification", verification_id=id, user_id=v.user_id, reason=body.reason)
@@ -24,6 +24,8 @@ from ..security import (
     utcnow,
 )
 from ..enums import AgeBucket
+from ..geo import sync_user_geohash
+from ..services.candidate_index import candidate_index
 from app.emailer import send_email, send_reset_password_email  # backend/app/emailer.py
 import structlog
 
@@ -230,6 +232,7 @@ def register(
     user.stake = payload.stake
     user.lat = payload.lat
     user.lon = payload.lon
+    sync_user_geohash(user)
     user.bio = payload.bio
     user.wants_adjacent_bucket = payload.wants_adjacent_bucket
     
@@ -251,6 +254,7 @@ def register(
 
     db.commit()
     db.refresh(user)
+    candidate_index.upsert(user)
 
     # 5. Enviar email en background
     background_tasks.add_task(
@@ -319,6 +323,7 @@ def verify_link(token: str, db: Session = Depends(get_db)):
     user.email_verification_token_hash = None
     user.email_verification_expires_at = None
     db.commit()
+    candidate_index.upsert(user)
 
     # Success HTML - works without JavaScript
     success_html = f"""
@@ -488,6 +493,7 @@ def verify_email(
     user.email_verification_token_hash = None
     user.email_verification_expires_at = None
     db.commit()
+    candidate_index.upsert(user)
 
     access_token = create_access_token(sub=user.id)
     refresh_token = create_refresh_token()
@@ -747,6 +753,7 @@ def consume_verify_link(payload: dict, db: Session = Depends(get_db)):
     # Opcional: Podríamos limpiarlo si quisiéramos strict one-time.
     
     db.commit()
+    candidate_index.upsert(user)
 
     return {
         "ok": True,
@@ -1,17 +1,97 @@
+import asyncio
+from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, status, Request
-from sqlalchemy.orm import Session, aliased
-from sqlalchemy import func, desc, or_, and_, exists
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Request, Response, WebSocket
+from sqlalchemy.orm import Session, aliased, load_only
+from sqlalchemy import func, desc, or_, and_, exists, case, select
+from starlette.concurrency import run_in_threadpool
 
-from ..database import get_db
+from ..database import get_db, SessionLocal
 from ..deps import get_current_user
 from .. import models, schemas
 from ..limiter import limiter, LIMIT_CHAT
+from ..utils import encode_cursor, decode_cursor, make_etag, not_modified
+from ..security import decode_token
+from ..services.chat_events import get_broker, publish_chat_event, user_channel
+from ..services.chat_changes import (
+    CHANGE_CONVERSATION,
+    CHANGE_MESSAGE,
+    CHANGE_READ,
+    cursor_expired,
+    latest_chat_cursor,
+    record_chat_change,
+)
 
 router = APIRouter()
 
+MAX_MESSAGES_PAGE = 100
+
+# Columnas del peer que usa ChatPeerOut
+CHAT_PEER_COLUMNS = (
+    models.User.id,
+    models.User.email,
+    models.User.city,
+    models.User.stake,
+    models.User.profile_photo_key,
+)
+
+
+def _inbox_filters(user_id: int):
+    """(mine, block_exists, peer_id) de las conversaciones de `user_id`."""
+    # "Bloqueo activo" = existe registro en blocks donde (blocker=A and blocked=B) OR (blocker=B and blocked=A)
+    block_exists = exists().where(
+        or_(
+            and_(models.Block.blocker_id == models.Conversation.user_a_id, models.Block.blocked_id == models.Conversation.user_b_id),
+            and_(models.Block.blocker_id == models.Conversation.user_b_id, models.Block.blocked_id == models.Conversation.user_a_id)
+        )
+    )
+    mine = or_(
+        models.Conversation.user_a_id == user_id,
+        models.Conversation.user_b_id == user_id
+    )
+    peer_id = case(
+        (models.Conversation.user_a_id == user_id, models.Conversation.user_b_id),
+        else_=models.Conversation.user_a_id
+    )
+    return mine, block_exists, peer_id
+
+
+def _inbox_query(db: Session, user_id: int):
+    """
+    Filas (conversación, peer, último mensaje, mis no leídos) de las
+    conversaciones de `user_id` sin bloqueo, más recientes primero.
+    """
+    mine, block_exists, peer_id = _inbox_filters(user_id)
+    my_unread = case(
+        (models.Conversation.user_a_id == user_id, models.Conversation.unread_a),
+        else_=models.Conversation.unread_b
+    )
+    return (
+        db.query(models.Conversation, models.User, models.Message, my_unread)
+        .join(models.User, models.User.id == peer_id)
+        .outerjoin(models.Message, models.Message.id == models.Conversation.last_message_id)
+        .filter(mine, ~block_exists)
+        .options(load_only(*CHAT_PEER_COLUMNS))
+        .order_by(models.Conversation.updated_at.desc(), models.Conversation.id.desc())
+    )
+
+
+def _inbox_item(row) -> dict:
+    conv, peer, last_msg, unread = row
+    return {
+        "id": conv.id,
+        "peer": peer,
+        "last_message": last_msg,
+        "unread_count": unread or 0
+    }
+
+
 @router.get("", response_model=List[schemas.ChatListOut])
 def get_chats(
+    request: Request,
+    response: Response,
+    limit: int | None = Query(None, ge=1, le=200),
+    cursor: str | None = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
@@ -20,70 +100,246 @@ def get_chats(
     - info del otro usuario (peer)
     - último mensaje
     - contador de no leídos
+    Todo en una sola consulta sobre el resumen denormalizado de la
+    conversación (last_message_id, unread_a/unread_b): el último mensaje se
+    une por PK y no se recorre la tabla messages. Ordenado por actividad
+    (Conversation.updated_at, que se actualiza en cada mensaje) en SQL.
+    Con `limit` pagina por keyset (updated_at, id) y deja el cursor de la
+    siguiente página en el header X-Next-Cursor; sin `limit` devuelve todas.
+    ETag de (conversaciones, último mensaje, lecturas, peers): con
+    If-None-Match vigente responde 304 tras una sola consulta agregada.
+    El header X-Chat-Cursor trae el cursor para GET /chats/changes.
     """
-    # 1. Buscar conversaciones donde soy A o B
-    # 1. Buscar conversaciones donde soy A o B, Y NO hay bloqueo activo
-    # "Bloqueo activo" = existe registro en blocks donde (blocker=A and blocked=B) OR (blocker=B and blocked=A)
-    
-    block_exists = exists().where(
-        or_(
-            and_(models.Block.blocker_id == models.Conversation.user_a_id, models.Block.blocked_id == models.Conversation.user_b_id),
-            and_(models.Block.blocker_id == models.Conversation.user_b_id, models.Block.blocked_id == models.Conversation.user_a_id)
+    # Conversaciones donde soy A o B, Y NO hay bloqueo activo
+    mine, block_exists, peer_id = _inbox_filters(current_user.id)
+
+    # Sellos de versión: mensajes nuevos (max last_message_id), lecturas de
+    # cualquiera de los dos lados (contadores), conversaciones
+    # nuevas/bloqueadas (count) y cualquier escritura en conversaciones o
+    # peers (suma de row_version: sube con cada UPDATE, sin depender de la
+    # resolución de updated_at)
+    stamp = (
+        db.query(
+            func.count(models.Conversation.id),
+            func.sum(models.Conversation.row_version),
+            func.max(models.Conversation.last_message_id),
+            func.sum(models.Conversation.unread_a),
+            func.sum(models.Conversation.unread_b),
+            func.sum(models.User.row_version),
         )
+        .select_from(models.Conversation)
+        .join(models.User, models.User.id == peer_id)
+        .filter(mine, ~block_exists)
+        .one()
     )
+    cached = not_modified(request, response, make_etag(*stamp, limit, cursor))
+    if cached is not None:
+        return cached
+
+    # Antes de leer la bandeja: lo que cambie en medio llega (repetido) por delta
+    response.headers["X-Chat-Cursor"] = str(latest_chat_cursor(db))
+
+    q = _inbox_query(db, current_user.id)
+
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+            after_updated = datetime.fromisoformat(position["updated_at"])
+            after_id = int(position["id"])
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail={"detail": "Invalid cursor", "code": "INVALID_CURSOR"})
+        # Igual que /matches/confirmed: se compara contra el valor guardado
+        # (SQLite guarda texto sin microsegundos); el del cursor es respaldo
+        after_updated = func.coalesce(
+            select(models.Conversation.updated_at).where(models.Conversation.id == after_id).scalar_subquery(),
+            after_updated,
+        )
+        q = q.filter(or_(
+            models.Conversation.updated_at < after_updated,
+            and_(models.Conversation.updated_at == after_updated, models.Conversation.id < after_id),
+        ))
+
+    if limit is not None:
+        rows = q.limit(limit + 1).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1][0]
+            response.headers["X-Next-Cursor"] = encode_cursor(
+                {"updated_at": last.updated_at.isoformat(), "id": last.id}
+            )
+    else:
+        rows = q.all()
+
+    return [_inbox_item(row) for row in rows]
+
+
+@router.get("/changes", response_model=schemas.ChatChangesOut)
+def get_chat_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Cambios de chat posteriores al cursor `since` (X-Chat-Cursor de GET
+    /chats o el `cursor` de la respuesta anterior), por rango sobre el
+    índice (user_id, id) de chat_changes:
+    - conversations: estado actual de las conversaciones tocadas (como GET /chats)
+    - messages: mensajes nuevos
+    - reads: lecturas (reader_id, hasta until_message_id; null = todo)
+    - removed: conversaciones borradas o bloqueadas
+    Cuatro consultas sin importar el tamaño del delta (la del cursor
+    expirado es un MIN(id) sobre la PK). Con has_more=true se
+    vuelve a pedir con el nuevo cursor. 410 RESYNC_REQUIRED si el cursor es
+    anterior a lo purgado: recargar con GET /chats.
+    """
+    if cursor_expired(db, since):
+        raise HTTPException(
+            status_code=410,
+            detail={"detail": "Cursor expirado, recarga la bandeja", "code": "RESYNC_REQUIRED"}
+        )
 
-    convs = db.query(models.Conversation).filter(
-        or_(
-            models.Conversation.user_a_id == current_user.id,
-            models.Conversation.user_b_id == current_user.id
-        ),
-        ~block_exists
-    ).all()
-
-    results = []
-    for conv in convs:
-        # Determinar quién es el "otro"
-        if conv.user_a_id == current_user.id:
-            peer = conv.user_b
-        else:
-            peer = conv.user_a
-
-        # Último mensaje
-        last_msg = db.query(models.Message).filter(
-            models.Message.conversation_id == conv.id
-        ).order_by(desc(models.Message.id)).first()
-
-        # Unread count: mensajes donde sender != yo, y read_at is null
-        unread_count = db.query(models.Message).filter(
-            models.Message.conversation_id == conv.id,
-            models.Message.sender_id != current_user.id,
-            models.Message.read_at == None
-        ).count()
-
-        results.append({
-            "id": conv.id,
-            "peer": peer,
-            "last_message": last_msg,
-            "unread_count": unread_count
-        })
-
-    # Ordenar por fecha de ultimo mensaje (desc), o created_at de conv
-    results.sort(
-        key=lambda x: x["last_message"].created_at if x["last_message"] else x["peer"].created_at, # fallback
-        reverse=True
+    changes = (
+        db.query(models.ChatChange)
+        .filter(models.ChatChange.user_id == current_user.id, models.ChatChange.id > since)
+        .order_by(models.ChatChange.id)
+        .limit(limit + 1)
+        .all()
     )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if not changes:
+        return {"cursor": since, "has_more": False}
+
+    conv_ids = {c.conversation_id for c in changes}
+    rows = _inbox_query(db, current_user.id).filter(models.Conversation.id.in_(conv_ids)).all()
+    visible = {row[0].id for row in rows}
+
+    message_ids = [c.message_id for c in changes if c.kind == CHANGE_MESSAGE and c.conversation_id in visible]
+    messages = []
+    if message_ids:
+        messages = (
+            db.query(models.Message)
+            .filter(models.Message.id.in_(message_ids))
+            .order_by(models.Message.id)
+            .all()
+        )
+
+    return {
+        "cursor": changes[-1].id,
+        "has_more": has_more,
+        "conversations": [_inbox_item(row) for row in rows],
+        "messages": messages,
+        "reads": [
+            {"conversation_id": c.conversation_id, "reader_id": c.actor_id, "until_message_id": c.message_id}
+            for c in changes if c.kind == CHANGE_READ and c.conversation_id in visible
+        ],
+        "removed": sorted(conv_ids - visible),
+    }
+
 
-    return results
+def _user_exists(user_id: int) -> bool:
+    with SessionLocal() as db:
+        return db.query(models.User.id).filter(models.User.id == user_id).first() is not None
+
+
+async def _ws_user_id(websocket: WebSocket) -> Optional[int]:
+    """
+    user_id del JWT de acceso, igual que get_current_user. Va en ?token=
+    (los navegadores no permiten headers en WebSocket) o en Authorization.
+    La consulta a la BD va en el threadpool: no bloquea el event loop.
+    """
+    token = websocket.query_params.get("token")
+    if not token:
+        auth = websocket.headers.get("authorization", "")
+        if auth.lower().startswith("bearer "):
+            token = auth[7:]
+    if not token or not token.strip():
+        return None
+    try:
+        user_id = decode_token(token.strip())
+    except Exception:
+        return None
+    return user_id if await run_in_threadpool(_user_exists, user_id) else None
+
+
+@router.websocket("/ws")
+async def chat_events_ws(websocket: WebSocket):
+    """
+    Eventos en tiempo real del usuario autenticado, en JSON:
+    - {"type": "message", "conversation_id", "message": MessageOut}
+    - {"type": "read", "conversation_id", "reader_id", "until_message_id"}
+    - {"type": "match", "user_ids": [a, b]}
+    El cliente puede mandar "ping" y recibe {"type": "pong"}. Sin token
+    válido se cierra con 1008. Lo perdido mientras no hubo conexión se
+    recupera por REST.
+    """
+    user_id = await _ws_user_id(websocket)
+    if user_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    broker = get_broker()
+    sub = await broker.subscribe(user_channel(user_id))
+
+    async def forward():
+        while True:
+            await websocket.send_text(await sub.get())
+
+    async def receive():
+        while True:
+            if (await websocket.receive_text()).strip() == "ping":
+                await websocket.send_json({"type": "pong"})
+
+    tasks = [asyncio.create_task(forward()), asyncio.create_task(receive())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        # shield: si cancelan el endpoint (cierre del servidor) igual se desuscribe
+        await asyncio.shield(broker.unsubscribe(sub))
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _messages_page_query(
+    db: Session,
+    chat_id: int,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = 20,
+):
+    """
+    Página keyset de mensajes de una conversación, resuelta como rango sobre
+    idx_messages_conversation_id_id (sin ordenar en memoria):
+    - sin after_id: los `limit` más recientes (antes de before_id), id DESC
+    - con after_id: los `limit` siguientes a after_id (hasta before_id), id ASC
+    """
+    query = db.query(models.Message).filter(models.Message.conversation_id == chat_id)
+    if before_id:  # 0 = sin cursor (como antes)
+        query = query.filter(models.Message.id < before_id)
+    if after_id is not None:  # 0 = desde el primero
+        query = query.filter(models.Message.id > after_id)
+        return query.order_by(models.Message.id).limit(limit)
+    return query.order_by(desc(models.Message.id)).limit(limit)
 
 
 @router.get("/{chat_id}/messages", response_model=List[schemas.MessageOut])
 def get_messages(
     chat_id: int,
     before_id: Optional[int] = None,
-    limit: int = 20,
+    after_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=MAX_MESSAGES_PAGE),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
+    """
+    Historial paginado por id. `before_id` pagina hacia atrás (más recientes
+    primero); `after_id` pone al día hacia adelante desde el último mensaje
+    conocido (más viejos primero, repetir con el último id mientras venga
+    la página llena).
+    """
     # 1. Validar acceso
     conv = db.query(models.Conversation).get(chat_id)
     if not conv:
@@ -97,15 +353,7 @@ def get_messages(
     if _is_blocked(db, current_user.id, peer_id):
         raise HTTPException(status_code=404, detail="Chat not found")
 
-    query = db.query(models.Message).filter(models.Message.conversation_id == chat_id)
-
-    if before_id:
-        query = query.filter(models.Message.id < before_id)
-    
-    # Ordenamos desc para paginacion
-    msgs = query.order_by(desc(models.Message.id)).limit(limit).all()
-    
-    return msgs
+    return _messages_page_query(db, chat_id, before_id, after_id, limit).all()
 
 
 @router.post("/{chat_id}/messages", response_model=schemas.MessageOut)
@@ -139,12 +387,30 @@ def send_message(
         body=msg_in.body.strip()
     )
     db.add(new_msg)
-    
-    # Actualizar updated_at de la conversacion (para ordenar Inbox)
-    conv.updated_at = func.now()
-    
+    db.flush()  # id del mensaje para el resumen
+
+    # Resumen de la conversación en un solo UPDATE (incremento en SQL, sin
+    # carreras): último mensaje, +1 no leído del peer y updated_at (para
+    # ordenar Inbox)
+    db.query(models.Conversation).filter(models.Conversation.id == chat_id).update({
+        models.Conversation.last_message_id: new_msg.id,
+        models.Conversation.last_message_at: select(models.Message.created_at).where(
+            models.Message.id == new_msg.id
+        ).scalar_subquery(),
+        _unread_column(conv, peer_id): _unread_column(conv, peer_id) + 1,
+        models.Conversation.updated_at: func.now(),
+    }, synchronize_session=False)
+    record_chat_change(db, [current_user.id, peer_id], chat_id, CHANGE_MESSAGE,
+                       actor_id=current_user.id, message_id=new_msg.id)
+
     db.commit()
     db.refresh(new_msg)
+
+    publish_chat_event([current_user.id, peer_id], {
+        "type": "message",
+        "conversation_id": chat_id,
+        "message": schemas.MessageOut.model_validate(new_msg).model_dump(mode="json"),
+    })
     return new_msg
 
 
@@ -176,9 +442,27 @@ def mark_read(
     if read_in.until_message_id:
         query = query.filter(models.Message.id <= read_in.until_message_id)
 
-    query.update({models.Message.read_at: func.now()}, synchronize_session=False)
+    marked = query.update({models.Message.read_at: func.now()}, synchronize_session=False)
+
+    if marked:
+        unread = _unread_column(conv, current_user.id)
+        # Sin tope se leyó todo lo del peer; con tope se descuenta lo marcado.
+        # updated_at se fija a sí mismo: leer no reordena la bandeja.
+        db.query(models.Conversation).filter(models.Conversation.id == chat_id).update({
+            unread: case((unread > marked, unread - marked), else_=0) if read_in.until_message_id else 0,
+            models.Conversation.updated_at: models.Conversation.updated_at,
+        }, synchronize_session=False)
+        record_chat_change(db, [current_user.id, peer_id], chat_id, CHANGE_READ,
+                           actor_id=current_user.id, message_id=read_in.until_message_id)
     db.commit()
 
+    if marked:
+        publish_chat_event([current_user.id, peer_id], {
+            "type": "read",
+            "conversation_id": chat_id,
+            "reader_id": current_user.id,
+            "until_message_id": read_in.until_message_id,
+        })
     return {"ok": True}
 
 
@@ -216,12 +500,12 @@ def start_chat_from_match(
     if existing:
         # Reusar logica de retorno de ChatListOut
         peer = db.query(models.User).get(peer_id)
-        last_msg = db.query(models.Message).filter(models.Message.conversation_id == existing.id).order_by(desc(models.Message.id)).first()
+        last_msg = db.query(models.Message).get(existing.last_message_id) if existing.last_message_id else None
         return {
             "id": existing.id,
             "peer": peer,
             "last_message": last_msg,
-            "unread_count": 0 
+            "unread_count": existing.unread_a if existing.user_a_id == current_user.id else existing.unread_b
         }
 
     # 4. Crear nueva conversacion
@@ -233,6 +517,8 @@ def start_chat_from_match(
         user_b_id=u2
     )
     db.add(new_conv)
+    db.flush()
+    record_chat_change(db, [u1, u2], new_conv.id, CHANGE_CONVERSATION, actor_id=current_user.id)
     db.commit()
     db.refresh(new_conv)
 
@@ -266,6 +552,11 @@ def start_chat_with_user(
     return start_chat_from_match(match.id, db, current_user)
 
 
+def _unread_column(conv: models.Conversation, reader_id: int):
+    """Columna con los no leídos de `reader_id` en `conv` (unread_a o unread_b)."""
+    return models.Conversation.unread_a if conv.user_a_id == reader_id else models.Conversation.unread_b
+
+
 def _is_blocked(db: Session, user1_id: int, user2_id: int) -> bool:
     return db.query(exists().where(
         or_(
@@ -44,6 +44,9 @@ def cleanup_pending_users(
 
     count = query.delete(synchronize_session=False)
     db.commit()
+    if count:
+        from ..services.candidate_index import candidate_index
+        candidate_index.invalidate()
 
     return {"ok": True, "deleted_count": count}
 
@@ -130,6 +133,8 @@ def set_photo_key_debug(
 
     user.profile_photo_key = request.profile_photo_key
     db.commit()
+    from ..services.candidate_index import candidate_index
+    candidate_index.upsert(user)
     return {"ok": True, "profile_photo_key": user.profile_photo_key}
 @router.get("/check-email-status")
 def check_email_status(
@@ -1,18 +1,33 @@
-from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, Request, Response, HTTPException
 from fastapi.responses import JSONResponse
 from starlette import status
-from typing import List
+from typing import List, Optional, Tuple
 
 import os
-import math
-from datetime import date, datetime
+import random
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
 from sqlalchemy.orm import Session
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, exists, and_
-from ..database import get_db
+from sqlalchemy import or_, exists, and_, select, func, case
+from sqlalchemy.exc import IntegrityError
+from ..database import get_db, SessionLocal
 from ..deps import get_current_user
-from .. import models
-from .users import user_to_out
+from .. import models, schemas
+from .users import ONLINE_THRESHOLD, card_load_options, presign_user_media, user_to_card
+from ..geo import covering_cells, geohash_prefix_range, haversine_km
+from ..interests import MAX_INTEREST_BITS
+from ..services.candidate_index import candidate_index, years_ago
+from ..services.exclusion_cache import exclusion_cache
+from ..services.impressions import impression_log
+from ..services.chat_events import publish_chat_event
+from ..services.chat_changes import CHANGE_REMOVED, record_chat_change
+from ..services.compat_scoring import COMPAT_VECTOR_DIM, compatibility, from_bytes
+from ..utils import encode_cursor, decode_cursor, make_etag, not_modified
+from ..services.r2_client import current_presign_window
+from ..security import utcnow
 import logging
 import structlog
 
@@ -21,16 +36,210 @@ logger = structlog.get_logger("api")
 
 router = APIRouter()
 
+# Tamaño de página del feed y de cada bloque leído de la BD
+PAGE_SIZE = 20
+FETCH_CHUNK = 100
 
-@router.get("/suggested")
+# Feed vía índice columnar en memoria (0 = ruta SQL original)
+CANDIDATE_INDEX_ENABLED = os.getenv("CANDIDATE_INDEX_ENABLED", "1") == "1"
+
+# Fracción de requests que registran el embudo de conteos (0 = nunca)
+FEED_DIAGNOSTICS_SAMPLE_RATE = float(os.getenv("FEED_DIAGNOSTICS_SAMPLE_RATE", "0"))
+
+# Feed precalculado en feed_candidates (ver jobs/feed_precompute.py): es la
+# cabeza del feed, de hasta MAX_CANDIDATES por usuario; agotada, la página y
+# las siguientes siguen en vivo sin repetir sus ids (cursor con marca "pre")
+FEED_PRECOMPUTE_ENABLED = os.getenv("FEED_PRECOMPUTE_ENABLED", "1") == "1"
+FEED_PRECOMPUTE_MAX_CANDIDATES = int(os.getenv("FEED_PRECOMPUTE_MAX_CANDIDATES", "500"))
+
+
+@dataclass
+class FeedFilters:
+    max_distance_km: Optional[float] = None
+    min_age: Optional[int] = None
+    max_age: Optional[int] = None
+    require_email_verified: bool = False
+    require_photo: bool = False
+    min_shared_interests: Optional[int] = None
+
+
+def _env_feed_filters(**kwargs) -> FeedFilters:
+    """FeedFilters con los toggles de entorno (email verificado / foto)."""
+    # Relaxed defaults for dev/testing
+    REQUIRE_EMAIL_VERIFIED = os.getenv("REQUIRE_EMAIL_VERIFIED", "0") == "1"
+    REQUIRE_PROFILE_PHOTO = os.getenv("REQUIRE_PROFILE_PHOTO", "0") == "1"
+    ALLOW_NO_PHOTO = os.getenv("ALLOW_NO_PHOTO", "1") == "1"
+    return FeedFilters(
+        require_email_verified=REQUIRE_EMAIL_VERIFIED,
+        # Effective photo filter
+        require_photo=REQUIRE_PROFILE_PHOTO and not ALLOW_NO_PHOTO,
+        **kwargs,
+    )
+
+
+def _gender_str(user: models.User) -> str:
+    return str(user.gender).lower().strip() if user.gender else ""
+
+
+def _target_gender(user: models.User) -> Optional[str]:
+    """
+    Género que deben tener los candidatos (STRICT HETEROSEXUAL ENFORCEMENT).
+    Men MUST see Women. Women MUST see Men. None = sin filtro.
+    """
+    user_gender_str = _gender_str(user)
+    if user_gender_str in ["male", "hombre", "m"]:
+        logger.info(f"[SUGGESTED] Strict enforcement: Male user {user.id} -> looking for female candidates.")
+        return "female"
+    if user_gender_str in ["female", "mujer", "f"]:
+        logger.info(f"[SUGGESTED] Strict enforcement: Female user {user.id} -> looking for male candidates.")
+        return "male"
+
+    # Fallback for undefined/other gender (shouldn't happen in this strict app, but safe fallback)
+    # We use their show_me if set, otherwise no strict filter (or block?)
+    logger.warning(f"[SUGGESTED] User {user.id} has unknown gender '{user_gender_str}'. Fallback to show_me.")
+    if getattr(user, "show_me", None) and user.show_me != "everyone":
+        return user.show_me
+    return None
+
+
+def _indexed_candidates(
+    db: Session, user: models.User, filters: FeedFilters, position: dict, seen: np.ndarray,
+    page_size: int = PAGE_SIZE,
+) -> Tuple[List[models.User], Optional[dict]]:
+    """
+    Feed vía índice columnar en memoria: filtros vectorizados sobre todos los
+    usuarios, exclusiones como diferencia de conjuntos, top-k por score
+    (compatibilidad + cercanía + actividad) y una sola carga por ids.
+    Keyset (score, id); el cursor fija `t` para que el score no cambie entre páginas.
+    `page_size` menor a PAGE_SIZE completa una página empezada por la cabeza
+    precalculada; la marca "pre" del cursor se conserva.
+    """
+    candidate_index.ensure_fresh(db)
+    now = float(position.get("t", time.time()))
+    excluded = exclusion_cache.get(db, user.id)
+    if seen.size:
+        excluded = np.union1d(excluded, seen)
+    after = (float(position["score"]), int(position["after_id"])) if "score" in position else None
+
+    ids, scores = candidate_index.rank(
+        limit=page_size + 1,
+        exclude_ids=excluded,
+        after=after,
+        now=now,
+        exclude_id=user.id,
+        candidate_gender=_target_gender(user),
+        viewer_gender=_gender_str(user) or None,
+        min_age=filters.min_age,
+        max_age=filters.max_age,
+        lat=user.lat,
+        lon=user.lon,
+        max_distance_km=filters.max_distance_km,
+        require_photo=filters.require_photo,
+        require_email_verified=filters.require_email_verified,
+        min_shared_interests=filters.min_shared_interests,
+    )
+    logger.info(f"[SUGGESTED] Index: ranked {len(ids)} candidates for this page")
+
+    page_ids = [int(i) for i in ids[:page_size]]
+    next_position = None
+    if len(ids) > page_size:
+        # Sin score (página sin filas del índice): la siguiente empieza desde arriba
+        next_position = {"src": "idx", "after_id": 0, "t": now}
+        if page_ids:
+            next_position.update(score=float(scores[page_size - 1]), after_id=page_ids[-1])
+        if position.get("pre"):
+            next_position["pre"] = 1
+    if not page_ids:
+        return [], next_position
+    rows = db.query(models.User).options(*card_load_options()).filter(models.User.id.in_(page_ids)).all()
+    by_id = {u.id: u for u in rows}
+    return [by_id[i] for i in page_ids if i in by_id], next_position
+
+
+def _fetch_page(
+    db: Session, user: models.User, filters: FeedFilters, position: dict, seen: np.ndarray
+) -> Tuple[List[models.User], Optional[dict]]:
+    """
+    Página del feed desde `position` (cursor decodificado). Usa feed_candidates
+    si el usuario tiene ranking precalculado; sin ranking cae al cálculo en
+    vivo: índice en memoria rankeado por score, o SQL ordenado por id si el
+    índice está apagado. El ranking guarda solo los
+    FEED_PRECOMPUTE_MAX_CANDIDATES mejores (sin edad/distancia/intereses, que
+    se aplican al leer): cuando se agota, la misma página se completa en vivo
+    y el feed sigue ahí (cursor con marca "pre") saltando los ids de la
+    cabeza, que ya se sirvieron o no pasan los filtros. Solo se devuelve
+    posición None cuando también se agotó la ruta en vivo.
+    Devuelve (candidatos, posición siguiente o None).
+    """
+    src = position.get("src")
+    candidates: List[models.User] = []
+    if FEED_PRECOMPUTE_ENABLED and (not position or src == "pre"):
+        page = _precomputed_candidates(db, user, filters, position, seen)
+        if page is not None and page[1] is not None:
+            return page
+        if page is not None:
+            candidates = page[0]
+            position = {"pre": 1}
+        else:
+            position = {}
+        src = None
+    elif src == "pre":
+        position, src = {}, None
+
+    if position.get("pre"):
+        seen = np.union1d(seen, _precomputed_head_ids(db, user))
+    page_size = PAGE_SIZE - len(candidates)
+
+    if CANDIDATE_INDEX_ENABLED and src != "sql":
+        more, next_position = _indexed_candidates(db, user, filters, position, seen, page_size)
+        return candidates + more, next_position
+
+    after_id = int(position["after_id"]) if src == "sql" else 0
+    more, has_more = _sql_candidates(db, user, filters, after_id, seen, page_size)
+    next_position = None
+    if has_more:
+        next_position = {"src": "sql", "after_id": more[-1].id if more else after_id}
+        if position.get("pre"):
+            next_position["pre"] = 1
+    return candidates + more, next_position
+
+
+def _compatibility_map(db: Session, user: models.User, candidates: List[models.User]) -> dict:
+    """Compatibilidad 0..1 del usuario con cada candidato de la página (1 consulta)."""
+    if not candidates:
+        return {}
+    rows = db.query(models.UserCompat.user_id, models.UserCompat.vector).filter(
+        models.UserCompat.user_id.in_([user.id] + [c.id for c in candidates])
+    ).all()
+    vectors = {uid: from_bytes(raw) for uid, raw in rows}
+    viewer_vec = vectors.get(user.id)
+    cand_vecs = [vectors.get(c.id) for c in candidates]
+    has_vec = np.array([v is not None for v in cand_vecs], dtype=bool)
+    matrix = np.array(
+        [v if v is not None else np.zeros(COMPAT_VECTOR_DIM, dtype=np.float32) for v in cand_vecs],
+        dtype=np.float32,
+    )
+    scores = compatibility(viewer_vec, matrix, has_vec)
+    return {c.id: round(float(sc), 4) for c, sc in zip(candidates, scores)}
+
+
+@router.get("/suggested", response_model=schemas.FeedPageOut)
 def suggested(
     request: Request,
+    background_tasks: BackgroundTasks,
     max_distance_km: float | None = None,
     min_age: int | None = None,
     max_age: int | None = None,
+    min_shared_interests: int | None = Query(None, ge=0, le=MAX_INTEREST_BITS),
+    cursor: str | None = None,
     db: Session = Depends(get_db),
     user: models.User = Depends(get_current_user),
 ):
+    """
+    Feed rankeado por score y paginado por cursor opaco. Sin cursor, omite candidatos que
+    el usuario ya vio en los últimos FEED_IMPRESSION_TTL_SECONDS; si ya los vio
+    todos, vuelve a empezar.
+    """
     print(f"--- SUGGESTED REQUEST ---")
     print(f"User: {user.email} (ID: {user.id})")
     print(f"Filters received: dist={max_distance_km}, min_age={min_age}, max_age={max_age}")
@@ -57,15 +266,71 @@ def suggested(
         if not has_gender: missing.append("gender")
         if not has_name: missing.append("name")
 
-    # 1) Exclusiones via SQL (Mejor rendimiento que cargar IDs en memoria)
-    # block_check: Yo bloqueé al usuario OR Usuario me bloqueó a mí
-    # like_check: Yo di like
-    # pass_check: Yo di pass
+    # Read toggles from env
+    filters = _env_feed_filters(
+        max_distance_km=max_distance_km,
+        min_age=min_age,
+        max_age=max_age,
+        min_shared_interests=min_shared_interests,
+    )
+
+    position = {}
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+            int(position["after_id"])
+            float(position.get("score", 0))
+            float(position.get("t", 0))
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail={"detail": "Invalid cursor", "code": "INVALID_CURSOR"})
+
+    seen = impression_log.seen_ids(user.id)
+    candidates, next_position = _fetch_page(db, user, filters, position, seen)
+    if not candidates and not cursor and seen.size:
+        # Ya vio todo lo disponible: reiniciar la ronda
+        impression_log.clear(user.id)
+        candidates, next_position = _fetch_page(db, user, filters, position, np.empty(0, dtype=np.int64))
+    impression_log.record(user.id, [c.id for c in candidates])
+
+    final_count = len(candidates)
+    
+    logger.info(f"[SUGGESTED] Final candidates returned: {final_count}")
+    print(f"--- SUGGESTED RESPONSE ---")
+    print(f"Returning {final_count} candidates")
+    if final_count > 0:
+        print(f"First candidate: ID {candidates[0].id}")
+
+    # Montar respuesta y modo debug por header
+    compat = _compatibility_map(db, user, candidates)
+    urls = presign_user_media(candidates, include_gallery=False)
+    matches_out = []
+    for c in candidates:
+        out = user_to_card(c, urls=urls)
+        out["compatibility"] = compat[c.id]
+        matches_out.append(out)
+
+    resp = {
+        "matches": matches_out,
+        "next_cursor": encode_cursor(next_position) if next_position else None,
+    }
+
+    # Diagnóstico del embudo solo bajo demanda (admin) o por muestreo
+    diagnostics = _diagnostics_mode(request)
+    if diagnostics == "inline":
+        funnel = _feed_funnel(db, user, filters)
+        _log_feed_funnel(funnel, user.id, final_count)
+        resp["debug"] = {**funnel, "final": final_count}
+    elif diagnostics == "sampled":
+        background_tasks.add_task(_sampled_feed_funnel, user.id, filters, final_count)
+
+    return resp
 
-    # Alias para claridad en subqueries (opcional, pero User es la tabla principal del query)
-    # Usamos models.Block, models.Like, models.Pass directamente
 
-    # Condiciones NOT EXISTS
+def _exclusion_conditions(user: models.User) -> list:
+    """
+    Condiciones NOT EXISTS sobre models.User: self, bloqueos en ambos sentidos
+    y likes/passes/reportes ya hechos por el usuario.
+    """
     # a) Yo bloqueé a User
     blocked_by_me = exists().where(
         and_(models.Block.blocker_id == user.id, models.Block.blocked_id == models.User.id)
@@ -86,245 +351,418 @@ def suggested(
     already_reported = exists().where(
         and_(models.Report.reporter_id == user.id, models.Report.reported_id == models.User.id)
     )
-
-    # 6) Base query
-    # Excluir self + todas las condiciones anteriores
-    q = db.query(models.User).filter(
+    return [
         models.User.id != user.id,
         ~blocked_by_me,
         ~blocked_me,
-        ~already_liked, # Comentar para debugging si se quiere ver a quien diste like
-        ~already_passed, # Comentar para debugging si se quiere ver a quien diste pass
-        ~already_reported
-    )
+        ~already_liked,
+        ~already_passed,
+        ~already_reported,
+    ]
 
-    count_start = q.count()
-    logger.info(f"[SUGGESTED] Start count (excluding self/blocks): {count_start}")
 
-    # Read toggles from env
-    # Relaxed defaults for dev/testing
-    REQUIRE_EMAIL_VERIFIED = os.getenv("REQUIRE_EMAIL_VERIFIED", "0") == "1"
-    REQUIRE_PROFILE_PHOTO = os.getenv("REQUIRE_PROFILE_PHOTO", "0") == "1"
-    ALLOW_NO_PHOTO = os.getenv("ALLOW_NO_PHOTO", "1") == "1"
-    ALLOW_INCOMPLETE_PROFILE = os.getenv("ALLOW_INCOMPLETE_PROFILE", "1") == "1"
+def _email_conditions(filters: FeedFilters) -> list:
+    if filters.require_email_verified:
+        return [models.User.email_verified == True]
+    return []
 
-    # Effective photo filter
-    photo_filter_active = REQUIRE_PROFILE_PHOTO and not ALLOW_NO_PHOTO
 
-    # Apply EMAIL check
-    if REQUIRE_EMAIL_VERIFIED:
-        # Relaxed for legacy/imported users: Only enforce if true.
-        # But if DB has 0 verified, this kills the feed.
-        # Let's log warning if exclusion is high.
-        q = q.filter(models.User.email_verified == True)
-    
-    count_email = q.count()
-    logger.info(f"[SUGGESTED] After email_verified: {count_email}")
+def _photo_conditions(filters: FeedFilters) -> list:
+    if filters.require_photo:
+        return [(models.User.profile_photo_key != None) | (models.User.photo_path != None)]
+    return []
 
-    # Apply PHOTO check
-    if photo_filter_active:
-        q = q.filter((models.User.profile_photo_key != None) | (models.User.photo_path != None))
-    
-    count_photo = q.count()
-    logger.info(f"[SUGGESTED] After active photo check: {count_photo}")
-
-    # 7) Gender & Reciprocity (STRICT HETEROSEXUAL ENFORCEMENT)
-    # The user requested to "blindar" (armor) this logic.
-    # Men MUST see Women. Women MUST see Men. 
-    # We ignore 'show_me' preference if it deviates from this rule.
-    
-    user_gender_str = str(user.gender).lower().strip() if user.gender else ""
-    
-    if user_gender_str in ["male", "hombre", "m"]:
-        # User is Male -> Force candidates to be Female
-        q = q.filter(models.User.gender == "female")
-        logger.info(f"[SUGGESTED] Strict enforcement: Male user {user.id} -> looking for female candidates.")
-        
-    elif user_gender_str in ["female", "mujer", "f"]:
-        # User is Female -> Force candidates to be Male
-        q = q.filter(models.User.gender == "male")
-        logger.info(f"[SUGGESTED] Strict enforcement: Female user {user.id} -> looking for male candidates.")
-        
-    else:
-        # Fallback for undefined/other gender (shouldn't happen in this strict app, but safe fallback)
-        # We use their show_me if set, otherwise no strict filter (or block?)
-        logger.warning(f"[SUGGESTED] User {user.id} has unknown gender '{user_gender_str}'. Fallback to show_me.")
-        if getattr(user, "show_me", None) and user.show_me != "everyone":
-             q = q.filter(models.User.gender == user.show_me)
 
-    count_gender = q.count()
+def _gender_conditions(user: models.User) -> list:
+    conds = []
+    target_gender = _target_gender(user)
+    if target_gender is not None:
+        conds.append(models.User.gender == target_gender)
 
     # Reciprocity: 
     # We ensure the candidate also wants to see the user's gender.
-    # Since we are enforcing hetero, a Female candidate (who is hetero) should want 'male'.
-    # A Male candidate (who is hetero) should want 'female'.
     # We allow 'everyone' or NULL just in case, but usually it should match.
+    user_gender_str = _gender_str(user)
     if user_gender_str:
-         q = q.filter(or_(
-             models.User.show_me == user_gender_str, 
-             models.User.show_me == "everyone",
-             models.User.show_me == None
-         ))
-    
-    count_reciprocity = q.count()
-    logger.info(f"[SUGGESTED] After strict gender/recip: {count_gender} -> {count_reciprocity}")
+        conds.append(or_(
+            models.User.show_me == user_gender_str,
+            models.User.show_me == "everyone",
+            models.User.show_me == None
+        ))
+    return conds
 
-    # 8) Age & Distance (Optional Params)
+
+def _shares_enough_interests(user: models.User, cand: models.User, filters: FeedFilters) -> bool:
+    if not filters.min_shared_interests:
+        return True
+    shared = (user.interests_mask or 0) & (cand.interests_mask or 0)
+    return bin(shared).count("1") >= filters.min_shared_interests
+
+
+def _age_conditions(filters: FeedFilters) -> list:
     # PROMPT 2: "If missing, do NOT filter. If present, apply safely... do NOT exclude null birthdate"
+    conds = []
     today = date.today()
+    if filters.min_age is not None:
+        limit_date = years_ago(today, filters.min_age)
+        conds.append(or_(models.User.birthdate <= limit_date, models.User.birthdate == None))
+    if filters.max_age is not None:
+        limit_date = years_ago(today, filters.max_age + 1)
+        conds.append(or_(models.User.birthdate > limit_date, models.User.birthdate == None))
+    return conds
 
-    # MIN AGE
-    if min_age is not None:
-        try:
-            limit_date = today.replace(year=today.year - min_age)
-            q = q.filter(or_(models.User.birthdate <= limit_date, models.User.birthdate == None))
-        except:
-            pass
-    
-    # MAX AGE
-    if max_age is not None:
-        try:
-            limit_date = today.replace(year=today.year - max_age)
-            q = q.filter(or_(models.User.birthdate >= limit_date, models.User.birthdate == None))
-        except:
-            pass
 
-    # Fetch candidates for Python-side processing (Distance)
-    candidates_raw = q.limit(100).all()
-    logger.info(f"[SUGGESTED] Fetched for distance check: {len(candidates_raw)}")
+def _sql_candidates(
+    db: Session, user: models.User, filters: FeedFilters, after_id: int, seen: np.ndarray,
+    page_size: int = PAGE_SIZE,
+) -> Tuple[List[models.User], bool]:
+    """
+    Ruta original del feed: filtros y exclusiones en SQL, distancia exacta en Python.
+    Se usa cuando CANDIDATE_INDEX_ENABLED=0.
+    """
+    q = db.query(models.User).options(*card_load_options()).filter(
+        *_exclusion_conditions(user),
+        *_email_conditions(filters),
+        *_photo_conditions(filters),
+        *_gender_conditions(user),
+    )
+
+    # 8) Age & Distance (Optional Params)
+    q = q.filter(*_age_conditions(filters))
 
-    # Distance filter
+    # DISTANCE (prefiltro por celdas geohash indexadas)
     # PROMPT 2: "if either side missing lat/lon, do NOT exclude"
-    
-    def haversine_km(lat1, lon1, lat2, lon2):
-        try:
-            # all args in degrees
-            R = 6371.0
-            phi1 = math.radians(lat1)
-            phi2 = math.radians(lat2)
-            dphi = math.radians(lat2 - lat1)
-            dlambda = math.radians(lon2 - lon1)
-            a = math.sin(dphi/2.0)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2.0)**2
-            c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-            return R * c
-        except:
-            return 999999.0
+    distance_active = (
+        filters.max_distance_km is not None and user.lat is not None and user.lon is not None
+    )
+    if distance_active:
+        cells = covering_cells(user.lat, user.lon, float(filters.max_distance_km))
+        if cells:
+            ranges = [geohash_prefix_range(c) for c in cells]
+            q = q.filter(or_(
+                models.User.geohash == None,
+                *[
+                    and_(models.User.geohash >= lo, models.User.geohash < hi) if hi else models.User.geohash >= lo
+                    for lo, hi in ranges
+                ]
+            ))
 
+    if seen.size:
+        q = q.filter(models.User.id.notin_([int(i) for i in seen]))
+
+    # Recorremos el query en bloques (keyset por id) hasta llenar la página
+    # (+1 para saber si hay más), así un radio chico no deja el feed vacío
+    # por un LIMIT previo al filtro exacto.
     candidates: List[models.User] = []
-    for cand in candidates_raw:
-        # LOGGING FOR DEBUG
-        debug_reason = "kept"
-        
-        if max_distance_km is not None and user.lat is not None and user.lon is not None and cand.lat is not None and cand.lon is not None:
-            try:
-                dkm = haversine_km(user.lat, user.lon, cand.lat, cand.lon)
-                if dkm is not None and dkm > float(max_distance_km):
-                    debug_reason = f"distance {dkm}km > {max_distance_km}km"
-                    logger.info(f"[DEBUG] Dropping user {cand.id}: {debug_reason}")
+    last_id = after_id
+    while len(candidates) <= page_size:
+        chunk = (
+            q.filter(models.User.id > last_id)
+            .order_by(models.User.id)
+            .limit(FETCH_CHUNK)
+            .all()
+        )
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+
+        for cand in chunk:
+            if distance_active and cand.lat is not None and cand.lon is not None:
+                if haversine_km(user.lat, user.lon, cand.lat, cand.lon) > float(filters.max_distance_km):
                     continue
-            except Exception as e:
-                logger.error(f"[DEBUG] Distance calc error: {e}")
-                pass
-        
-        # FIX: If user has no location, do not drop unless strictly required?
-        # Current logic: inner block only runs if ALL coords are present.
-        # If any coord is missing, we skip the block and KEEP the user (debug_reason="kept").
-        # This is correct behavior for "lenient" location.
-                
-        # Age extra check: if candidate has birthdate and min/max provided, verify
-        if cand.birthdate is not None:
-            cand_age = None
-            try:
-                cand_age = (date.today().year - cand.birthdate.year - ((date.today().month, date.today().day) < (cand.birthdate.month, cand.birthdate.day)))
-            except Exception:
-                cand_age = None
-            
-            # NOTE: We relaxed SQL filters earlier, but this python check might still be strict?
-            # Let's ensure we respect ALLOW_INCOMPLETE_PROFILE here too if needed, but usually SQL filter handles it.
-            # However, if SQL let it through (e.g. because birthdate was NULL), this block won't run (cand.birthdate is None).
-            # If birthdate is NOT None, we must respect the age limits if set.
-            
-            if min_age is not None and cand_age is not None and int(cand_age) < int(min_age):
-                debug_reason = f"age {cand_age} < min {min_age}"
-                logger.info("suggested_drop", user_id=cand.id, reason=debug_reason)
-                continue
-            if max_age is not None and cand_age is not None and int(cand_age) > int(max_age):
-                debug_reason = f"age {cand_age} > max {max_age}"
-                logger.info("suggested_drop", user_id=cand.id, reason=debug_reason)
+            if not _shares_enough_interests(user, cand, filters):
                 continue
+            candidates.append(cand)
+            if len(candidates) > page_size:
+                break
 
-                
-        if debug_reason == "kept":
-             logger.info(f"[DEBUG] Keeping user {cand.id} ({cand.name})")
-             
-        candidates.append(cand)
+        if len(chunk) < FETCH_CHUNK:
+            break
 
-    # Trim to 20
-    candidates = candidates[:20]
-    final_count = len(candidates)
-    
-    logger.info(f"[SUGGESTED] Final candidates returned: {final_count}")
-    print(f"--- SUGGESTED RESPONSE ---")
-    print(f"Returning {final_count} candidates")
-    if final_count > 0:
-        print(f"First candidate: {candidates[0].email} (ID: {candidates[0].id})")
+    return candidates[:page_size], len(candidates) > page_size
 
-    # Montar respuesta y modo debug por header
-    resp = {"matches": [user_to_out(c) for c in candidates]}
 
+# -------------------------
+# Feed precalculado (feed_candidates)
+# -------------------------
+def recompute_user_feed(db: Session, user: models.User) -> int:
+    """
+    Recalcula el ranking precalculado de un usuario: filtros base del feed
+    (género/reciprocidad y toggles de entorno, sin edad/distancia que llegan
+    por request), menos exclusiones, top FEED_PRECOMPUTE_MAX_CANDIDATES por
+    score. Reemplaza las filas previas del usuario. Devuelve cuántas guardó.
+    """
+    filters = _env_feed_filters()
+    candidate_index.ensure_fresh(db)
+    ids, scores = candidate_index.rank(
+        limit=FEED_PRECOMPUTE_MAX_CANDIDATES,
+        exclude_ids=exclusion_cache.get(db, user.id),
+        exclude_id=user.id,
+        candidate_gender=_target_gender(user),
+        viewer_gender=_gender_str(user) or None,
+        lat=user.lat,
+        lon=user.lon,
+        require_photo=filters.require_photo,
+        require_email_verified=filters.require_email_verified,
+    )
+
+    now = utcnow()
+    db.query(models.FeedCandidate).filter(models.FeedCandidate.user_id == user.id).delete(synchronize_session=False)
+    if len(ids):
+        db.bulk_insert_mappings(models.FeedCandidate, [
+            {"user_id": user.id, "candidate_id": int(cid), "score": float(sc), "computed_at": now}
+            for cid, sc in zip(ids, scores)
+        ])
+    db.commit()
+    return len(ids)
 
 
-    # Log step counts for observability
+def recompute_user_feed_task(user_id: int):
+    """Recalcula fuera del request (BackgroundTasks) con su propia sesión."""
+    db = SessionLocal()
     try:
-        total_users_db = db.query(models.User).count()
-    except:
-        total_users_db = -1
+        user = db.query(models.User).filter(models.User.id == user_id).first()
+        if user:
+            recompute_user_feed(db, user)
+    except Exception as e:
+        logger.error("feed_recompute_failed", user_id=user_id, error=str(e))
+    finally:
+        db.close()
+
+
+def _precomputed_head_ids(db: Session, user: models.User) -> np.ndarray:
+    """Ids del ranking precalculado del usuario (rango sobre el índice de feed_candidates)."""
+    rows = db.query(models.FeedCandidate.candidate_id).filter(models.FeedCandidate.user_id == user.id).all()
+    return np.asarray([r[0] for r in rows], dtype=np.int64)
 
+
+def _precomputed_candidates(
+    db: Session, user: models.User, filters: FeedFilters, position: dict, seen: np.ndarray
+) -> Optional[Tuple[List[models.User], Optional[dict]]]:
+    """
+    Lectura por rango del índice (user_id, score, candidate_id) en orden
+    score desc / id asc, con keyset (score, after_id). Exclusiones, vistos,
+    edad y distancia se aplican al leer. None si no hay ranking precalculado.
+    """
+    fc = models.FeedCandidate
+    q = (
+        db.query(fc.score, models.User)
+        .join(models.User, models.User.id == fc.candidate_id)
+        .options(*card_load_options())
+        .filter(
+            fc.user_id == user.id,
+            *_email_conditions(filters),
+            *_photo_conditions(filters),
+            *_gender_conditions(user),
+            *_age_conditions(filters),
+        )
+        .order_by(fc.score.desc(), fc.candidate_id)
+    )
+
+    if not position and not db.query(exists().where(fc.user_id == user.id)).scalar():
+        return None
+
+    skip = set(exclusion_cache.get(db, user.id).tolist()) | set(seen.tolist())
+    distance_active = (
+        filters.max_distance_km is not None and user.lat is not None and user.lon is not None
+    )
+
+    candidates: List[tuple] = []
+    last = (position["score"], position["after_id"]) if position else None
+    while len(candidates) <= PAGE_SIZE:
+        chunk_q = q
+        if last is not None:
+            chunk_q = q.filter(or_(fc.score < last[0], and_(fc.score == last[0], fc.candidate_id > last[1])))
+        chunk = chunk_q.limit(FETCH_CHUNK).all()
+        if not chunk:
+            break
+        last = (chunk[-1][0], chunk[-1][1].id)
+
+        for score, cand in chunk:
+            if cand.id in skip:
+                continue
+            if distance_active and cand.lat is not None and cand.lon is not None:
+                if haversine_km(user.lat, user.lon, cand.lat, cand.lon) > float(filters.max_distance_km):
+                    continue
+            if not _shares_enough_interests(user, cand, filters):
+                continue
+            candidates.append((score, cand))
+            if len(candidates) > PAGE_SIZE:
+                break
+
+        if len(chunk) < FETCH_CHUNK:
+            break
+
+    page = candidates[:PAGE_SIZE]
+    next_position = None
+    if len(candidates) > PAGE_SIZE:
+        next_position = {"src": "pre", "score": page[-1][0], "after_id": page[-1][1].id}
+    return [c for _, c in page], next_position
+
+
+# -------------------------
+# Diagnóstico del embudo (apagado por defecto)
+# -------------------------
+def _diagnostics_mode(request: Request) -> Optional[str]:
+    """
+    'inline' si un admin lo pide por header (X-Admin-Secret + X-Feed-Diagnostics: 1),
+    'sampled' según FEED_DIAGNOSTICS_SAMPLE_RATE, None en requests normales.
+    """
+    if request.headers.get("X-Feed-Diagnostics") == "1":
+        secret = os.getenv("ADMIN_SECRET")
+        if secret and request.headers.get("X-Admin-Secret") == secret:
+            return "inline"
+    if FEED_DIAGNOSTICS_SAMPLE_RATE > 0 and random.random() < FEED_DIAGNOSTICS_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+def _feed_funnel(db: Session, user: models.User, filters: FeedFilters) -> dict:
+    """
+    Conteos por etapa del embudo en UNA sola consulta agregada
+    (total -> exclusiones -> email -> foto -> género/reciprocidad).
+    """
+    stage_start = and_(*_exclusion_conditions(user))
+    stage_email = and_(stage_start, *_email_conditions(filters))
+    stage_photo = and_(stage_email, *_photo_conditions(filters))
+    stage_gender = and_(stage_photo, *_gender_conditions(user))
+
+    def _count(cond):
+        return func.coalesce(func.sum(case((cond, 1), else_=0)), 0)
+
+    row = db.execute(
+        select(
+            func.count(models.User.id),
+            _count(stage_start),
+            _count(stage_email),
+            _count(stage_photo),
+            _count(stage_gender),
+        )
+    ).one()
+    return {
+        "total_db": row[0],
+        "start": row[1],
+        "email_ok": row[2],
+        "photo_ok": row[3],
+        "gender_recip_ok": row[4],
+    }
+
+
+def _log_feed_funnel(funnel: dict, user_id: int, final_count: int):
     logger.info(
-        "[SUGGESTED-STEPS] total_db=%s start(excl_self)=%s email_ok=%s photo_ok=%s gender_recip_ok=%s final=%s",
-        total_users_db,
-        count_start,
-        count_email,
-        count_photo,
-        count_reciprocity,
-        final_count,
+        "suggested_funnel",
+        user_id=user_id,
+        final=final_count,
+        **funnel,
     )
 
-    # If no candidates, guess most likely reason and log
     # If no candidates, guess most likely reason and log
     if final_count == 0:
         probable = "unknown"
-        if count_start == 0:
+        if funnel["start"] == 0:
             probable = "no candidates after exclusions (blocked/liked/passed/self)"
-        elif count_email == 0:
+        elif funnel["email_ok"] == 0:
             probable = "no verified users (check REQUIRE_EMAIL_VERIFIED)"
-        elif count_photo == 0:
+        elif funnel["photo_ok"] == 0:
             probable = "no users with photos (check REQUIRE_PROFILE_PHOTO)"
-        elif count_reciprocity == 0:
+        elif funnel["gender_recip_ok"] == 0:
             probable = "gender reciprocity filtered all candidates"
         logger.info(f"[SUGGESTED] No candidates returned — probable: {probable}")
 
-    return resp
+
+def _sampled_feed_funnel(user_id: int, filters: FeedFilters, final_count: int):
+    """Corre después de la respuesta (BackgroundTasks) con su propia sesión."""
+    try:
+        with SessionLocal() as db:
+            user = db.get(models.User, user_id)
+            if user is None:
+                return
+            _log_feed_funnel(_feed_funnel(db, user, filters), user_id, final_count)
+    except Exception as e:
+        logger.error("suggested_funnel_failed", user_id=user_id, error=str(e))
 
 
-@router.get("/confirmed")
-def get_confirmed_matches(db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+@router.get("/confirmed", response_model=List[schemas.UserCardOut])
+def get_confirmed_matches(
+    request: Request,
+    response: Response,
+    limit: int | None = Query(None, ge=1, le=200),
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+    user: models.User = Depends(get_current_user),
+):
     """
     Returns list of users with whom the current user has a confirmed match (mutual likelihood/match).
     In this system, a 'Match' row exists in 'matches' table.
+
+    Más recientes primero. Con `limit` pagina por keyset (Match.created_at, id)
+    y deja el cursor de la siguiente página en el header X-Next-Cursor; sin
+    `limit` devuelve todos (compatibilidad). Número de consultas constante:
+    matches + peers (solo columnas de tarjeta) en un JOIN y firma de URLs en
+    lote. El perfil completo va por /users/{id}/profile.
+    ETag de (matches, peers, quién sigue en línea, ventana de firma): con If-None-Match vigente
+    responde 304 tras una sola consulta agregada.
     """
-    matches_a = db.query(models.Match).filter(models.Match.user_a_id == user.id).all()
-    matches_b = db.query(models.Match).filter(models.Match.user_b_id == user.id).all()
+    peer_id = case((models.Match.user_a_id == user.id, models.Match.user_b_id), else_=models.Match.user_a_id)
+    mine = or_(models.Match.user_a_id == user.id, models.Match.user_b_id == user.id)
 
-    confirmed_users = []
+    stamp = (
+        db.query(
+            func.count(models.Match.id),
+            func.max(models.Match.id),
+            func.sum(models.User.row_version),
+            # is_online de las tarjetas vence con el tiempo: qué peers siguen en línea
+            func.sum(case((models.User.last_seen >= utcnow() - ONLINE_THRESHOLD, models.User.id), else_=0)),
+        )
+        .join(models.User, models.User.id == peer_id)
+        .filter(mine)
+        .one()
+    )
+    cached = not_modified(request, response, make_etag(*stamp, limit, cursor, current_presign_window()))
+    if cached is not None:
+        return cached
 
-    for m in matches_a:
-        confirmed_users.append(m.user_b)
+    q = (
+        db.query(models.Match, models.User)
+        .join(models.User, models.User.id == peer_id)
+        .filter(mine)
+        .options(*card_load_options())
+        .order_by(models.Match.created_at.desc(), models.Match.id.desc())
+    )
 
-    for m in matches_b:
-        confirmed_users.append(m.user_a)
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+            after_created = datetime.fromisoformat(position["created_at"])
+            after_id = int(position["id"])
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail={"detail": "Invalid cursor", "code": "INVALID_CURSOR"})
+        # created_at se compara contra el valor guardado del propio match
+        # (SQLite guarda texto sin microsegundos); el del cursor es respaldo
+        # por si ese match se borró entre páginas.
+        after_created = func.coalesce(
+            select(models.Match.created_at).where(models.Match.id == after_id).scalar_subquery(),
+            after_created,
+        )
+        q = q.filter(or_(
+            models.Match.created_at < after_created,
+            and_(models.Match.created_at == after_created, models.Match.id < after_id),
+        ))
 
-    return [user_to_out(u) for u in confirmed_users]
+    if limit is not None:
+        rows = q.limit(limit + 1).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1][0]
+            response.headers["X-Next-Cursor"] = encode_cursor(
+                {"created_at": last.created_at.isoformat(), "id": last.id}
+            )
+    else:
+        rows = q.all()
+
+    peers = [peer for _, peer in rows]
+    urls = presign_user_media(peers, include_gallery=False)
+    return [user_to_card(u, urls=urls) for u in peers]
 
 
 @router.post("/like/{user_id}")
@@ -384,6 +822,9 @@ def like_user(
         logger.info(f"[MATCH] Created match between {user.id} and {user_id}")
     
     db.commit()
+    exclusion_cache.add(user.id, [user_id])
+    if matched:
+        publish_chat_event([a, b], {"type": "match", "user_ids": [a, b]})
     return {"ok": True, "matched": matched}
 
 
@@ -423,10 +864,124 @@ def pass_user(
     pass_record = models.Pass(passer_id=user.id, passed_id=user_id)
     db.add(pass_record)
     db.commit()
+    exclusion_cache.add(user.id, [user_id])
     
     return {"ok": True}
 
 
+# Tolerancia para client_ts de swipes encolados offline
+SWIPE_CLIENT_TS_MAX_AGE = timedelta(days=7)
+
+
+def _swipe_timestamp(client_ts: Optional[datetime], now: datetime) -> datetime:
+    """client_ts si es razonable (no futuro, no muy viejo); si no, hora del servidor."""
+    if client_ts is None:
+        return now
+    if client_ts.tzinfo is None:
+        client_ts = client_ts.replace(tzinfo=timezone.utc)
+    if client_ts > now or now - client_ts > SWIPE_CLIENT_TS_MAX_AGE:
+        return now
+    return client_ts
+
+
+@router.post("/swipes", response_model=schemas.SwipeBatchOut)
+def swipe_batch(
+    payload: schemas.SwipeBatchIn,
+    db: Session = Depends(get_db),
+    user: models.User = Depends(get_current_user),
+):
+    """
+    Likes y passes en lote, en el orden recibido y en UNA transacción.
+    Mismas reglas que /like y /pass, resueltas con consultas por conjunto:
+    existencia, match previo, like/pass previo y like recíproco.
+    Devuelve un resultado por swipe y los ids con match nuevo.
+    """
+    targets = {s.target_id for s in payload.swipes} - {user.id}
+
+    existing_users = set()
+    matched_with = set()
+    liked = set()
+    passed = set()
+    likes_me = set()
+    if targets:
+        existing_users = set(db.execute(
+            select(models.User.id).where(models.User.id.in_(targets))
+        ).scalars())
+        for a, b in db.execute(
+            select(models.Match.user_a_id, models.Match.user_b_id).where(or_(
+                and_(models.Match.user_a_id == user.id, models.Match.user_b_id.in_(targets)),
+                and_(models.Match.user_b_id == user.id, models.Match.user_a_id.in_(targets)),
+            ))
+        ):
+            matched_with.add(b if a == user.id else a)
+        liked = set(db.execute(
+            select(models.Like.liked_id).where(models.Like.liker_id == user.id, models.Like.liked_id.in_(targets))
+        ).scalars())
+        passed = set(db.execute(
+            select(models.Pass.passed_id).where(models.Pass.passer_id == user.id, models.Pass.passed_id.in_(targets))
+        ).scalars())
+        likes_me = set(db.execute(
+            select(models.Like.liker_id).where(models.Like.liked_id == user.id, models.Like.liker_id.in_(targets))
+        ).scalars())
+
+    now = utcnow()
+    results = []
+    new_matches = []
+    swiped = []
+    for s in payload.swipes:
+        tid = s.target_id
+        res = {"target_id": tid, "action": s.action, "ok": False}
+        results.append(res)
+
+        if tid == user.id:
+            res.update(code="SELF", message=f"Cannot {s.action} yourself")
+            continue
+        if tid not in existing_users:
+            res.update(code="NOT_FOUND", message="User not found")
+            continue
+        if tid in matched_with:
+            res.update(code="ALREADY_MATCHED", message="Match already exists with this user")
+            continue
+
+        ts = _swipe_timestamp(s.client_ts, now)
+        if s.action == "like":
+            if tid in liked:
+                res.update(ok=True, message="Already liked")
+                continue
+            db.add(models.Like(liker_id=user.id, liked_id=tid, created_at=ts))
+            liked.add(tid)
+            if tid in likes_me:
+                a, b = sorted([user.id, tid])
+                db.add(models.Match(user_a_id=a, user_b_id=b))
+                matched_with.add(tid)
+                new_matches.append(tid)
+                res["matched"] = True
+                logger.info(f"[MATCH] Created match between {user.id} and {tid}")
+        else:
+            if tid in passed:
+                res.update(ok=True, message="Already passed")
+                continue
+            db.add(models.Pass(passer_id=user.id, passed_id=tid, created_at=ts))
+            passed.add(tid)
+        res["ok"] = True
+        swiped.append(tid)
+
+    try:
+        db.commit()
+    except IntegrityError:
+        # Otro request escribió el mismo par en paralelo: el cliente reintenta
+        db.rollback()
+        raise HTTPException(status_code=409, detail={"detail": "Concurrent swipe conflict, retry", "code": "SWIPE_CONFLICT"})
+
+    if swiped:
+        exclusion_cache.add(user.id, swiped)
+    for tid in new_matches:
+        pair = sorted([user.id, tid])
+        publish_chat_event(pair, {"type": "match", "user_ids": pair})
+    logger.info("swipe_batch", user_id=user.id, received=len(payload.swipes), applied=len(swiped), matches=len(new_matches))
+    return {"results": results, "new_matches": new_matches}
+
+
 @router.post("/unmatch/{user_id}")
 def unmatch_user(
     user_id: int,
@@ -470,6 +1025,7 @@ def unmatch_user(
         # or delete messages manually. Assuming DB handles cascade or we leave messages orphaned 
         # (but usually we want to wipe it). 
         # Let's trust cascade or simple delete for now.
+        record_chat_change(db, [user.id, user_id], conv.id, CHANGE_REMOVED, actor_id=user.id)
         db.delete(conv)
 
     # 4. Cleanup Likes (so they aren't 'liked' anymore)
@@ -495,6 +1051,9 @@ def unmatch_user(
         db.add(new_pass)
         
     db.commit()
+    # El like del otro se borró: su set se recarga desde la BD
+    exclusion_cache.add(user.id, [user_id])
+    exclusion_cache.invalidate([user_id])
     return {"ok": True}
 
 
@@ -513,11 +1072,14 @@ def reset_account(
     
     try:
         # 1. Borrar Mensajes de sus chats
-        conv_ids_q = db.query(models.Conversation.id).filter(
+        conv_ids_q = db.query(models.Conversation.id, models.Conversation.user_a_id, models.Conversation.user_b_id).filter(
             (models.Conversation.user_a_id == user_id) | 
             (models.Conversation.user_b_id == user_id)
         )
-        conv_ids = [r[0] for r in conv_ids_q.all()]
+        conv_rows = conv_ids_q.all()
+        conv_ids = [r[0] for r in conv_rows]
+        for cid, a, b in conv_rows:
+            record_chat_change(db, [a, b], cid, CHANGE_REMOVED, actor_id=user_id)
         
         msg_count = db.query(models.Message).filter(models.Message.conversation_id.in_(conv_ids)).delete(synchronize_session=False) if conv_ids else 0
         
@@ -533,6 +1095,10 @@ def reset_account(
             (models.Match.user_b_id == user_id)
         ).delete(synchronize_session=False)
         
+        # Usuarios cuyo like/pass hacia mí se va a borrar (su cache de exclusiones cambia)
+        affected_ids = {r[0] for r in db.query(models.Like.liker_id).filter(models.Like.liked_id == user_id).all()}
+        affected_ids |= {r[0] for r in db.query(models.Pass.passer_id).filter(models.Pass.passed_id == user_id).all()}
+
         # 4. Borrar Likes (enviados y recibidos)
         like_count = db.query(models.Like).filter(
             (models.Like.liker_id == user_id) | 
@@ -550,8 +1116,13 @@ def reset_account(
         
         # 7. Opcional: Borrar respuestas del Quiz/Compat para que vuelva a hacerlo
         compat_count = db.query(models.UserCompat).filter(models.UserCompat.user_id == user_id).delete(synchronize_session=False)
+
+        # 8. Ranking precalculado: vuelve al feed en vivo hasta el próximo job
+        db.query(models.FeedCandidate).filter(models.FeedCandidate.user_id == user_id).delete(synchronize_session=False)
         
         db.commit()
+        exclusion_cache.invalidate(affected_ids | {user_id})
+        candidate_index.set_compat(user_id, None)
         
         logger.info("reset_finished", user_id=user_id, deleted={"msgs": msg_count, "chats": chat_count, "matches": match_count})
         
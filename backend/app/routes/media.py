@@ -1,19 +1,39 @@
-from fastapi import APIRouter, Query
-from app.services.r2_client import presigned_get_url
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.deps import get_current_user
+from app.models import User
+from app.services.media_access import MAX_MEDIA_BATCH_KEYS, can_sign_media_key, sign_media_keys
+from app.services.r2_client import MAX_PRESIGN_EXPIRES, presigned_get_url
 
 router = APIRouter(prefix="/media", tags=["media"])
 
+
 @router.get("/url")
-def get_media_url(key: str = Query(...), expires: int = 900):
+def get_media_url(
+    key: str = Query(...),
+    expires: int = Query(900, ge=60, le=MAX_PRESIGN_EXPIRES),
+    user: User = Depends(get_current_user),
+):
     # expires en segundos (ej: 900 = 15 min)
+    if not can_sign_media_key(key, user.id):
+        raise HTTPException(status_code=403, detail="No puedes acceder a este archivo")
     url = presigned_get_url(key=key, expires_seconds=expires)
     return {"url": url, "expires": expires}
 
+
 @router.get("/urls/batch")
-def get_media_urls_batch(keys: list[str] = Query(...), expires: int = 900):
-    items = []
-    for key in keys:
-        if key:
-            url = presigned_get_url(key=key, expires_seconds=expires)
-            items.append({"key": key, "url": url})
-    return {"ok": True, "items": items, "expires": expires}
+def get_media_urls_batch(
+    keys: list[str] = Query(...),
+    expires: int = Query(900, ge=60, le=MAX_PRESIGN_EXPIRES),
+    user: User = Depends(get_current_user),
+):
+    """
+    Firma varias keys en una pasada (sin duplicados, por el cache compartido).
+    Las que el usuario no puede firmar van en `denied`, sin URL.
+    """
+    if len(set(keys)) > MAX_MEDIA_BATCH_KEYS:
+        raise HTTPException(
+            status_code=400,
+            detail={"detail": f"Máximo {MAX_MEDIA_BATCH_KEYS} keys por llamada", "code": "TOO_MANY_KEYS"},
+        )
+    items, denied = sign_media_keys(keys, user.id, expires)
+    return {"ok": True, "items": items, "denied": denied, "expires": expires}
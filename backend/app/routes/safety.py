@@ -6,6 +6,8 @@ from typing import Optional
 from ..deps import get_current_user
 from ..database import get_db
 from .. import models
+from ..services.exclusion_cache import exclusion_cache
+from ..services.chat_changes import CHANGE_REMOVED, record_chat_change
 
 router = APIRouter(prefix="/reports", tags=["safety"])
 
@@ -36,6 +38,7 @@ def report_user(
     )
     db.add(new_report)
     db.commit()
+    exclusion_cache.add(user.id, [payload.target_user_id])
     
     return {"ok": True, "message": "Reporte recibido"}
 
@@ -71,5 +74,16 @@ def block_user(
     if existing_match:
         db.delete(existing_match)
 
+    # La conversación queda oculta para ambos (GET /chats filtra bloqueos)
+    conv = db.query(models.Conversation.id).filter(
+        ((models.Conversation.user_a_id == user.id) & (models.Conversation.user_b_id == payload.target_user_id)) |
+        ((models.Conversation.user_a_id == payload.target_user_id) & (models.Conversation.user_b_id == user.id))
+    ).first()
+    if conv:
+        record_chat_change(db, [user.id, payload.target_user_id], conv.id, CHANGE_REMOVED, actor_id=user.id)
+
     db.commit()
+    # El bloqueo excluye en ambos sentidos
+    exclusion_cache.add(user.id, [payload.target_user_id])
+    exclusion_cache.add(payload.target_user_id, [user.id])
     return {"ok": True, "message": "Usuario bloqueado"}
@@ -1,9 +1,18 @@
 import logging
 import uuid
 from fastapi import UploadFile, File, APIRouter, HTTPException, Depends
-from app.services.r2_client import upload_fileobj, presigned_get_url
+from starlette.concurrency import run_in_threadpool
+from app.services.r2_client import upload_fileobj, presigned_get_url, presigned_put_url, head_object, delete_object
+from app.services.voice_intro import VOICE_INTRO_EXTENSIONS, new_voice_intro_key
+from app.services.direct_upload import (
+    UPLOAD_URL_EXPIRES_SECONDS,
+    key_belongs_to,
+    upload_key,
+    validate_upload,
+)
 from app.deps import get_current_user
-from app.models import User
+from app.models import User, UserVerification
+from app import schemas
 
 logger = logging.getLogger("api")
 router = APIRouter()
@@ -34,10 +43,10 @@ async def upload(
     ext = (file.filename or "").split(".")[-1].lower()
     
     if is_audio:
-        # Convención fija para voice_intro según Prompt 2
-        if ext not in ("m4a", "mp3", "aac", "mp4", "wav", "webm"):
+        # users/{id}/voice_intro.{hex}.{ext}: key nueva en cada regrabación
+        if ext not in VOICE_INTRO_EXTENSIONS:
             ext = "m4a"
-        key = f"users/{user.id}/voice_intro.{ext}"
+        key = new_voice_intro_key(user.id, ext)
         logger.info(f"voice_intro upload received: user_id={user.id}, content_type={content_type}, ext={ext}")
     else:
         # Imágenes siguen el flujo aleatorio actual
@@ -50,15 +59,19 @@ async def upload(
         if is_audio and (not content_type or content_type == "application/octet-stream"):
             content_type = f"audio/{ext}" if ext != "m4a" else "audio/x-m4a"
 
-        upload_fileobj(file.file, key=key, content_type=content_type)
+        # boto3 bloquea: fuera del event loop
+        await run_in_threadpool(upload_fileobj, file.file, key=key, content_type=content_type)
         logger.info(f"Subida a R2 completada: {key}")
 
         # Persistencia automática para audios (BACKEND-ONLY logic)
         if is_audio:
+            previous_key = user.voice_intro_key
             user.voice_intro_key = key
             db.add(user)
             db.commit()
             logger.info(f"voice_intro persisted for user_id={user.id} (key={key})")
+            if previous_key and previous_key != key:
+                await run_in_threadpool(delete_object, previous_key)
 
     except Exception as e:
         logger.error(f"Error crítico en upload: {str(e)}")
@@ -83,3 +96,111 @@ async def upload(
         response["key"] = key
 
     return response
+
+
+# -------------------------
+# Subida directa a R2 (los bytes no pasan por la API)
+# -------------------------
+def _pending_verification(db: Session, user: User, verification_id) -> UserVerification:
+    """Misma validación que POST /verification/upload."""
+    verification = None
+    if verification_id is not None:
+        verification = db.query(UserVerification).filter(
+            UserVerification.id == verification_id,
+            UserVerification.user_id == user.id
+        ).first()
+    if not verification:
+        raise HTTPException(status_code=404, detail={"detail": "Solicitud no encontrada", "code": "NOT_FOUND"})
+    if verification.status == "pending_review":
+        raise HTTPException(status_code=409, detail={"detail": "La imagen ya fue subida", "code": "ALREADY_UPLOADED"})
+    if verification.status != "pending_upload":
+        raise HTTPException(
+            status_code=400,
+            detail={"detail": f"Estado inválido: {verification.status}", "code": "INVALID_STATE"}
+        )
+    return verification
+
+
+@router.post("/upload/intent", response_model=schemas.UploadIntentOut)
+def upload_intent(
+    payload: schemas.UploadIntentIn,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Reserva una key del usuario y devuelve una URL PUT prefirmada con
+    Content-Type y Content-Length firmados. El cliente sube directo a R2 y
+    después llama a /upload/finalize.
+    """
+    error = validate_upload(payload.kind, payload.content_type, payload.size)
+    if error:
+        raise HTTPException(status_code=400, detail={"detail": error, "code": "INVALID_UPLOAD"})
+    if payload.kind == "verification":
+        _pending_verification(db, user, payload.verification_id)
+
+    key = upload_key(payload.kind, user.id, payload.content_type, payload.verification_id)
+    try:
+        url = presigned_put_url(key, payload.content_type, payload.size, expires_seconds=UPLOAD_URL_EXPIRES_SECONDS)
+    except Exception as e:
+        logger.error(f"No se pudo prefirmar la subida {key}: {e}")
+        raise HTTPException(status_code=503, detail="Almacenamiento no disponible")
+
+    logger.info(f"upload intent: user_id={user.id} kind={payload.kind} key={key} size={payload.size}")
+    return {
+        "key": key,
+        "url": url,
+        "method": "PUT",
+        "headers": {"Content-Type": payload.content_type, "Content-Length": str(payload.size)},
+        "expires_in": UPLOAD_URL_EXPIRES_SECONDS,
+    }
+
+
+@router.post("/upload/finalize", response_model=schemas.UploadFinalizeOut)
+def upload_finalize(
+    payload: schemas.UploadFinalizeIn,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Confirma una subida directa: la key tiene que ser del usuario y el objeto
+    existir en R2 (HEAD) con tipo y tamaño permitidos; si no cumple se borra.
+    Voice intro y verificación quedan guardados aquí; las fotos se asignan
+    igual que antes (PUT /users/me/photo-key, POST /users/me/gallery).
+    """
+    verification = None
+    if payload.kind == "verification":
+        verification = _pending_verification(db, user, payload.verification_id)
+    if not key_belongs_to(payload.kind, payload.key, user.id, payload.verification_id):
+        raise HTTPException(status_code=403, detail="You do not own this key")
+
+    head = head_object(payload.key)
+    if head is None:
+        raise HTTPException(status_code=400, detail={"detail": "El archivo no está en R2", "code": "UPLOAD_NOT_FOUND"})
+    error = validate_upload(payload.kind, head["content_type"], head["size"])
+    if error:
+        delete_object(payload.key)
+        raise HTTPException(status_code=400, detail={"detail": error, "code": "INVALID_UPLOAD"})
+
+    out = {"ok": True, "key": payload.key}
+    if payload.kind == "photo":
+        out["url"] = presigned_get_url(payload.key)
+    elif payload.kind == "voice_intro":
+        previous_key = user.voice_intro_key
+        user.voice_intro_key = payload.key
+        db.add(user)
+        db.commit()
+        if previous_key and previous_key != payload.key:
+            delete_object(previous_key)
+        out["url"] = presigned_get_url(payload.key, expires_seconds=3600)
+        out["voice_intro_exists"] = True
+        logger.info(f"voice_intro persisted for user_id={user.id} (key={payload.key})")
+    else:
+        from app.routes.verification import sync_verification_status
+
+        verification.image_key = payload.key
+        verification.status = "pending_review"
+        sync_verification_status(db, user.id)
+        db.commit()
+        out["status"] = "pending_review"
+        logger.info(f"verification upload finalized: user_id={user.id} verification_id={verification.id}")
+    return out
@@ -1,16 +1,32 @@
 import os
+from datetime import timedelta, timezone
 from pathlib import Path
 from typing import Any, Dict, Optional
 
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File, HTTPException, Query, Request, Response
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, exists, or_, select
+from sqlalchemy.orm import Session, load_only
 
 from ..deps import get_current_user
 from ..database import get_db
 from .. import models, schemas
-from ..services.r2_client import presigned_get_url, check_object_exists
+from ..services.r2_client import presigned_get_url, presigned_get_urls, list_object_keys, current_presign_window
+from ..services.voice_intro import (
+    VOICE_INTRO_EXTENSIONS,
+    pick_voice_intro_key,
+    recently_checked,
+    voice_intro_prefix,
+)
+from ..geo import sync_user_geohash
+from ..interests import sync_user_interests_mask
+from ..services.candidate_index import candidate_index
+from ..services.exclusion_cache import exclusion_cache
+from ..services.chat_changes import CHANGE_REMOVED, record_chat_change
+from ..services.compat_scoring import encode_answers, to_bytes
 from ..limiter import limiter, LIMIT_PHOTO
+from ..utils import make_etag, not_modified
+from ..security import utcnow
 import structlog
 
 logger = structlog.get_logger("api")
@@ -23,19 +39,73 @@ BASE_DIR = Path(__file__).resolve().parent.parent  # .../app
 # MEDIA_ROOT absoluto (persistente si apuntas a /data/media)
 MEDIA_ROOT = Path(os.getenv("MEDIA_ROOT", str(BASE_DIR / "media"))).resolve()
 
+# Campos de perfil que cambian el feed del propio usuario (ver feed_candidates)
+FEED_RECOMPUTE_FIELDS = {"gender", "show_me", "lat", "lon", "interests"}
+
 
 # -------------------------
 # /users/me
 # -------------------------
-def user_to_out(user: models.User) -> dict:
-    """Helper para centralizar la generación de UserOut con URLs firmadas."""
-    photo_url = None
+def presign_user_media(users, include_gallery: bool = True) -> dict:
+    """
+    Firma en lote las keys de foto, galería y voice intro de varios usuarios.
+    Devuelve {key: url} para pasarlo a user_to_out(user, urls=...).
+    Para tarjetas (user_to_card) va include_gallery=False: no se usa ni se carga.
+    """
+    photo_keys = []
+    voice_keys = []
+    for u in users:
+        if u.profile_photo_key:
+            photo_keys.append(u.profile_photo_key)
+        if include_gallery:
+            photo_keys.extend(u.gallery_photo_keys or [])
+        if u.voice_intro_key:
+            voice_keys.append(u.voice_intro_key)
+    urls = presigned_get_urls(photo_keys)
+    urls.update(presigned_get_urls(voice_keys, expires_seconds=3600))
+    return urls
+
+
+def _signed(key: str, urls: Optional[Dict[str, str]], expires_seconds: int = 900) -> str:
+    if urls is not None and key in urls:
+        return urls[key]
+    return presigned_get_url(key, expires_seconds=expires_seconds)
+
+
+def _photo_url(user: models.User, urls: Optional[Dict[str, str]] = None) -> Optional[str]:
     # Prioridad 1: R2 (profile_photo_key)
     if user.profile_photo_key:
-        photo_url = presigned_get_url(user.profile_photo_key)
+        return _signed(user.profile_photo_key, urls)
     # Prioridad 2: Legacy (photo_path)
-    elif user.photo_path:
-        photo_url = f"/media/{Path(user.photo_path).name}"
+    if user.photo_path:
+        return f"/media/{Path(user.photo_path).name}"
+    return None
+
+
+# is_online: last_seen dentro de este umbral
+ONLINE_THRESHOLD = timedelta(minutes=5)
+
+
+def _is_online(user: models.User) -> bool:
+    if not user.last_seen:
+        return False
+
+    last_seen_aware = user.last_seen
+    if last_seen_aware.tzinfo is None:
+        last_seen_aware = last_seen_aware.replace(tzinfo=timezone.utc)
+
+    return (utcnow() - last_seen_aware) < ONLINE_THRESHOLD
+
+
+def user_to_out(user: models.User, urls: Optional[Dict[str, str]] = None) -> dict:
+    """
+    Helper para centralizar la generación de UserOut con URLs firmadas.
+    `urls` (de presign_user_media) evita firmar key por key en listados.
+    """
+    def _sign(key: str, expires_seconds: int = 900) -> str:
+        return _signed(key, urls, expires_seconds)
+
+    photo_url = _photo_url(user, urls)
 
     # Sanitización de nombre centralizada
     from ..utils import clean_name
@@ -46,25 +116,14 @@ def user_to_out(user: models.User) -> dict:
     if user.gallery_photo_keys:
         for key in user.gallery_photo_keys:
             if key and isinstance(key, str):
-                photo_urls.append(presigned_get_url(key))
+                photo_urls.append(_sign(key))
 
     # Online logic
-    is_online = False
-    if user.last_seen:
-        from ..security import utcnow
-        from datetime import timedelta, timezone
-        
-        last_seen_aware = user.last_seen
-        if last_seen_aware.tzinfo is None:
-            last_seen_aware = last_seen_aware.replace(tzinfo=timezone.utc)
-
-        # 5 minutes threshold
-        if (utcnow() - last_seen_aware) < timedelta(minutes=5):
-            is_online = True
+    is_online = _is_online(user)
 
     # Voice Intro
     exists = bool(user.voice_intro_key)
-    url = presigned_get_url(user.voice_intro_key, expires_seconds=3600) if exists else None
+    url = _sign(user.voice_intro_key, expires_seconds=3600) if exists else None
     
     return {
         "id": user.id,
@@ -99,8 +158,8 @@ def user_to_out(user: models.User) -> dict:
         "favorite_calling": user.favorite_calling,
         "favorite_scripture": user.favorite_scripture,
         "verification_status": user.verification_status,
-        "rejection_reason": getattr(user.verifications[-1], "rejection_reason", None) if user.verifications and user.verification_status == "rejected" else None,
-        "active_instruction": getattr(user.verifications[-1], "instruction", None) if user.verifications and user.verification_status == "pending_upload" else None,
+        "rejection_reason": user.verification_rejection_reason if user.verification_status == "rejected" else None,
+        "active_instruction": user.verification_instruction if user.verification_status == "pending_upload" else None,
         
         # Voice Intro (Fixed)
         "voice_intro_exists": exists,
@@ -109,36 +168,154 @@ def user_to_out(user: models.User) -> dict:
     }
 
 
+# -------------------------
+# Tarjetas y perfil público de otros usuarios
+# -------------------------
+# Columnas que lee una tarjeta (user_to_card). interests_mask va porque los
+# filtros del feed la consultan al paginar. Nada de hashes/tokens ni perfil completo.
+CARD_COLUMNS = (
+    models.User.id,
+    models.User.name,
+    models.User.birthdate,
+    models.User.last_seen,
+    models.User.city,
+    models.User.lat,
+    models.User.lon,
+    models.User.bio,
+    models.User.gender,
+    models.User.marital_status,
+    models.User.has_children,
+    models.User.body_type,
+    models.User.interests,
+    models.User.interests_mask,
+    models.User.photo_path,
+    models.User.profile_photo_key,
+    models.User.voice_intro_key,
+    models.User.verification_status,
+)
+
+
+# Perfil público (user_to_profile): la tarjeta más el resto, sin datos de cuenta
+PROFILE_COLUMNS = CARD_COLUMNS + (
+    models.User.stake,
+    models.User.gallery_photo_keys,
+    models.User.height_cm,
+    models.User.education,
+    models.User.occupation,
+    models.User.mission_served,
+    models.User.mission_years,
+    models.User.favorite_calling,
+    models.User.favorite_scripture,
+    models.User.row_version,
+)
+
+
+def card_load_options() -> tuple:
+    """Opciones de query para cargar usuarios como tarjeta: .options(*card_load_options())."""
+    return (load_only(*CARD_COLUMNS),)
+
+
+def profile_load_options() -> tuple:
+    return (load_only(*PROFILE_COLUMNS),)
+
+
+def profile_version(user: models.User) -> str:
+    """
+    Versión del perfil público: row_version + ventana de firma de sus URLs +
+    is_online (cambia solo con el tiempo, sin escribir la fila).
+    """
+    return f"{user.row_version or 0}-{current_presign_window()}-{int(_is_online(user))}"
+
+
+def user_to_card(user: models.User, urls: Optional[Dict[str, str]] = None) -> dict:
+    """
+    schemas.UserCardOut de un usuario cargado con card_load_options().
+    `urls` de presign_user_media(users, include_gallery=False).
+    """
+    from ..utils import clean_name
+
+    return {
+        "id": user.id,
+        "name": clean_name(user.name),
+        "birthdate": user.birthdate,
+        "is_online": _is_online(user),
+        "city": user.city,
+        "lat": user.lat,
+        "lon": user.lon,
+        "bio": user.bio,
+        "photo_url": _photo_url(user, urls),
+        "gender": user.gender,
+        "marital_status": user.marital_status,
+        "has_children": user.has_children,
+        "body_type": user.body_type,
+        "interests": user.interests or [],
+        "verification_status": user.verification_status,
+        "voice_intro_url": _signed(user.voice_intro_key, urls, 3600) if user.voice_intro_key else None,
+    }
+
+
+def user_to_profile(user: models.User, urls: Optional[Dict[str, str]] = None) -> dict:
+    """schemas.UserProfileOut: la tarjeta más el resto del perfil público."""
+    out = user_to_card(user, urls)
+    out.update({
+        "last_seen": user.last_seen,
+        "stake": user.stake,
+        "photo_urls": [_signed(k, urls) for k in (user.gallery_photo_keys or []) if k and isinstance(k, str)],
+        "height_cm": user.height_cm,
+        "education": user.education,
+        "occupation": user.occupation,
+        "mission_served": user.mission_served,
+        "mission_years": user.mission_years,
+        "favorite_calling": user.favorite_calling,
+        "favorite_scripture": user.favorite_scripture,
+        "voice_intro_exists": bool(user.voice_intro_key),
+        "version": profile_version(user),
+    })
+    return out
+
+
 def repair_voice_intro_if_missing(user: models.User, db: Session):
     """
     Prompt D: Reparación automática para usuarios que ya subieron audio pero no quedó en DB.
+    Un LIST del prefijo users/{id}/voice_intro. como máximo cada
+    VOICE_INTRO_RECHECK_HOURS (users.voice_intro_checked_at); si R2 falla no
+    se marca, para reintentar en el siguiente request.
     """
-    if user.voice_intro_key:
+    if user.voice_intro_key or recently_checked(user):
+        return
+
+    keys = list_object_keys(voice_intro_prefix(user.id), max_keys=len(VOICE_INTRO_EXTENSIONS) * 2)
+    if keys is None:
         return
 
-    # Extensiones comunes a probar
-    extensions = ["m4a", "mp3", "aac", "mp4", "wav", "webm"]
-    for ext in extensions:
-        key = f"users/{user.id}/voice_intro.{ext}"
-        if check_object_exists(key):
-            try:
-                user.voice_intro_key = key
-                db.add(user)
-                db.commit()
-                logger.info("repair_triggered", user_id=user.id, found_ext=ext, key=key)
-            except Exception as e:
-                db.rollback()
-                logger.error("repair_failed", user_id=user.id, error=str(e))
-            break
+    key = pick_voice_intro_key(keys)
+    try:
+        if key:
+            user.voice_intro_key = key
+        user.voice_intro_checked_at = utcnow()
+        db.add(user)
+        db.commit()
+        if key:
+            logger.info("repair_triggered", user_id=user.id, key=key)
+    except Exception as e:
+        db.rollback()
+        logger.error("repair_failed", user_id=user.id, error=str(e))
 
 
 @router.get("/me", response_model=schemas.UserOut)
 def me(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     user: models.User = Depends(get_current_user)
 ):
     # Prompt D: Reparación automática al consultar perfil propio
     repair_voice_intro_if_missing(user, db)
+
+    # Todo lo de UserOut sale de la fila del usuario (ya cargada) + URLs firmadas
+    cached = not_modified(request, response, make_etag(user.id, user.row_version, current_presign_window()))
+    if cached is not None:
+        return cached
     
     exists = bool(user.voice_intro_key)
     logger.info("profile_requested", user_id=user.id, voice_intro_exists=exists)
@@ -184,7 +361,10 @@ def delete_me(
         (models.Conversation.user_b_id == user.id)
     ).all()
     for c in conversations:
+        peer_id = c.user_b_id if c.user_a_id == user.id else c.user_a_id
+        record_chat_change(db, [peer_id], c.id, CHANGE_REMOVED, actor_id=user.id)
         db.delete(c)
+    db.query(models.ChatChange).filter(models.ChatChange.user_id == user.id).delete(synchronize_session=False)
     
     # 3.2 Matches
     db.query(models.Match).filter(
@@ -216,15 +396,25 @@ def delete_me(
         (models.Report.reported_id == user.id)
     ).delete(synchronize_session=False)
 
+    # 3.7 Feed precalculado (propio y como candidato de otros)
+    db.query(models.FeedCandidate).filter(
+        (models.FeedCandidate.user_id == user.id) |
+        (models.FeedCandidate.candidate_id == user.id)
+    ).delete(synchronize_session=False)
+
     # 4. Borrar usuario (Cascades: RefreshToken, UserCompat)
+    user_id = user.id
     db.delete(user)
     db.commit()
+    candidate_index.remove(user_id)
+    exclusion_cache.invalidate([user_id])
     return {"ok": True}
 
 
 @router.put("/me", response_model=schemas.UserOut)
 def update_me(
     payload: schemas.UserUpdate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     user: models.User = Depends(get_current_user),
 ):
@@ -251,9 +441,23 @@ def update_me(
             setattr(user, field, value)
             logger.info("user_update_field", field=field, value=value, user_id=user.id)
 
+    # Mantener la celda geohash sincronizada con la ubicación
+    if "lat" in update_data or "lon" in update_data:
+        sync_user_geohash(user)
+
+    # Bitset de intereses para el feed
+    if "interests" in update_data:
+        sync_user_interests_mask(user)
+
     db.add(user)
     db.commit()
     db.refresh(user)
+    candidate_index.upsert(user)
+
+    # Cambios que alteran su propio feed: recalcular el ranking precalculado
+    if FEED_RECOMPUTE_FIELDS.intersection(update_data):
+        from .matches import recompute_user_feed_task
+        background_tasks.add_task(recompute_user_feed_task, user.id)
     return user_to_out(user)
 
 
@@ -299,6 +503,7 @@ def upload_photo_local(
     db.add(user)
     db.commit()
     db.refresh(user)
+    candidate_index.upsert(user)
 
     return {"url": f"/media/{filename}"}
 
@@ -314,6 +519,7 @@ class QuizAnswersIn(BaseModel):
 @router.post("/me/quiz-answers", response_model=schemas.QuizAnswersOut)
 def save_quiz_answers(
     payload: QuizAnswersIn,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     user: models.User = Depends(get_current_user),
 ):
@@ -330,6 +536,8 @@ def save_quiz_answers(
         db.refresh(compat)
 
     compat.answers = payload.answers or {}
+    vector = encode_answers(compat.answers)
+    compat.vector = to_bytes(vector)
     # Si luego agregas columna version en UserCompat, aquí la seteas
     if hasattr(compat, "version"):
         compat.version = payload.version
@@ -337,6 +545,11 @@ def save_quiz_answers(
     db.add(compat)
     db.commit()
     db.refresh(compat)
+    candidate_index.set_compat(user.id, vector)
+
+    # La compatibilidad cambia el orden de su feed precalculado
+    from .matches import recompute_user_feed_task
+    background_tasks.add_task(recompute_user_feed_task, user.id)
 
     return {"user_id": user.id, "answers": compat.answers or {}, "version": payload.version}
 
@@ -372,6 +585,7 @@ def set_photo_key(
     db.add(user)
     db.commit()
     db.refresh(user)
+    candidate_index.upsert(user)
 
     logger.info("photo_key_saved", user_id=user.id, key=user.profile_photo_key)
     return {"ok": True, "profile_photo_key": user.profile_photo_key}
@@ -451,3 +665,93 @@ def remove_gallery_photo(
         db.refresh(user)
     
     return user_to_out(user)
+
+
+# -------------------------
+# /users/batch y /users/{id}/profile
+# -------------------------
+@router.get("/batch", response_model=schemas.UserBatchOut)
+def get_users_batch(
+    ids: str = Query(..., description="Ids separados por coma"),
+    known: Optional[str] = Query(None, description="id:version que el cliente ya tiene, separados por coma"),
+    db: Session = Depends(get_db),
+    user: models.User = Depends(get_current_user)
+):
+    """
+    Perfiles públicos de hasta MAX_PROFILE_BATCH usuarios en una llamada
+    (peers de chats, matches, tarjetas cacheadas): una consulta de bloqueos,
+    un IN de usuarios y firma de URLs en lote. Los ids con `known` vigente
+    no se reenvían (van en `unchanged`); bloqueados e inexistentes van en `missing`.
+    """
+    try:
+        requested = list(dict.fromkeys(int(x) for x in ids.split(",") if x.strip()))
+        known_versions = {}
+        for item in (known or "").split(","):
+            if item.strip():
+                uid, version = item.split(":", 1)
+                known_versions[int(uid)] = version.strip()
+    except ValueError:
+        raise HTTPException(status_code=400, detail={"detail": "Invalid ids", "code": "INVALID_IDS"})
+    if len(requested) > schemas.MAX_PROFILE_BATCH:
+        raise HTTPException(
+            status_code=400,
+            detail={"detail": f"Máximo {schemas.MAX_PROFILE_BATCH} ids por llamada", "code": "TOO_MANY_IDS"},
+        )
+    if not requested:
+        return {"profiles": {}, "unchanged": [], "missing": []}
+
+    blocked = set(db.execute(
+        select(models.Block.blocked_id).where(
+            models.Block.blocker_id == user.id, models.Block.blocked_id.in_(requested)
+        ).union(
+            select(models.Block.blocker_id).where(
+                models.Block.blocked_id == user.id, models.Block.blocker_id.in_(requested)
+            )
+        )
+    ).scalars())
+    allowed = set(requested) - blocked
+    found = {}
+    if allowed:
+        rows = db.query(models.User).options(*profile_load_options()).filter(models.User.id.in_(allowed)).all()
+        found = {u.id: u for u in rows}
+
+    unchanged = []
+    stale = []
+    for uid in requested:
+        target = found.get(uid)
+        if target is None:
+            continue
+        if uid in known_versions and known_versions[uid] == profile_version(target):
+            unchanged.append(uid)
+        else:
+            stale.append(target)
+
+    urls = presign_user_media(stale)
+    return {
+        "profiles": {u.id: user_to_profile(u, urls=urls) for u in stale},
+        "unchanged": unchanged,
+        "missing": [uid for uid in requested if uid not in found],
+    }
+
+
+@router.get("/{user_id}/profile", response_model=schemas.UserProfileOut)
+def get_user_profile(
+    user_id: int,
+    db: Session = Depends(get_db),
+    user: models.User = Depends(get_current_user)
+):
+    """
+    Perfil público completo de otro usuario (detalle de una tarjeta del feed
+    o de un match). 404 si no existe o hay bloqueo en cualquier sentido.
+    """
+    blocked = db.query(exists().where(or_(
+        and_(models.Block.blocker_id == user.id, models.Block.blocked_id == user_id),
+        and_(models.Block.blocker_id == user_id, models.Block.blocked_id == user.id),
+    ))).scalar()
+    target = None if blocked else (
+        db.query(models.User).options(*profile_load_options()).filter(models.User.id == user_id).first()
+    )
+    if not target:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+
+    return user_to_profile(target, urls=presign_user_media([target]))
@@ -3,12 +3,14 @@ import structlog
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
+from starlette.concurrency import run_in_threadpool
 
 from ..database import get_db
 from ..models import User, UserVerification
 from ..schemas import VerificationRequestOut, VerificationMeOut
 from ..deps import get_current_user
 from ..services.r2_client import upload_fileobj
+from ..services.direct_upload import upload_key
 import os
 
 router = APIRouter()
@@ -22,6 +24,27 @@ INSTRUCTIONS = [
     "Toca tu nariz"
 ]
 
+
+def sync_verification_status(db: Session, user_id: int) -> None:
+    """
+    Copia a users.verification_status / verification_rejection_reason /
+    verification_instruction lo de la verificación más reciente del usuario.
+    Llamar después de modificar la verificación y ANTES del commit, para que
+    ambos cambios queden en la misma transacción.
+    """
+    user = db.get(User, user_id)
+    if user is None:
+        return
+    db.flush()  # SessionLocal no hace autoflush: la consulta debe ver el cambio
+    latest = db.query(UserVerification).filter(
+        UserVerification.user_id == user_id
+    ).order_by(desc(UserVerification.id)).first()
+
+    user.verification_status = latest.status if latest else "none"
+    user.verification_rejection_reason = latest.rejection_reason if latest else None
+    user.verification_instruction = latest.instruction if latest else None
+
+
 @router.post("/request", response_model=VerificationRequestOut)
 def request_verification(
     db: Session = Depends(get_db),
@@ -79,6 +102,7 @@ def request_verification(
     )
     
     db.add(new_request)
+    sync_verification_status(db, user.id)
     db.commit()
     db.refresh(new_request)
     
@@ -119,14 +143,16 @@ async def upload_verification(
             detail={"detail": f"Estado inválido: {verification.status}", "code": "INVALID_STATE"}
         )
 
-    # Key determinística: verifications/{user_id}/{verification_id}.jpg
-    key = f"verifications/{user.id}/{verification.id}.jpg"
+    # verifications/{user_id}/{verification_id}_{hex}.jpg (única por subida)
+    key = upload_key("verification", user.id, "image/jpeg", verification.id)
     
     try:
-        upload_fileobj(file.file, key=key, content_type="image/jpeg")
+        # boto3 bloquea: fuera del event loop
+        await run_in_threadpool(upload_fileobj, file.file, key=key, content_type="image/jpeg")
         
         verification.image_key = key
         verification.status = "pending_review"
+        sync_verification_status(db, user.id)
         db.commit()
         
         logger.info("upload_success", user_id=user.id, verification_id=verification.id, key=key)
@@ -140,6 +140,73 @@ class UserOut(BaseModel):
     voice_intro_url: Optional[str] = Field(None, alias="voiceIntroUrl")
 
 
+class UserCardOut(BaseModel):
+    """
+    Tarjeta compacta de otro usuario para el feed y la lista de matches: solo
+    lo que pinta la tarjeta. El perfil completo va por GET /users/{id}/profile.
+    """
+    id: int
+    name: Optional[str] = None
+    birthdate: Optional[date] = None
+    is_online: bool = False
+
+    city: Optional[str] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    bio: Optional[str] = None
+    photo_url: Optional[str] = None
+
+    gender: Optional[str] = None
+    marital_status: Optional[str] = None
+    has_children: Optional[bool] = None
+    body_type: Optional[str] = None
+    interests: List[str] = Field(default_factory=list)
+
+    verification_status: str = "none"
+    voice_intro_url: Optional[str] = None
+
+    # Solo en el feed
+    compatibility: Optional[float] = None
+
+
+class UserProfileOut(UserCardOut):
+    """Perfil público completo de otro usuario (sin email ni datos de cuenta)."""
+    last_seen: Optional[datetime] = None
+    stake: Optional[str] = None
+    photo_urls: List[str] = Field(default_factory=list)
+
+    height_cm: Optional[int] = None
+    education: Optional[str] = None
+    occupation: Optional[str] = None
+
+    mission_served: Optional[str] = None
+    mission_years: Optional[str] = None
+    favorite_calling: Optional[str] = None
+    favorite_scripture: Optional[str] = None
+
+    voice_intro_exists: bool = False
+
+    # Cambia si cambia el perfil o la ventana de firma de sus URLs
+    version: Optional[str] = None
+
+
+MAX_PROFILE_BATCH = 100
+
+
+class UserBatchOut(BaseModel):
+    profiles: Dict[int, UserProfileOut] = Field(default_factory=dict)
+    # Ids que el cliente ya tiene en su versión actual (`known`): no se reenvían
+    unchanged: List[int] = Field(default_factory=list)
+    # Inexistentes o con bloqueo
+    missing: List[int] = Field(default_factory=list)
+
+
+class FeedPageOut(BaseModel):
+    matches: List[UserCardOut]
+    next_cursor: Optional[str] = None
+    debug: Optional[Dict[str, Any]] = None
+
+
 class LanguageUpdateIn(BaseModel):
     language: Literal["es", "en"]
 
@@ -167,6 +234,42 @@ class PhotoUrlOut(BaseModel):
     expires: int = 900
 
 
+# ----------------------------
+# Subida directa a R2 (URL PUT prefirmada)
+# ----------------------------
+UploadKind = Literal["photo", "voice_intro", "verification"]
+
+
+class UploadIntentIn(BaseModel):
+    kind: UploadKind
+    content_type: str
+    size: int = Field(..., gt=0)
+    verification_id: Optional[int] = None  # solo kind="verification"
+
+
+class UploadIntentOut(BaseModel):
+    key: str
+    url: str
+    method: str = "PUT"
+    # Deben mandarse tal cual en el PUT (van firmados)
+    headers: Dict[str, str]
+    expires_in: int
+
+
+class UploadFinalizeIn(BaseModel):
+    kind: UploadKind
+    key: str
+    verification_id: Optional[int] = None
+
+
+class UploadFinalizeOut(BaseModel):
+    ok: bool = True
+    key: str
+    url: Optional[str] = None
+    voice_intro_exists: Optional[bool] = None
+    status: Optional[str] = None  # estado de la verificación
+
+
 # ----------------------------
 # Email Verification (6-digit code)
 # ----------------------------
@@ -211,6 +314,37 @@ class QuizAnswersOut(BaseModel):
     version: Optional[str] = None
 
 
+# ----------------------------
+# Swipes (batch)
+# ----------------------------
+MAX_SWIPES_PER_BATCH = 100
+
+
+class SwipeIn(BaseModel):
+    target_id: int
+    action: Literal["like", "pass"]
+    # Momento del swipe en el cliente (cola offline); opcional
+    client_ts: Optional[datetime] = None
+
+
+class SwipeBatchIn(BaseModel):
+    swipes: List[SwipeIn] = Field(min_length=1, max_length=MAX_SWIPES_PER_BATCH)
+
+
+class SwipeResultOut(BaseModel):
+    target_id: int
+    action: str
+    ok: bool
+    matched: bool = False
+    message: Optional[str] = None
+    code: Optional[str] = None
+
+
+class SwipeBatchOut(BaseModel):
+    results: List[SwipeResultOut]
+    new_matches: List[int] = Field(default_factory=list)
+
+
 # ----------------------------
 # Messaging
 # ----------------------------
@@ -248,6 +382,26 @@ class ChatListOut(BaseModel):
         from_attributes = True
 
 
+class ChatChangeMessageOut(MessageOut):
+    conversation_id: int
+
+
+class ChatReadOut(BaseModel):
+    conversation_id: int
+    reader_id: int
+    until_message_id: Optional[int] = None  # null = leyó todo
+
+
+class ChatChangesOut(BaseModel):
+    """Delta de GET /chats/changes: todo lo posterior al cursor `since`."""
+    cursor: int
+    has_more: bool = False
+    conversations: List[ChatListOut] = Field(default_factory=list)
+    messages: List[ChatChangeMessageOut] = Field(default_factory=list)
+    reads: List[ChatReadOut] = Field(default_factory=list)
+    removed: List[int] = Field(default_factory=list)
+
+
 class MessageCreate(BaseModel):
     body: str = Field(min_length=1, max_length=1000)
 
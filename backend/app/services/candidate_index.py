@@ -0,0 +1,482 @@
+"""
+Índice columnar en memoria (por proceso) para el feed de /matches/suggested.
+
+Guarda en arrays NumPy los atributos que filtran candidatos (género, show_me,
+fecha de nacimiento, ubicación, foto, email verificado) para que el filtro de
+reciprocidad, edad y distancia sea una sola pasada vectorizada en lugar de
+subqueries en SQL + loops en Python.
+
+Se construye perezosamente desde la BD y se mantiene incrementalmente con
+upsert()/remove() desde las rutas que escriben esos campos. Como red de
+seguridad (scripts, otros procesos) se reconstruye completo cada
+CANDIDATE_INDEX_TTL_SECONDS en un hilo de fondo (uno a la vez): mientras
+tanto se sigue sirviendo la copia anterior, y los cambios que llegan durante
+la lectura se reaplican sobre la nueva antes de reemplazarla. Solo la carga
+inicial bloquea al request que la dispara.
+"""
+import os
+import threading
+import time
+from datetime import date, datetime, timezone
+from typing import Optional, Tuple
+
+import numpy as np
+import structlog
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import SessionLocal
+from ..geo import EARTH_RADIUS_KM
+from ..interests import popcount64
+from .compat_scoring import COMPAT_VECTOR_DIM, compatibility, from_bytes
+
+logger = structlog.get_logger("candidate_index")
+
+CANDIDATE_INDEX_TTL_SECONDS = int(os.getenv("CANDIDATE_INDEX_TTL_SECONDS", "300"))
+
+# Pesos del score de ranking (compatibilidad + intereses + cercanía + actividad reciente)
+SCORE_WEIGHT_COMPAT = float(os.getenv("SCORE_WEIGHT_COMPAT", "0.45"))
+SCORE_WEIGHT_INTERESTS = float(os.getenv("SCORE_WEIGHT_INTERESTS", "0.15"))
+SCORE_WEIGHT_DISTANCE = float(os.getenv("SCORE_WEIGHT_DISTANCE", "0.25"))
+SCORE_WEIGHT_RECENCY = float(os.getenv("SCORE_WEIGHT_RECENCY", "0.15"))
+SCORE_DISTANCE_SCALE_KM = 25.0        # a esta distancia la cercanía vale 0.5
+SCORE_RECENCY_SCALE_SECONDS = 7 * 86400.0  # decaimiento de la actividad
+
+_INITIAL_CAPACITY = 1024
+
+# Código 0 = NULL / vacío
+_NULL_CODE = 0
+
+# Arrays por fila (nombre, valor de relleno)
+_COLUMNS = (
+    ("ids", 0), ("alive", False), ("gender", 0), ("show_me", 0),
+    ("birth_ord", 0), ("lat_rad", np.nan), ("lon_rad", np.nan),
+    ("has_photo", False), ("email_verified", False), ("last_active", np.nan),
+    ("compat", 0.0), ("has_compat", False), ("interests", 0),
+)
+
+
+def _epoch(dt: Optional[datetime]) -> float:
+    """Timestamp UTC (SQLite devuelve datetimes naive en UTC); NaN si falta."""
+    if dt is None:
+        return np.nan
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def years_ago(today: date, years: int) -> date:
+    """Misma fecha `years` años atrás (29-feb -> 28-feb)."""
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        return today.replace(year=today.year - years, day=28)
+
+
+class CandidateIndex:
+    def __init__(self, ttl_seconds: int = CANDIDATE_INDEX_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.RLock()
+        self._built_at: Optional[float] = None
+        self._stale = False
+        # Reconstrucción en curso (single-flight) y cambios a reaplicar al terminar
+        self._building = False
+        self._pending = []
+        self._initial_build_lock = threading.Lock()
+        self._codes = {None: _NULL_CODE}
+        self._reset(_INITIAL_CAPACITY)
+
+    # -------------------------
+    # Almacenamiento
+    # -------------------------
+    def _reset(self, capacity: int):
+        self._size = 0
+        self._pos = {}
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.gender = np.zeros(capacity, dtype=np.int16)
+        self.show_me = np.zeros(capacity, dtype=np.int16)
+        self.birth_ord = np.zeros(capacity, dtype=np.int32)  # 0 = sin fecha
+        self.lat_rad = np.full(capacity, np.nan, dtype=np.float64)
+        self.lon_rad = np.full(capacity, np.nan, dtype=np.float64)
+        self.has_photo = np.zeros(capacity, dtype=bool)
+        self.email_verified = np.zeros(capacity, dtype=bool)
+        self.last_active = np.full(capacity, np.nan, dtype=np.float64)  # epoch s
+        self.compat = np.zeros((capacity, COMPAT_VECTOR_DIM), dtype=np.float32)
+        self.has_compat = np.zeros(capacity, dtype=bool)
+        self.interests = np.zeros(capacity, dtype=np.uint64)  # bitset (app/interests.py)
+
+    def _grow(self):
+        capacity = len(self.ids) * 2
+        for name, fill in _COLUMNS:
+            old = getattr(self, name)
+            new = np.full((capacity,) + old.shape[1:], fill, dtype=old.dtype)
+            new[: self._size] = old[: self._size]
+            setattr(self, name, new)
+
+    def code(self, value: Optional[str]) -> int:
+        """Código entero estable para un valor de gender/show_me."""
+        if value is not None:
+            value = str(value).strip().lower() or None
+        c = self._codes.get(value)
+        if c is None:
+            c = len(self._codes)
+            self._codes[value] = c
+        return c
+
+    def _write_row(self, row: int, user_id, gender, show_me, birthdate, lat, lon, has_photo, email_verified, last_active, interests_mask, compat_vec):
+        self.ids[row] = user_id
+        self.alive[row] = True
+        self.gender[row] = self.code(gender)
+        self.show_me[row] = self.code(show_me)
+        self.birth_ord[row] = birthdate.toordinal() if birthdate else 0
+        if lat is not None and lon is not None:
+            self.lat_rad[row] = np.radians(lat)
+            self.lon_rad[row] = np.radians(lon)
+        else:
+            self.lat_rad[row] = np.nan
+            self.lon_rad[row] = np.nan
+        self.has_photo[row] = bool(has_photo)
+        self.email_verified[row] = bool(email_verified)
+        self.last_active[row] = _epoch(last_active)
+        self.interests[row] = int(interests_mask or 0)
+        self._write_compat(row, compat_vec)
+
+    def _write_compat(self, row: int, vec: Optional[np.ndarray]):
+        if vec is None:
+            self.compat[row] = 0.0
+            self.has_compat[row] = False
+        else:
+            self.compat[row] = vec
+            self.has_compat[row] = True
+
+    def _append(self, user_id, *fields):
+        if self._size == len(self.ids):
+            self._grow()
+        row = self._size
+        self._size += 1
+        self._pos[user_id] = row
+        self._write_row(row, user_id, *fields)
+
+    # -------------------------
+    # Carga y mantenimiento
+    # -------------------------
+    def rebuild(self, db: Session):
+        """Reconstruye el índice completo (síncrono); no hace nada si ya hay otra reconstrucción en curso."""
+        if self._start_build():
+            self._build(db)
+
+    def _start_build(self) -> bool:
+        with self._lock:
+            if self._building:
+                return False
+            self._building = True
+            self._stale = False
+            self._pending = []
+            return True
+
+    def _build(self, db: Session):
+        """
+        Lee todo con una sola consulta de columnas en un índice nuevo (sin
+        tomar el lock) y lo intercambia con el actual tras reaplicar los
+        cambios encolados durante la lectura.
+        """
+        started = time.perf_counter()
+        try:
+            rows = self._load_rows(db)
+            fresh = CandidateIndex(self.ttl_seconds)
+            fresh._reset(max(_INITIAL_CAPACITY, len(rows)))
+            for r in rows:
+                fresh._append(
+                    r.id, r.gender, r.show_me, r.birthdate, r.lat, r.lon,
+                    bool(r.profile_photo_key or r.photo_path), r.email_verified,
+                    r.last_seen or r.created_at, r.interests_mask, from_bytes(r.vector),
+                )
+            with self._lock:
+                replayed = len(self._pending)
+                for method, args in self._pending:
+                    getattr(fresh, method)(*args)
+                for name, _ in _COLUMNS:
+                    setattr(self, name, getattr(fresh, name))
+                self._size, self._pos, self._codes = fresh._size, fresh._pos, fresh._codes
+                self._built_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._building = False
+                self._pending = []
+        logger.info(
+            "candidate_index_rebuilt",
+            users=len(rows),
+            replayed=replayed,
+            ms=f"{(time.perf_counter() - started) * 1000:.2f}",
+        )
+
+    def _load_rows(self, db: Session):
+        return (
+            db.query(
+                models.User.id,
+                models.User.gender,
+                models.User.show_me,
+                models.User.birthdate,
+                models.User.lat,
+                models.User.lon,
+                models.User.profile_photo_key,
+                models.User.photo_path,
+                models.User.email_verified,
+                models.User.last_seen,
+                models.User.created_at,
+                models.User.interests_mask,
+                models.UserCompat.vector,
+            )
+            .outerjoin(models.UserCompat, models.UserCompat.user_id == models.User.id)
+            .order_by(models.User.id)
+            .all()
+        )
+
+    def _rebuild_in_background(self):
+        if not self._start_build():
+            return
+
+        def run():
+            try:
+                with SessionLocal() as db:
+                    self._build(db)
+            except Exception as e:
+                logger.error("candidate_index_rebuild_failed", error=str(e))
+
+        threading.Thread(target=run, name="candidate-index-rebuild", daemon=True).start()
+
+    def ensure_fresh(self, db: Session):
+        """
+        Carga inicial en este request (no hay nada que servir; los requests
+        concurrentes la esperan). Después, si venció el TTL o se llamó a
+        invalidate(), reconstruye en segundo plano y responde con la copia actual.
+        """
+        if self._built_at is None:
+            with self._initial_build_lock:
+                if self._built_at is None:
+                    self.rebuild(db)
+            return
+        if self._stale or (time.monotonic() - self._built_at) > self.ttl_seconds:
+            self._rebuild_in_background()
+
+    def invalidate(self):
+        """Pide reconstrucción completa en el próximo uso (ej. borrados masivos)."""
+        with self._lock:
+            self._stale = True
+
+    def _tracked(self) -> bool:
+        """True si hay dónde aplicar cambios: índice construido o en construcción."""
+        with self._lock:
+            return self._built_at is not None or self._building
+
+    def _apply(self, method: str, *args):
+        """Aplica el cambio al índice actual y, si hay reconstrucción en curso, lo encola para la nueva copia."""
+        with self._lock:
+            if self._building:
+                self._pending.append((method, args))
+            if self._built_at is not None:
+                getattr(self, method)(*args)
+
+    def upsert(self, user: models.User):
+        """Refresca (o agrega) la fila de un usuario tras un commit."""
+        if not self._tracked():
+            return  # Aún no construido: la carga inicial lo incluirá
+        fields = (
+            user.gender, user.show_me, user.birthdate, user.lat, user.lon,
+            bool(user.profile_photo_key or user.photo_path), user.email_verified,
+            user.last_seen or user.created_at, user.interests_mask,
+            from_bytes(user.compat.vector) if user.compat is not None else None,
+        )
+        self._apply("_upsert_fields", user.id, fields)
+
+    def _upsert_fields(self, user_id: int, fields: tuple):
+        row = self._pos.get(user_id)
+        if row is None:
+            self._append(user_id, *fields)
+        else:
+            self._write_row(row, user_id, *fields)
+
+    def set_compat(self, user_id: int, vec: Optional[np.ndarray]):
+        """Actualiza solo el vector de compatibilidad (al guardar el quiz)."""
+        self._apply("_set_compat", user_id, vec)
+
+    def _set_compat(self, user_id: int, vec: Optional[np.ndarray]):
+        row = self._pos.get(user_id)
+        if row is not None:
+            self._write_compat(row, vec)
+
+    def compat_vector(self, user_id: int) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._pos.get(user_id)
+            if row is None or not self.has_compat[row]:
+                return None
+            return self.compat[row].copy()
+
+    def remove(self, user_id: int):
+        self._apply("_remove", user_id)
+
+    def _remove(self, user_id: int):
+        row = self._pos.pop(user_id, None)
+        if row is not None:
+            self.alive[row] = False
+
+    def __len__(self):
+        return len(self._pos)
+
+    # -------------------------
+    # Consulta vectorizada
+    # -------------------------
+    def _filter_rows(
+        self,
+        *,
+        exclude_id: int,
+        candidate_gender: Optional[str] = None,
+        viewer_gender: Optional[str] = None,
+        min_age: Optional[int] = None,
+        max_age: Optional[int] = None,
+        lat: Optional[float] = None,
+        lon: Optional[float] = None,
+        max_distance_km: Optional[float] = None,
+        require_photo: bool = False,
+        require_email_verified: bool = False,
+        min_shared_interests: Optional[int] = None,
+        today: Optional[date] = None,
+    ) -> np.ndarray:
+        """Posiciones de las filas que pasan los filtros (llamar con el lock tomado)."""
+        today = today or date.today()
+        n = self._size
+        mask = self.alive[:n].copy()
+        mask &= self.ids[:n] != exclude_id
+
+        if require_email_verified:
+            mask &= self.email_verified[:n]
+        if require_photo:
+            mask &= self.has_photo[:n]
+
+        if candidate_gender is not None:
+            mask &= self.gender[:n] == self.code(candidate_gender)
+
+        if viewer_gender:
+            show_me = self.show_me[:n]
+            mask &= (
+                (show_me == self.code(viewer_gender))
+                | (show_me == self.code("everyone"))
+                | (show_me == _NULL_CODE)
+            )
+
+        birth = self.birth_ord[:n]
+        if min_age is not None:
+            # edad >= min_age  <=>  nació en o antes de hoy - min_age años
+            limit = years_ago(today, min_age).toordinal()
+            mask &= (birth == 0) | (birth <= limit)
+        if max_age is not None:
+            # edad <= max_age  <=>  nació después de hoy - (max_age + 1) años
+            limit = years_ago(today, max_age + 1).toordinal()
+            mask &= (birth == 0) | (birth > limit)
+
+        if min_shared_interests:
+            shared = popcount64(self.interests[:n] & self._viewer_interests(exclude_id))
+            mask &= shared >= min_shared_interests
+
+        rows = np.flatnonzero(mask)
+        if max_distance_km is not None and lat is not None and lon is not None:
+            dist = self._distances_km(rows, lat, lon)
+            # Sin ubicación (NaN) no se excluye
+            rows = rows[np.isnan(dist) | (dist <= float(max_distance_km))]
+        return rows
+
+    def _viewer_interests(self, user_id: int) -> np.uint64:
+        row = self._pos.get(user_id)
+        return self.interests[row] if row is not None else np.uint64(0)
+
+    def _distances_km(self, rows: np.ndarray, lat: float, lon: float) -> np.ndarray:
+        """Haversine vectorizado desde (lat, lon); NaN para filas sin ubicación."""
+        cand_lat = self.lat_rad[rows]
+        cand_lon = self.lon_rad[rows]
+        phi1 = np.radians(lat)
+        dphi = cand_lat - phi1
+        dlambda = cand_lon - np.radians(lon)
+        a = np.sin(dphi / 2.0) ** 2 + np.cos(phi1) * np.cos(cand_lat) * np.sin(dlambda / 2.0) ** 2
+        return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+    def query(self, **filters) -> np.ndarray:
+        """
+        Ids (ordenados asc) de usuarios que pasan los filtros del feed.
+        - candidate_gender: género que debe tener el candidato (None = cualquiera)
+        - viewer_gender: reciprocidad; el candidato debe tener show_me igual,
+          'everyone' o NULL
+        - Edad y distancia no excluyen a quien no tiene fecha/ubicación.
+        """
+        with self._lock:
+            return np.sort(self.ids[self._filter_rows(**filters)])
+
+    def rank(
+        self,
+        *,
+        limit: int,
+        exclude_ids: Optional[np.ndarray] = None,
+        after: Optional[Tuple[float, int]] = None,
+        now: Optional[float] = None,
+        **filters,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top `limit` candidatos (ids, scores) por score desc, empate por id asc.
+        Acepta los mismos filtros que query(); el viewer es `exclude_id` y sus
+        lat/lon alimentan la cercanía aunque no haya max_distance_km.
+        - after: keyset (score, id) de la última fila ya entregada
+        - now: epoch fijo para la actividad reciente (estable entre páginas)
+        """
+        now = time.time() if now is None else now
+        lat, lon = filters.get("lat"), filters.get("lon")
+        with self._lock:
+            rows = self._filter_rows(**filters)
+            if exclude_ids is not None and exclude_ids.size:
+                rows = rows[~np.isin(self.ids[rows], exclude_ids)]
+            ids = self.ids[rows]
+
+            viewer_row = self._pos.get(filters["exclude_id"])
+            viewer_vec = None
+            if viewer_row is not None and self.has_compat[viewer_row]:
+                viewer_vec = self.compat[viewer_row]
+            compat = compatibility(viewer_vec, self.compat[rows], self.has_compat[rows])
+
+            # Intereses en común (Jaccard sobre el bitset)
+            viewer_mask = self._viewer_interests(filters["exclude_id"])
+            cand_masks = self.interests[rows]
+            shared = popcount64(cand_masks & viewer_mask)
+            union = popcount64(cand_masks | viewer_mask)
+            interest_overlap = np.divide(shared, union, out=np.zeros(len(rows)), where=union > 0)
+
+            if lat is not None and lon is not None:
+                dist = self._distances_km(rows, lat, lon)
+                proximity = np.where(np.isnan(dist), 0.5, 1.0 / (1.0 + dist / SCORE_DISTANCE_SCALE_KM))
+            else:
+                proximity = np.full(len(rows), 0.5)
+
+            idle = np.maximum(now - self.last_active[rows], 0.0)
+            recency = np.where(np.isnan(idle), 0.0, np.exp(-idle / SCORE_RECENCY_SCALE_SECONDS))
+
+        scores = (
+            SCORE_WEIGHT_COMPAT * compat
+            + SCORE_WEIGHT_INTERESTS * interest_overlap
+            + SCORE_WEIGHT_DISTANCE * proximity
+            + SCORE_WEIGHT_RECENCY * recency
+        )
+
+        if after is not None:
+            keep = (scores < after[0]) | ((scores == after[0]) & (ids > after[1]))
+            ids, scores = ids[keep], scores[keep]
+
+        if len(scores) > limit:
+            # Top-k parcial: todo lo que empata con el k-ésimo score entra al desempate
+            kth = np.partition(-scores, limit - 1)[limit - 1]
+            top = -scores <= kth
+            ids, scores = ids[top], scores[top]
+
+        order = np.lexsort((ids, -scores))[:limit]
+        return ids[order], scores[order]
+
+
+# Singleton por proceso
+candidate_index = CandidateIndex()
@@ -0,0 +1,101 @@
+"""
+Registro de cambios de chat para sincronizar por delta (GET /chats/changes).
+
+Las rutas que cambian algo visible en la bandeja o en un chat llaman a
+record_chat_change() dentro de su transacción, antes del commit, con los
+participantes como destinatarios. El cliente guarda el cursor (el id del
+último cambio visto) y al volver del background pide solo lo posterior con
+una consulta por rango sobre (user_id, id).
+
+El cursor solo es válido si los ids se hacen visibles en orden: un cambio
+que toma el id N y hace commit después de que N+1 ya se leyó quedaría
+saltado para siempre. En SQLite los escritores ya van de uno en uno; en
+Postgres record_chat_change toma un advisory lock de transacción, así que
+los ids de chat_changes se asignan y se confirman en el mismo orden.
+
+Los cambios viejos se purgan (prune_chat_changes, en el job diario). Si un
+cursor quedó antes de lo purgado, el cliente debe recargar todo
+(410 RESYNC_REQUIRED).
+"""
+import os
+from datetime import timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..security import utcnow
+
+CHAT_CHANGES_RETENTION_DAYS = int(os.getenv("CHAT_CHANGES_RETENTION_DAYS", "30"))
+
+CHANGE_CONVERSATION = "conversation"
+CHANGE_MESSAGE = "message"
+CHANGE_READ = "read"
+CHANGE_REMOVED = "removed"
+
+# Clave del advisory lock que serializa las escrituras de chat_changes (Postgres)
+CHAT_CHANGES_LOCK_KEY = 0x63686174  # "chat"
+
+
+def _serialize_writers(db: Session) -> None:
+    """
+    En Postgres, lock exclusivo hasta el commit/rollback de esta transacción,
+    antes de que el flush asigne ids: quien tome ids después espera a que
+    estos sean visibles. En SQLite no hace falta (un escritor a la vez).
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CHAT_CHANGES_LOCK_KEY})
+
+
+def record_chat_change(
+    db: Session,
+    user_ids: Iterable[int],
+    conversation_id: int,
+    kind: str,
+    actor_id: Optional[int] = None,
+    message_id: Optional[int] = None,
+) -> None:
+    """Agrega un cambio por destinatario a la sesión (sin commit)."""
+    _serialize_writers(db)
+    db.add_all([
+        models.ChatChange(
+            user_id=uid,
+            conversation_id=conversation_id,
+            kind=kind,
+            actor_id=actor_id,
+            message_id=message_id,
+        )
+        for uid in set(user_ids)
+    ])
+
+
+def latest_chat_cursor(db: Session) -> int:
+    """
+    Cursor "ahora" (MAX(id) por PK, sin importar el usuario): todo cambio
+    posterior para cualquier usuario tendrá un id mayor.
+    """
+    return db.query(func.max(models.ChatChange.id)).scalar() or 0
+
+
+def cursor_expired(db: Session, since: int) -> bool:
+    """True si hubo purga después de `since` (faltarían cambios). MIN(id) por PK."""
+    if since <= 0:
+        return False
+    oldest = db.query(func.min(models.ChatChange.id)).scalar()
+    return oldest is not None and since < oldest - 1
+
+
+def prune_chat_changes(db: Session, older_than_days: int = CHAT_CHANGES_RETENTION_DAYS) -> int:
+    """Borra cambios con más de `older_than_days` días; devuelve cuántos (con commit)."""
+    cutoff = utcnow() - timedelta(days=older_than_days)
+    newest = db.query(func.max(models.ChatChange.id)).scalar()
+    if newest is None:
+        return 0
+    # Se conserva siempre el último: cursor_expired necesita el mínimo vigente
+    deleted = db.query(models.ChatChange).filter(
+        models.ChatChange.created_at < cutoff,
+        models.ChatChange.id < newest
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
@@ -0,0 +1,236 @@
+"""
+Entrega en tiempo real de eventos de chat por WebSocket (GET /chats/ws).
+
+Cada usuario tiene un canal `chat:user:{id}`. Las rutas publican, DESPUÉS del
+commit, a los canales de los participantes: mensaje nuevo, lectura y match.
+Cada WebSocket abierto recibe solo lo de su usuario, así que un canal por
+usuario cubre todas sus conversaciones, incluidas las que se creen con la
+conexión ya abierta.
+
+Hay dos brokers con la misma interfaz (publish / subscribe / unsubscribe):
+- InMemoryBroker: reparte dentro del proceso. Sirve con un solo worker.
+- RedisBroker: PUBLISH/SUBSCRIBE de Redis para varios workers o máquinas.
+  Cada proceso abre una sola conexión de pub/sub y la reparte entre sus
+  colas locales.
+Se elige con CHAT_BROKER=memory|redis. Por defecto usa redis si REDIS_URL es
+redis://... (la misma variable del limiter) y memory en otro caso.
+
+Las colas por conexión son acotadas. Un cliente que no consume pierde
+eventos en lugar de frenar a los demás, y al reconectar se resincroniza por
+REST (GET /chats y GET /chats/{id}/messages).
+"""
+import asyncio
+import json
+import os
+from typing import Dict, Iterable, Optional, Set
+
+import structlog
+
+logger = structlog.get_logger("chat_events")
+
+CHAT_EVENTS_QUEUE_SIZE = int(os.getenv("CHAT_EVENTS_QUEUE_SIZE", "256"))
+
+
+def user_channel(user_id: int) -> str:
+    return f"chat:user:{user_id}"
+
+
+class Subscription:
+    """Cola de eventos (JSON ya serializado) de un canal para una conexión."""
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=CHAT_EVENTS_QUEUE_SIZE)
+
+    async def get(self) -> str:
+        return await self.queue.get()
+
+    def deliver(self, payload: str) -> bool:
+        try:
+            self.queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+
+class _LocalFanout:
+    """Registro canal -> suscripciones del proceso y reparto a sus colas."""
+
+    def __init__(self):
+        self._subs: Dict[str, Set[Subscription]] = {}
+
+    def _add(self, sub: Subscription) -> bool:
+        """Registra `sub`; True si es la primera del canal en este proceso."""
+        subs = self._subs.setdefault(sub.channel, set())
+        first = not subs
+        subs.add(sub)
+        return first
+
+    def _remove(self, sub: Subscription) -> bool:
+        """Quita `sub`; True si era la última del canal en este proceso."""
+        subs = self._subs.get(sub.channel)
+        if not subs or sub not in subs:
+            return False
+        subs.discard(sub)
+        if subs:
+            return False
+        del self._subs[sub.channel]
+        return True
+
+    def _dispatch(self, channel: str, payload: str) -> None:
+        dropped = 0
+        for sub in list(self._subs.get(channel, ())):
+            if not sub.deliver(payload):
+                dropped += 1
+        if dropped:
+            logger.warning("chat_events_dropped", channel=channel, dropped=dropped)
+
+    def connections(self) -> int:
+        return sum(len(subs) for subs in self._subs.values())
+
+
+class InMemoryBroker(_LocalFanout):
+    """Pub/sub dentro del proceso (un solo worker)."""
+
+    async def publish(self, channel: str, payload: str) -> None:
+        self._dispatch(channel, payload)
+
+    async def subscribe(self, channel: str) -> Subscription:
+        sub = Subscription(channel)
+        self._add(sub)
+        return sub
+
+    async def unsubscribe(self, sub: Subscription) -> None:
+        self._remove(sub)
+
+    async def close(self) -> None:
+        self._subs.clear()
+
+
+class RedisBroker(_LocalFanout):
+    """
+    Pub/sub sobre Redis (varios workers). Cada canal se suscribe en Redis una
+    sola vez por proceso, cuando entra su primera conexión local, y se
+    desuscribe cuando sale la última. Una tarea lee la conexión de pub/sub y
+    reparte a las colas locales.
+    """
+
+    def __init__(self, url: str):
+        super().__init__()
+        import redis.asyncio as aioredis
+
+        self._redis = aioredis.from_url(url, decode_responses=True)
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def publish(self, channel: str, payload: str) -> None:
+        await self._redis.publish(channel, payload)
+
+    async def subscribe(self, channel: str) -> Subscription:
+        sub = Subscription(channel)
+        async with self._lock:
+            if self._pubsub is None:
+                self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            if self._add(sub):
+                try:
+                    await self._pubsub.subscribe(channel)
+                except Exception:
+                    self._remove(sub)
+                    raise
+            # listen() termina cuando no quedan canales: se relanza aquí
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.create_task(self._read_loop())
+        return sub
+
+    async def unsubscribe(self, sub: Subscription) -> None:
+        async with self._lock:
+            if self._remove(sub) and self._pubsub is not None:
+                try:
+                    await self._pubsub.unsubscribe(sub.channel)
+                except Exception as e:
+                    logger.error("chat_events_redis_unsubscribe_failed", channel=sub.channel, error=str(e))
+
+    async def _read_loop(self) -> None:
+        try:
+            async for msg in self._pubsub.listen():
+                if msg.get("type") == "message":
+                    self._dispatch(msg["channel"], msg["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("chat_events_redis_reader_failed", error=str(e))
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        await self._redis.aclose()
+        self._subs.clear()
+
+
+def _make_broker():
+    redis_url = os.getenv("REDIS_URL", "memory://")
+    kind = os.getenv("CHAT_BROKER", "redis" if redis_url.startswith(("redis://", "rediss://")) else "memory").lower()
+    if kind == "redis":
+        logger.info("chat_events_broker", broker="redis")
+        return RedisBroker(redis_url)
+    logger.info("chat_events_broker", broker="memory")
+    return InMemoryBroker()
+
+
+_broker = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = _make_broker()
+    return _broker
+
+
+async def start_chat_events() -> None:
+    """En el startup de la app: fija el loop al que publican las rutas sync."""
+    global _loop
+    _loop = asyncio.get_running_loop()
+    get_broker()
+
+
+async def stop_chat_events() -> None:
+    global _broker, _loop
+    _loop = None
+    if _broker is not None:
+        await _broker.close()
+        _broker = None
+
+
+async def _publish_many(channels, payload: str) -> None:
+    broker = get_broker()
+    for channel in channels:
+        try:
+            await broker.publish(channel, payload)
+        except Exception as e:
+            logger.error("chat_events_publish_failed", channel=channel, error=str(e))
+
+
+def publish_chat_event(user_ids: Iterable[int], event: dict) -> None:
+    """
+    Publica `event` en los canales de `user_ids` sin bloquear al llamador.
+    Llamar después del commit. Sirve desde rutas sync (threadpool) y async.
+    Si la app no arrancó el broker (scripts, jobs) no hace nada.
+    """
+    loop = _loop
+    if loop is None or loop.is_closed():
+        return
+    payload = json.dumps(event, default=str, separators=(",", ":"))
+    coro = _publish_many([user_channel(uid) for uid in set(user_ids)], payload)
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        loop.create_task(coro)
+    else:
+        asyncio.run_coroutine_threadsafe(coro, loop)
@@ -0,0 +1,68 @@
+"""
+Motor de compatibilidad sobre las respuestas del quiz (UserCompat.answers).
+
+Cada respuesta se convierte en tokens "pregunta=opción" que se proyectan por
+feature hashing a un vector float32 de ancho fijo (COMPAT_VECTOR_DIM). Cada
+pregunta aporta norma 1 (en preguntas multi se reparte entre sus opciones) y
+el vector final se normaliza, así la compatibilidad entre dos usuarios es un
+producto punto. El vector se calcula al guardar el quiz y se persiste en
+user_compat.vector; el índice de candidatos lo mantiene en una matriz para
+puntuar a todos los candidatos en una sola operación.
+"""
+import hashlib
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# Ancho fijo del vector (persistido: cambiarlo requiere re-codificar)
+COMPAT_VECTOR_DIM = 64
+
+# Compatibilidad cuando alguno de los dos no ha contestado el quiz
+NEUTRAL_COMPAT = 0.5
+
+
+def _bucket(token: str) -> tuple:
+    """(posición, signo) estables del token (no usar hash(): varía por proceso)."""
+    h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+    return h % COMPAT_VECTOR_DIM, (1.0 if (h >> 63) & 1 == 0 else -1.0)
+
+
+def encode_answers(answers: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+    """Vector normalizado de las respuestas; None si no hay respuestas útiles."""
+    vec = np.zeros(COMPAT_VECTOR_DIM, dtype=np.float32)
+    for question, value in (answers or {}).items():
+        options = value if isinstance(value, (list, tuple, set)) else [value]
+        options = [str(o).strip().lower() for o in options if o is not None and str(o).strip()]
+        if not options:
+            continue
+        weight = 1.0 / np.sqrt(len(options))
+        for opt in options:
+            pos, sign = _bucket(f"{str(question).strip().lower()}={opt}")
+            vec[pos] += sign * weight
+
+    norm = float(np.linalg.norm(vec))
+    if norm == 0.0:
+        return None
+    return vec / norm
+
+
+def to_bytes(vec: Optional[np.ndarray]) -> Optional[bytes]:
+    return None if vec is None else np.asarray(vec, dtype="<f4").tobytes()
+
+
+def from_bytes(raw: Optional[bytes]) -> Optional[np.ndarray]:
+    """Vector desde la columna; None si falta o es de otro ancho."""
+    if not raw or len(raw) != COMPAT_VECTOR_DIM * 4:
+        return None
+    return np.frombuffer(raw, dtype="<f4").astype(np.float32)
+
+
+def compatibility(viewer_vec: Optional[np.ndarray], matrix: np.ndarray, has_vec: np.ndarray) -> np.ndarray:
+    """
+    Compatibilidad 0..1 del viewer contra cada fila de `matrix` (coseno
+    recortado a >= 0). NEUTRAL_COMPAT donde alguno no tiene vector.
+    """
+    if viewer_vec is None:
+        return np.full(len(matrix), NEUTRAL_COMPAT, dtype=np.float64)
+    sims = np.clip(matrix @ viewer_vec, 0.0, 1.0).astype(np.float64)
+    return np.where(has_vec, sims, NEUTRAL_COMPAT)
@@ -0,0 +1,76 @@
+"""
+Subidas directas a R2 con URL PUT prefirmada (POST /upload/intent y
+POST /upload/finalize): la API solo decide la key y valida el resultado,
+los bytes nunca pasan por los workers.
+
+Cada tipo de subida define sus content-types (con la extensión de la key)
+y su tamaño máximo; la key siempre la genera el backend con el id del
+usuario (única por subida: nunca se sobreescribe un objeto con URLs firmadas
+vigentes), y finalize comprueba que la key pedida sea de ese usuario.
+"""
+import os
+import re
+import uuid
+from typing import Optional
+
+from .voice_intro import new_voice_intro_key
+
+MAX_PHOTO_UPLOAD_BYTES = int(os.getenv("MAX_PHOTO_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+MAX_VOICE_UPLOAD_BYTES = int(os.getenv("MAX_VOICE_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+
+# Vigencia de la URL PUT: el cliente debe empezar la subida antes de que venza
+UPLOAD_URL_EXPIRES_SECONDS = int(os.getenv("UPLOAD_URL_EXPIRES_SECONDS", "600"))
+
+UPLOAD_KINDS = {
+    "photo": {
+        "types": {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp"},
+        "max_bytes": MAX_PHOTO_UPLOAD_BYTES,
+    },
+    "voice_intro": {
+        "types": {
+            "audio/x-m4a": "m4a",
+            "audio/mp4": "m4a",
+            "audio/aac": "aac",
+            "audio/mpeg": "mp3",
+            "audio/wav": "wav",
+            "audio/webm": "webm",
+        },
+        "max_bytes": MAX_VOICE_UPLOAD_BYTES,
+    },
+    "verification": {
+        "types": {"image/jpeg": "jpg"},
+        "max_bytes": MAX_PHOTO_UPLOAD_BYTES,
+    },
+}
+
+
+def validate_upload(kind: str, content_type: str, size: int) -> Optional[str]:
+    """Mensaje de error si el tipo o tamaño no se permiten para `kind`; None si todo bien."""
+    rules = UPLOAD_KINDS[kind]
+    if content_type not in rules["types"]:
+        return f"Tipo no permitido: {content_type}"
+    if size <= 0 or size > rules["max_bytes"]:
+        return f"Tamaño no permitido (máximo {rules['max_bytes']} bytes)"
+    return None
+
+
+def upload_key(kind: str, user_id: int, content_type: str, verification_id: Optional[int] = None) -> str:
+    """Key destino según las convenciones existentes de cada tipo."""
+    ext = UPLOAD_KINDS[kind]["types"][content_type]
+    if kind == "photo":
+        return f"uploads/user_{user_id}_{uuid.uuid4().hex}.{ext}"
+    if kind == "voice_intro":
+        return new_voice_intro_key(user_id, ext)
+    return f"verifications/{user_id}/{verification_id}_{uuid.uuid4().hex}.jpg"
+
+
+def key_belongs_to(kind: str, key: str, user_id: int, verification_id: Optional[int] = None) -> bool:
+    """True si `key` es una key que upload_key pudo haber generado para este usuario."""
+    exts = "|".join(sorted(set(UPLOAD_KINDS[kind]["types"].values())))
+    if kind == "photo":
+        pattern = rf"uploads/user_{user_id}_[0-9a-f]{{32}}\.({exts})"
+    elif kind == "voice_intro":
+        pattern = rf"users/{user_id}/voice_intro\.[0-9a-f]{{32}}\.({exts})"
+    else:
+        pattern = rf"verifications/{user_id}/{verification_id}_[0-9a-f]{{32}}\.jpg"
+    return re.fullmatch(pattern, key) is not None
@@ -0,0 +1,135 @@
+"""
+Cache LRU en memoria (por proceso) de los ids que cada usuario no debe ver en
+el feed: likes, passes y reportes que hizo, más bloqueos en ambos sentidos.
+
+Cada entrada es un array NumPy int64 ordenado, así el feed aplica las
+exclusiones como diferencia de conjuntos en lugar de subqueries NOT EXISTS.
+Las rutas que escriben likes/passes/blocks/reports actualizan la entrada
+(write-through) después del commit; como red de seguridad cada entrada vence
+a los EXCLUSION_CACHE_TTL_SECONDS.
+
+La carga desde la BD corre sin el lock: lo que llegue por add()/invalidate()
+mientras tanto se registra en la carga en curso (_Load) y se aplica antes de
+guardarla, para no cachear una lectura anterior a ese commit.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable
+
+import numpy as np
+from sqlalchemy import select, union
+from sqlalchemy.orm import Session
+
+from .. import models
+
+EXCLUSION_CACHE_MAX_USERS = int(os.getenv("EXCLUSION_CACHE_MAX_USERS", "10000"))
+EXCLUSION_CACHE_TTL_SECONDS = int(os.getenv("EXCLUSION_CACHE_TTL_SECONDS", "600"))
+
+
+def load_excluded_ids(db: Session, user_id: int) -> np.ndarray:
+    """Una sola consulta UNION con todos los ids excluidos para user_id."""
+    rows = db.execute(
+        union(
+            select(models.Like.liked_id).where(models.Like.liker_id == user_id),
+            select(models.Pass.passed_id).where(models.Pass.passer_id == user_id),
+            select(models.Report.reported_id).where(models.Report.reporter_id == user_id),
+            select(models.Block.blocked_id).where(models.Block.blocker_id == user_id),
+            select(models.Block.blocker_id).where(models.Block.blocked_id == user_id),
+        )
+    ).scalars().all()
+    return np.unique(np.asarray(rows, dtype=np.int64))
+
+
+class _Load:
+    """Carga desde la BD en curso para un usuario."""
+    __slots__ = ("readers", "adds", "invalidated")
+
+    def __init__(self):
+        self.readers = 0
+        self.adds = []            # arrays de add() llegados durante la carga
+        self.invalidated = False  # invalidate() durante la carga: no guardar
+
+
+class ExclusionCache:
+    def __init__(self, max_users: int = EXCLUSION_CACHE_MAX_USERS, ttl_seconds: int = EXCLUSION_CACHE_TTL_SECONDS):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()  # user_id -> (ids, loaded_at)
+        self._loading: "dict[int, _Load]" = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db: Session, user_id: int) -> np.ndarray:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[1] <= self.ttl_seconds:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            load = self._loading.setdefault(user_id, _Load())
+            load.readers += 1
+
+        ids = None
+        try:
+            ids = load_excluded_ids(db, user_id)
+        finally:
+            # Deregistrar y guardar en el mismo bloque: un add() no puede caer en medio
+            with self._lock:
+                load.readers -= 1
+                if load.readers == 0 and self._loading.get(user_id) is load:
+                    del self._loading[user_id]
+                if ids is not None:
+                    ids = self._store(user_id, ids, now, load)
+        return ids
+
+    def _store(self, user_id: int, ids: np.ndarray, now: float, load: _Load) -> np.ndarray:
+        """Guarda una carga con lo que llegó durante ella (con el lock tomado)."""
+        if load.adds:
+            ids = np.union1d(ids, np.concatenate(load.adds))
+        if not load.invalidated:
+            self._entries[user_id] = (ids, now)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return ids
+
+    def add(self, user_id: int, target_ids: Iterable[int]):
+        """Write-through: agrega exclusiones a la entrada y a la carga en curso, si las hay."""
+        extra = np.asarray(list(target_ids), dtype=np.int64)
+        with self._lock:
+            load = self._loading.get(user_id)
+            if load is not None:
+                load.adds.append(extra)
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries[user_id] = (np.union1d(entry[0], extra), entry[1])
+            # Sin entrada ni carga: se cargará completo desde la BD en el próximo get()
+
+    def invalidate(self, user_ids: Iterable[int]):
+        """Descarta entradas (y cargas en curso) cuando una exclusión se borra (unmatch, reset)."""
+        with self._lock:
+            for uid in user_ids:
+                self._entries.pop(uid, None)
+                load = self._loading.pop(uid, None)
+                if load is not None:
+                    load.invalidated = True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for load in self._loading.values():
+                load.invalidated = True
+            self._loading.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Singleton por proceso
+exclusion_cache = ExclusionCache()
@@ -0,0 +1,55 @@
+"""
+Log de impresiones de corta duración (por proceso) para el feed.
+
+Guarda qué candidatos ya se le mostraron a cada usuario en los últimos
+FEED_IMPRESSION_TTL_SECONDS para que un refresh sin swipes no devuelva otra
+vez la misma página. Acotado a FEED_IMPRESSION_MAX_USERS usuarios (LRU).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable
+
+import numpy as np
+
+FEED_IMPRESSION_TTL_SECONDS = int(os.getenv("FEED_IMPRESSION_TTL_SECONDS", "1800"))
+FEED_IMPRESSION_MAX_USERS = int(os.getenv("FEED_IMPRESSION_MAX_USERS", "10000"))
+
+
+class ImpressionLog:
+    def __init__(self, ttl_seconds: int = FEED_IMPRESSION_TTL_SECONDS, max_users: int = FEED_IMPRESSION_MAX_USERS):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._seen: "OrderedDict[int, dict]" = OrderedDict()  # user_id -> {candidate_id: seen_at}
+
+    def seen_ids(self, user_id: int) -> np.ndarray:
+        """Ids vistos por user_id que aún no vencen (ordenados)."""
+        cutoff = time.monotonic() - self.ttl_seconds
+        with self._lock:
+            seen = self._seen.get(user_id)
+            if not seen:
+                return np.empty(0, dtype=np.int64)
+            fresh = {cid: ts for cid, ts in seen.items() if ts >= cutoff}
+            if len(fresh) != len(seen):
+                self._seen[user_id] = fresh
+            return np.fromiter(sorted(fresh), dtype=np.int64, count=len(fresh))
+
+    def record(self, user_id: int, candidate_ids: Iterable[int]):
+        now = time.monotonic()
+        with self._lock:
+            seen = self._seen.setdefault(user_id, {})
+            for cid in candidate_ids:
+                seen[int(cid)] = now
+            self._seen.move_to_end(user_id)
+            while len(self._seen) > self.max_users:
+                self._seen.popitem(last=False)
+
+    def clear(self, user_id: int):
+        with self._lock:
+            self._seen.pop(user_id, None)
+
+
+# Singleton por proceso
+impression_log = ImpressionLog()
@@ -0,0 +1,41 @@
+"""
+Firma de media para clientes (/media/url, /media/urls/batch): qué keys
+puede pedir cada usuario y firma en lote sin duplicados vía el cache
+compartido de r2_client.
+"""
+import os
+from typing import Iterable, List, Tuple
+
+from .r2_client import presigned_get_urls
+
+# Máximo de keys distintas por llamada a /media/urls/batch
+MAX_MEDIA_BATCH_KEYS = int(os.getenv("MAX_MEDIA_BATCH_KEYS", "500"))
+
+# Media de perfiles (visibles para otros usuarios): fotos y voice intros
+PUBLIC_MEDIA_PREFIXES = ("uploads/", "users/")
+
+
+def can_sign_media_key(key: str, user_id: int) -> bool:
+    """
+    Media de perfiles (cualquiera, se ve en el feed) y las selfies de
+    verificación propias. Nada más del bucket (backups, selfies de otros...).
+    """
+    if ".." in key:
+        return False
+    if key.startswith(PUBLIC_MEDIA_PREFIXES):
+        return True
+    return key.startswith(f"verifications/{user_id}/")
+
+
+def sign_media_keys(keys: Iterable[str], user_id: int, expires_seconds: int) -> Tuple[List[dict], List[str]]:
+    """
+    ([{key, url}], denegadas) en el orden de llegada, sin duplicados: valida
+    cada key antes de firmar y firma todas las permitidas en un solo lote.
+    """
+    allowed = []
+    denied = []
+    for key in dict.fromkeys(k for k in keys if k):
+        (allowed if can_sign_media_key(key, user_id) else denied).append(key)
+
+    urls = presigned_get_urls(allowed, expires_seconds=expires_seconds)
+    return [{"key": key, "url": urls.get(key, "")} for key in allowed], denied
@@ -1,4 +1,9 @@
 import os
+import hashlib
+import hmac
+from datetime import datetime, timezone
+from urllib.parse import quote, urlparse
+
 import boto3
 from botocore.config import Config
 
@@ -29,9 +34,77 @@ def _normalize_endpoint(raw: str) -> str:
 
 import logging
 import functools
+import threading
+import time
+from collections import OrderedDict
 
 logger = logging.getLogger("api")
 
+# Cache de URLs firmadas (por proceso)
+SIGNED_URL_CACHE_MAX = int(os.getenv("SIGNED_URL_CACHE_MAX", "20000"))
+# Se deja de servir una URL cuando le queda menos de max(60s, 20% de su vida)
+SIGNED_URL_MIN_MARGIN_SECONDS = 60
+SIGNED_URL_MARGIN_RATIO = 0.2
+
+
+class SignedUrlCache:
+    """
+    LRU acotado de URLs firmadas, clave (key, expires_seconds). Cada entrada
+    se sirve solo hasta un margen de seguridad antes de vencer, para que el
+    cliente siempre reciba una URL con vida útil razonable.
+    """
+
+    def __init__(self, max_entries: int = SIGNED_URL_CACHE_MAX):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # -> (url, usable_until)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def usable_for(expires_seconds: int) -> float:
+        """Segundos que se puede servir una URL recién firmada con esa expiración."""
+        margin = max(SIGNED_URL_MIN_MARGIN_SECONDS, expires_seconds * SIGNED_URL_MARGIN_RATIO)
+        return expires_seconds - margin
+
+    def get(self, key: str, expires_seconds: int):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((key, expires_seconds))
+            if entry is not None and now < entry[1]:
+                self._entries.move_to_end((key, expires_seconds))
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, expires_seconds: int, url: str, usable_seconds: float):
+        if not url or usable_seconds <= 0:
+            return  # No cachear fallos ni URLs de vida muy corta
+        with self._lock:
+            self._entries[(key, expires_seconds)] = (url, time.monotonic() + usable_seconds)
+            self._entries.move_to_end((key, expires_seconds))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+            }
+
+
+# Singleton por proceso
+signed_url_cache = SignedUrlCache()
+
 def _get_env_or_none(key):
     val = os.getenv(key, "").strip()
     return val if val else None
@@ -73,19 +146,202 @@ def upload_fileobj(fileobj, key: str, content_type: str | None = None) -> None:
         ExtraArgs=extra if extra else None,
     )
 
+# Firma por ventanas: la fecha de firma se fija al inicio de la ventana, así
+# la misma key produce la MISMA URL (byte a byte) durante toda la ventana y
+# el cliente/CDN puede cachear la imagen. 0 = firma al segundo.
+PRESIGN_WINDOW_SECONDS = int(os.getenv("PRESIGN_WINDOW_SECONDS", "3600"))
+MAX_PRESIGN_EXPIRES = 7 * 86400  # límite de SigV4
+
+
+class SigV4Presigner:
+    """
+    Prefirmador SigV4 por query string para GET (path-style, como boto3 con
+    endpoint propio) sin pasar por botocore: el trabajo por URL es un
+    SHA-256 y un HMAC. La signing key se deriva una vez por día/región y se
+    reutiliza; lo fijo de la URL (host, scope, prefijo) se arma una vez.
+    """
+
+    def __init__(self, endpoint: str, access_key: str, secret_key: str, region: str, bucket: str):
+        parsed = urlparse(endpoint)
+        self.scheme = parsed.scheme
+        self.host = parsed.netloc
+        self.access_key = access_key
+        self.region = region
+        self.path_prefix = f"/{bucket}/"
+        self._secret = f"AWS4{secret_key}".encode("utf-8")
+        self._lock = threading.Lock()
+        self._key_date = None
+        self._key = None
+
+    @staticmethod
+    def _hmac(key: bytes, msg: str) -> bytes:
+        return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+    def _signing_key(self, datestamp: str) -> bytes:
+        with self._lock:
+            if self._key_date != datestamp:
+                k = self._hmac(self._secret, datestamp)
+                k = self._hmac(k, self.region)
+                k = self._hmac(k, "s3")
+                self._key = self._hmac(k, "aws4_request")
+                self._key_date = datestamp
+            return self._key
+
+    def presign_get_many(self, keys, expires_seconds: int, signed_at: datetime) -> dict:
+        """{key: url} firmadas con la misma fecha (una sola derivación de key)."""
+        amz_date = signed_at.strftime("%Y%m%dT%H%M%SZ")
+        datestamp = amz_date[:8]
+        scope = f"{datestamp}/{self.region}/s3/aws4_request"
+        signing_key = self._signing_key(datestamp)
+
+        query = "&".join([
+            "X-Amz-Algorithm=AWS4-HMAC-SHA256",
+            f"X-Amz-Credential={quote(f'{self.access_key}/{scope}', safe='~')}",
+            f"X-Amz-Date={amz_date}",
+            f"X-Amz-Expires={int(expires_seconds)}",
+            "X-Amz-SignedHeaders=host",
+        ])
+        request_tail = f"\n{query}\nhost:{self.host}\n\nhost\nUNSIGNED-PAYLOAD"
+        sts_head = f"AWS4-HMAC-SHA256\n{amz_date}\n{scope}\n"
+        url_head = f"{self.scheme}://{self.host}"
+
+        urls = {}
+        for key in keys:
+            path = self.path_prefix + quote(key, safe="/~")
+            canonical_hash = hashlib.sha256(f"GET\n{path}{request_tail}".encode("utf-8")).hexdigest()
+            signature = hmac.new(signing_key, (sts_head + canonical_hash).encode("utf-8"), hashlib.sha256).hexdigest()
+            urls[key] = f"{url_head}{path}?{query}&X-Amz-Signature={signature}"
+        return urls
+
+    def presign_get(self, key: str, expires_seconds: int, signed_at: datetime) -> str:
+        return self.presign_get_many([key], expires_seconds, signed_at)[key]
+
+
+@functools.lru_cache()
+def get_presigner() -> SigV4Presigner:
+    endpoint = os.getenv("R2_ENDPOINT", "").strip()
+    access_key = os.getenv("R2_ACCESS_KEY_ID")
+    secret_key = os.getenv("R2_SECRET_ACCESS_KEY")
+    if not all([endpoint, access_key, secret_key]):
+        raise RuntimeError("R2 Credentials not configured.")
+    return SigV4Presigner(
+        _normalize_endpoint(endpoint),
+        access_key,
+        secret_key,
+        os.getenv("R2_REGION", "auto"),
+        _get_bucket_name(),
+    )
+
+
+def current_presign_window() -> int:
+    """
+    Inicio (epoch) de la ventana de firma vigente. Sirve para versionar
+    respuestas que llevan URLs firmadas (ETag, versión de perfil): mientras no
+    cambie, las URLs de una misma key son idénticas. Con firma al segundo se
+    usan cubos de 5 minutos: una respuesta de ese cubo aún tiene URLs vigentes.
+    """
+    window = PRESIGN_WINDOW_SECONDS if PRESIGN_WINDOW_SECONDS > 0 else 300
+    return int(time.time() // window * window)
+
+
+def _signing_time(expires_seconds: int):
+    """
+    (fecha de firma, X-Amz-Expires, segundos que se puede cachear la URL).
+    Con ventana: inicio de la ventana, expiración extendida una ventana para
+    durar al menos expires_seconds desde cualquier momento de ella, y cache
+    hasta que empieza la siguiente. Sin ventana: ahora, al segundo.
+    La misma URL se sirve toda la ventana (y el CDN la cachea): supone keys
+    inmutables, por eso cada subida usa una key nueva (services/direct_upload.py).
+    """
+    now = time.time()
+    if PRESIGN_WINDOW_SECONDS > 0:
+        window_start = int(now // PRESIGN_WINDOW_SECONDS * PRESIGN_WINDOW_SECONDS)
+        return (
+            datetime.fromtimestamp(window_start, tz=timezone.utc),
+            min(expires_seconds + PRESIGN_WINDOW_SECONDS, MAX_PRESIGN_EXPIRES),
+            window_start + PRESIGN_WINDOW_SECONDS - now,
+        )
+    return (
+        datetime.fromtimestamp(int(now), tz=timezone.utc),
+        expires_seconds,
+        SignedUrlCache.usable_for(expires_seconds),
+    )
+
+
 def presigned_get_url(key: str, expires_seconds: int = 900) -> str:
+    cached = signed_url_cache.get(key, expires_seconds)
+    if cached is not None:
+        return cached
     try:
-        client = get_s3_client()
-        bucket = _get_bucket_name()
-        return client.generate_presigned_url(
-            ClientMethod="get_object",
-            Params={"Bucket": bucket, "Key": key},
-            ExpiresIn=expires_seconds,
-        )
+        signed_at, amz_expires, usable = _signing_time(expires_seconds)
+        url = get_presigner().presign_get(key, amz_expires, signed_at)
+        signed_url_cache.put(key, expires_seconds, url, usable)
+        return url
     except Exception as e:
         logger.error(f"Failed to generate presigned URL: {e}")
         return ""
 
+
+def presigned_get_urls(keys, expires_seconds: int = 900) -> dict:
+    """
+    Firma varias keys de una vez (sin duplicados, pasando por el cache).
+    Devuelve {key: url}; las que fallen quedan con "" como en presigned_get_url.
+    """
+    urls = {}
+    missing = []
+    for k in dict.fromkeys(keys):
+        if not k or not isinstance(k, str):
+            continue
+        cached = signed_url_cache.get(k, expires_seconds)
+        if cached is not None:
+            urls[k] = cached
+        else:
+            missing.append(k)
+    if not missing:
+        return urls
+    try:
+        signed_at, amz_expires, usable = _signing_time(expires_seconds)
+        signed = get_presigner().presign_get_many(missing, amz_expires, signed_at)
+    except Exception as e:
+        logger.error(f"Failed to generate presigned URLs: {e}")
+        urls.update({k: "" for k in missing})
+        return urls
+    for k, url in signed.items():
+        signed_url_cache.put(k, expires_seconds, url, usable)
+    urls.update(signed)
+    return urls
+
+
+def presigned_put_url(key: str, content_type: str, content_length: int, expires_seconds: int = 600) -> str:
+    """
+    URL PUT prefirmada para que el cliente suba directo a R2. Content-Type y
+    Content-Length van firmados: el PUT debe mandar exactamente esos valores
+    (R2 no implementa POST policy, así el tamaño queda acotado igual).
+    Lanza si no hay credenciales.
+    """
+    client = get_s3_client()
+    return client.generate_presigned_url(
+        "put_object",
+        Params={
+            "Bucket": _get_bucket_name(),
+            "Key": key,
+            "ContentType": content_type,
+            "ContentLength": int(content_length),
+        },
+        ExpiresIn=expires_seconds,
+    )
+
+
+def head_object(key: str):
+    """{"size", "content_type"} del objeto, o None si no existe o R2 falla."""
+    try:
+        client = get_s3_client()
+        resp = client.head_object(Bucket=_get_bucket_name(), Key=key)
+        return {"size": int(resp.get("ContentLength", 0)), "content_type": resp.get("ContentType") or ""}
+    except Exception:
+        return None
+
+
 def delete_object(key: str) -> None:
     """
     Elimina un objeto del bucket R2.
@@ -112,3 +368,28 @@ def check_object_exists(key: str) -> bool:
     except Exception:
         # 404 Not Found lanza excepción en boto3
         return False
+
+
+def list_object_keys(prefix: str, max_keys: int = 1000):
+    """
+    Keys del bucket que empiezan con `prefix` (una sola llamada
+    list_objects_v2, hasta max_keys). None si R2 falla, para distinguirlo de
+    "no hay nada" ([]).
+    """
+    try:
+        client = get_s3_client()
+        bucket = _get_bucket_name()
+        resp = client.list_objects_v2(Bucket=bucket, Prefix=prefix, MaxKeys=max_keys)
+        return [obj["Key"] for obj in resp.get("Contents", [])]
+    except Exception as e:
+        logger.error(f"Failed to list objects with prefix {prefix}: {e}")
+        return None
+
+
+def iter_object_keys(prefix: str):
+    """Todas las keys bajo `prefix`, paginando list_objects_v2 (lanza si R2 falla)."""
+    client = get_s3_client()
+    paginator = client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=_get_bucket_name(), Prefix=prefix):
+        for obj in page.get("Contents", []):
+            yield obj["Key"]
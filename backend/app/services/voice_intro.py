@@ -0,0 +1,67 @@
+"""
+Localización del voice intro en R2 (users/{id}/voice_intro.{hex}.{ext}; las
+subidas viejas quedaron en users/{id}/voice_intro.{ext}) para reparar
+usuarios que subieron el audio pero no quedó voice_intro_key en BD.
+
+Una sola llamada LIST por usuario en vez de un HEAD por extensión, y un
+marcador persistido (users.voice_intro_checked_at) para no volver a
+consultar R2 en cada GET /users/me mientras no venza VOICE_INTRO_RECHECK_HOURS.
+"""
+import os
+import re
+import uuid
+from datetime import timedelta, timezone
+from typing import Iterable, Optional
+
+from ..security import utcnow
+
+# Extensiones aceptadas al subir (routes/upload.py), en orden de preferencia
+VOICE_INTRO_EXTENSIONS = ("m4a", "mp3", "aac", "mp4", "wav", "webm")
+
+# Cada cuánto se vuelve a buscar el audio de un usuario que no lo tenía
+VOICE_INTRO_RECHECK_HOURS = int(os.getenv("VOICE_INTRO_RECHECK_HOURS", "24"))
+
+_VOICE_INTRO_KEY = re.compile(r"^users/(\d+)/voice_intro\.(?:[0-9a-f]{32}\.)?([a-z0-9]+)$")
+
+
+def voice_intro_prefix(user_id: int) -> str:
+    return f"users/{user_id}/voice_intro."
+
+
+def new_voice_intro_key(user_id: int, ext: str) -> str:
+    """
+    Key nueva en cada subida: las URLs firmadas se fijan a la ventana de
+    firma (y las cachea el CDN), así que regrabar no puede reusar la key.
+    """
+    return f"{voice_intro_prefix(user_id)}{uuid.uuid4().hex}.{ext}"
+
+
+def parse_voice_intro_key(key: str) -> Optional[tuple]:
+    """(user_id, ext) si `key` es un voice intro con extensión aceptada."""
+    m = _VOICE_INTRO_KEY.match(key)
+    if not m or m.group(2) not in VOICE_INTRO_EXTENSIONS:
+        return None
+    return int(m.group(1)), m.group(2)
+
+
+def pick_voice_intro_key(keys: Iterable[str]) -> Optional[str]:
+    """De las keys de un usuario, la de extensión preferida (o None)."""
+    found = {}
+    for key in keys:
+        parsed = parse_voice_intro_key(key)
+        if parsed:
+            found[parsed[1]] = key
+    for ext in VOICE_INTRO_EXTENSIONS:
+        if ext in found:
+            return found[ext]
+    return None
+
+
+def recently_checked(user) -> bool:
+    """True si ya se buscó el audio de `user` hace menos de VOICE_INTRO_RECHECK_HOURS."""
+    checked_at = user.voice_intro_checked_at
+    if checked_at is None:
+        return False
+    if checked_at.tzinfo is None:
+        checked_at = checked_at.replace(tzinfo=timezone.utc)
+    return utcnow() - checked_at < timedelta(hours=VOICE_INTRO_RECHECK_HOURS)
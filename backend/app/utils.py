@@ -1,6 +1,12 @@
+import base64
+import hashlib
+import json
 import re
 from typing import Optional
 
+from starlette.requests import Request
+from starlette.responses import Response
+
 def clean_name(value: Optional[str]) -> Optional[str]:
     """
     Sanitizes a name string by:
@@ -30,3 +36,59 @@ def clean_name(value: Optional[str]) -> Optional[str]:
         return None
 
     return cleaned
+
+
+def encode_cursor(data: dict) -> str:
+    """
+    Cursor opaco para paginación keyset: JSON compacto en base64url sin padding.
+    """
+    raw = json.dumps(data, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    Inverso de encode_cursor. Lanza ValueError si el cursor no es válido.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {e}")
+    if not isinstance(data, dict):
+        raise ValueError("invalid cursor")
+    return data
+
+
+# Los clientes pueden guardar la respuesta pero deben revalidar siempre
+ETAG_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """ETag fuerte a partir de sellos de versión baratos (ids, row_version, conteos)."""
+    raw = "|".join("" if p is None else str(p) for p in parts)
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True si If-None-Match incluye `etag` (o es *); acepta la forma W/"..."."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate == etag or candidate == f"W/{etag}":
+            return True
+    return False
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Deja ETag y Cache-Control en `response`. Si el If-None-Match del request
+    coincide, devuelve un 304 que el endpoint debe regresar tal cual (antes
+    de serializar o firmar nada); si no, None.
+    """
+    headers = {"ETag": etag, "Cache-Control": ETAG_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,26 @@
+"""
+Reparación en bloque de users.voice_intro_key desde R2 (una pasada de
+list_objects_v2 sobre users/), ver app/jobs/voice_intro_backfill.py.
+
+Uso (con R2_* y DATABASE_URL del entorno):
+    python scripts/backfill_voice_intro.py --dry-run
+    python scripts/backfill_voice_intro.py
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.jobs.voice_intro_backfill import run_voice_intro_backfill_job  # noqa: E402
+
+
+def main():
+    stats = run_voice_intro_backfill_job(dry_run="--dry-run" in sys.argv[1:])
+    print(
+        f"objetos={stats['objects']} revisados={stats['checked']} "
+        f"reparados={stats['repaired']}{' (dry run, sin cambios)' if stats['dry_run'] else ''}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Benchmark de la entrega en tiempo real de chat (app/services/chat_events.py y
+GET /chats/ws), con los dos brokers: memory y redis. El de redis usa el
+stand-in de scripts/redis_pubsub_standin.py, o un Redis real si se define
+BENCH_REDIS_URL.
+
+1. Broker solo: CONNECTIONS suscripciones, una por usuario, y EVENTS
+   publicaciones a usuarios al azar. Mide la latencia publish -> entrega en la
+   cola de la conexión y la memoria por suscripción.
+2. Extremo a extremo: levanta la app con uvicorn en este proceso, con una BD
+   SQLite temporal, y abre CONNECTIONS WebSockets autenticados. Manda MESSAGES
+   mensajes con POST /chats/{id}/messages y mide cuánto tarda en llegar el
+   evento al WebSocket del otro participante, que incluye HTTP, el commit y
+   el fan-out.
+Cliente y servidor comparten proceso y CPU, así que las cifras son una cota
+pesimista.
+
+Uso:
+    python scripts/benchmark_chat_ws.py
+    CONNECTIONS=5000 EVENTS=5000 MESSAGES=300 BROKERS=memory python scripts/benchmark_chat_ws.py
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+os.environ.setdefault("JWT_SECRET", "benchmark-chat-ws-" + "x" * 32)
+os.environ["ENV"] = "development"
+os.environ["AUTO_CREATE_TABLES"] = "true"
+os.environ.pop("DATABASE_URL", None)
+os.environ.pop("REDIS_URL", None)  # el limiter se queda en memoria
+os.chdir(tempfile.mkdtemp(prefix="celestya-ws-"))  # ./celestya.db temporal
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from websockets.asyncio.client import connect  # noqa: E402
+
+from app import models  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.enums import AgeBucket  # noqa: E402
+from app.limiter import limiter  # noqa: E402
+from app.main import app  # noqa: E402
+from app.security import create_access_token  # noqa: E402
+from app.services.chat_events import InMemoryBroker, RedisBroker, user_channel  # noqa: E402
+from redis_pubsub_standin import start_standin  # noqa: E402
+
+CONNECTIONS = int(os.getenv("CONNECTIONS", "1000"))
+EVENTS = int(os.getenv("EVENTS", "2000"))
+MESSAGES = int(os.getenv("MESSAGES", "200"))
+BROKERS = os.getenv("BROKERS", "memory,redis").split(",")
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def fmt_ms(values) -> str:
+    ms = [v * 1000 for v in values]
+    return f"p50={statistics.median(ms):.3f} ms  p99={pct(ms, 0.99):.3f} ms  max={max(ms):.3f} ms"
+
+
+async def bench_broker(name: str, broker) -> None:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    t0 = time.perf_counter()
+    subs = [await broker.subscribe(user_channel(uid)) for uid in range(CONNECTIONS)]
+    subscribe_s = time.perf_counter() - t0
+    per_sub = sum(s.size_diff for s in tracemalloc.take_snapshot().compare_to(before, "filename")) / CONNECTIONS
+    tracemalloc.stop()
+
+    latencies = []
+    for _ in range(EVENTS):
+        uid = random.randrange(CONNECTIONS)
+        sent = time.perf_counter()
+        await broker.publish(user_channel(uid), '{"type":"message"}')
+        await subs[uid].get()
+        latencies.append(time.perf_counter() - sent)
+
+    for sub in subs:
+        await broker.unsubscribe(sub)
+    await broker.close()
+    print(
+        f"[broker {name}] {CONNECTIONS} suscripciones en {subscribe_s * 1000:.0f} ms "
+        f"(~{per_sub / 1024:.1f} KiB c/u) | {EVENTS} eventos: {fmt_ms(latencies)}"
+    )
+
+
+def seed_pairs(n: int):
+    """n usuarios en pares (2k, 2k+1) con una conversación por par."""
+    db = SessionLocal()
+    users = [
+        models.User(
+            email=f"ws{i}@example.com", password_hash="x", name=f"ws{i}", birthdate=date(1995, 1, 1),
+            age_bucket=AgeBucket.B_26_45, email_verified=True, interests=[], gallery_photo_keys=[],
+        )
+        for i in range(n - n % 2)
+    ]
+    db.add_all(users)
+    db.flush()
+    convs = []
+    for a, b in zip(users[::2], users[1::2]):
+        conv = models.Conversation(user_a_id=a.id, user_b_id=b.id)
+        db.add(conv)
+        convs.append(conv)
+    db.flush()
+    pairs = [(conv.id, conv.user_a_id, conv.user_b_id) for conv in convs]
+    db.commit()
+    db.close()
+    return pairs
+
+
+async def bench_ws(name: str, pairs) -> None:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", lifespan="on"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    user_ids = [uid for _, a, b in pairs for uid in (a, b)]
+    sockets = {}
+    t0 = time.perf_counter()
+    for uid in user_ids:
+        token = create_access_token(uid)
+        sockets[uid] = await connect(f"ws://127.0.0.1:{port}/chats/ws?token={token}", max_queue=None)
+    connect_s = time.perf_counter() - t0
+
+    latencies = []
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as http:
+        for _ in range(MESSAGES):
+            conv_id, a, b = random.choice(pairs)
+            sender, receiver = random.choice([(a, b), (b, a)])
+            sent = time.perf_counter()
+            r = await http.post(
+                f"/chats/{conv_id}/messages",
+                json={"body": "hola"},
+                headers={"Authorization": f"Bearer {create_access_token(sender)}"},
+            )
+            assert r.status_code == 200, r.text
+            await sockets[receiver].recv()
+            latencies.append(time.perf_counter() - sent)
+            await sockets[sender].recv()  # eco al emisor (otros dispositivos)
+
+    for ws in sockets.values():
+        await ws.close()
+    server.should_exit = True
+    await task
+    print(
+        f"[ws {name}] {len(sockets)} WebSockets abiertos en {connect_s:.2f} s "
+        f"({len(sockets) / connect_s:.0f}/s) | {MESSAGES} mensajes POST -> WS del peer: {fmt_ms(latencies)}"
+    )
+
+
+async def main():
+    limiter.enabled = False  # LIMIT_CHAT frenaría los POST del benchmark
+    standin = await start_standin(port=0)
+    redis_url = os.getenv("BENCH_REDIS_URL") or f"redis://127.0.0.1:{standin.sockets[0].getsockname()[1]}/0"
+
+    for name in BROKERS:
+        await bench_broker(name, InMemoryBroker() if name == "memory" else RedisBroker(redis_url))
+
+    pairs = seed_pairs(CONNECTIONS)
+    for name in BROKERS:
+        # La app toma el broker en su startup (get_broker); se cambia por env
+        os.environ["CHAT_BROKER"] = name
+        if name == "redis":
+            os.environ["REDIS_URL"] = redis_url
+        await bench_ws(name, pairs)
+        os.environ.pop("REDIS_URL", None)
+
+    standin.close()
+    await standin.wait_closed()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""
+Benchmark de /media/urls/batch (services/media_access.sign_media_keys) con
+lotes de 1/50/500 keys (~30% duplicadas, como una galería), contra el
+camino anterior: boto3 generate_presigned_url key por key, sin deduplicar.
+Sin red ni BD: solo CPU de validar y firmar. "frío" limpia el cache de URLs
+antes de cada lote; "tibio" lo reutiliza.
+
+Uso:
+    python scripts/benchmark_media_batch.py
+    SIZES=1,50,500,2000 RUNS=50 python scripts/benchmark_media_batch.py
+"""
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Credenciales de ejemplo: firmar no toca la red
+os.environ.setdefault("R2_ENDPOINT", "https://0123456789abcdef.r2.cloudflarestorage.com")
+os.environ.setdefault("R2_ACCESS_KEY_ID", "AKIDEXAMPLE")
+os.environ.setdefault("R2_SECRET_ACCESS_KEY", "wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY")
+os.environ.setdefault("R2_BUCKET", "celestya-media")
+
+from app.services.media_access import MAX_MEDIA_BATCH_KEYS, sign_media_keys  # noqa: E402
+from app.services.r2_client import _get_bucket_name, get_s3_client, signed_url_cache  # noqa: E402
+
+SIZES = [int(s) for s in os.getenv("SIZES", "1,50,500").split(",")]
+RUNS = int(os.getenv("RUNS", "20"))
+EXPIRES = 900
+
+
+def make_keys(n: int, batch_no: int) -> list:
+    distinct = max(1, int(n * 0.7))
+    base = [f"uploads/user_{batch_no}_{i:06d}.jpg" for i in range(distinct)]
+    return [base[i % distinct] for i in range(n)]
+
+
+def legacy(keys):
+    client = get_s3_client()
+    bucket = _get_bucket_name()
+    for key in keys:
+        client.generate_presigned_url("get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=EXPIRES)
+
+
+def batch(keys):
+    sign_media_keys(keys, 1, EXPIRES)
+
+
+def timed(fn, n: int, clear_cache: bool) -> list:
+    times = []
+    for run in range(RUNS):
+        keys = make_keys(n, run)
+        if clear_cache:
+            signed_url_cache.clear()
+        t0 = time.perf_counter()
+        fn(keys)
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def main():
+    legacy(make_keys(20, 999))  # calentar botocore
+    print(f"runs={RUNS} expires={EXPIRES}s max_batch={MAX_MEDIA_BATCH_KEYS}")
+    print(f"{'keys':>6} {'modo':<16} {'ms/lote':>9} {'µs/key':>9} {'keys/s':>12}")
+    for n in SIZES:
+        if n > MAX_MEDIA_BATCH_KEYS:
+            print(f"{n:>6} (supera MAX_MEDIA_BATCH_KEYS, omitido)")
+            continue
+        signed_url_cache.clear()
+        rows = [
+            ("boto3 por key", timed(legacy, n, True)),
+            ("batch frío", timed(batch, n, True)),
+        ]
+        # tibio: mismas keys una y otra vez
+        keys = make_keys(n, 0)
+        batch(keys)
+        warm = []
+        for _ in range(RUNS):
+            t0 = time.perf_counter()
+            batch(keys)
+            warm.append(time.perf_counter() - t0)
+        rows.append(("batch tibio", warm))
+
+        for name, times in rows:
+            med = statistics.median(times)
+            print(f"{n:>6} {name:<16} {med * 1000:9.3f} {med / n * 1e6:9.2f} {n / med:12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
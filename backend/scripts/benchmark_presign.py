@@ -0,0 +1,81 @@
+"""
+Microbenchmark del costo por URL prefirmada: boto3 generate_presigned_url
+contra SigV4Presigner (services/r2_client), una por una y en lote. Sin red:
+solo CPU de firmar.
+
+Uso:
+    python scripts/benchmark_presign.py
+    N=20000 RUNS=5 python scripts/benchmark_presign.py
+"""
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import boto3
+from botocore.config import Config
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.r2_client import SigV4Presigner  # noqa: E402
+
+N = int(os.getenv("N", "5000"))
+RUNS = int(os.getenv("RUNS", "3"))
+EXPIRES = 900
+
+ENDPOINT = "https://0123456789abcdef.r2.cloudflarestorage.com"
+ACCESS_KEY = "AKIDEXAMPLE"
+SECRET_KEY = "wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY"
+BUCKET = "celestya-media"
+
+
+def per_url_us(fn, keys) -> float:
+    """Mejor de RUNS, en microsegundos por URL."""
+    times = []
+    for _ in range(RUNS):
+        t0 = time.perf_counter()
+        fn(keys)
+        times.append(time.perf_counter() - t0)
+    return min(times) / len(keys) * 1e6
+
+
+def main():
+    keys = [f"uploads/u_{i}/gallery/{i:08x}.jpg" for i in range(N)]
+    client = boto3.client(
+        "s3",
+        region_name="auto",
+        endpoint_url=ENDPOINT,
+        aws_access_key_id=ACCESS_KEY,
+        aws_secret_access_key=SECRET_KEY,
+        config=Config(signature_version="s3v4"),
+    )
+    presigner = SigV4Presigner(ENDPOINT, ACCESS_KEY, SECRET_KEY, "auto", BUCKET)
+    signed_at = datetime.now(timezone.utc).replace(microsecond=0)
+
+    def with_boto3(ks):
+        for k in ks:
+            client.generate_presigned_url("get_object", Params={"Bucket": BUCKET, "Key": k}, ExpiresIn=EXPIRES)
+
+    def one_by_one(ks):
+        for k in ks:
+            presigner.presign_get(k, EXPIRES, signed_at)
+
+    def batched(ks):
+        presigner.presign_get_many(ks, EXPIRES, signed_at)
+
+    with_boto3(keys[:50])  # calentar (carga de modelos de botocore)
+    results = [
+        ("boto3 generate_presigned_url", per_url_us(with_boto3, keys)),
+        ("SigV4Presigner.presign_get", per_url_us(one_by_one, keys)),
+        ("SigV4Presigner.presign_get_many", per_url_us(batched, keys)),
+    ]
+    base = results[0][1]
+    print(f"urls={N:,} runs={RUNS} (mejor corrida)")
+    for name, us in results:
+        print(f"{name:<34} {us:9.2f} µs/url  x{base / us:6.1f}")
+    print(f"p/ feed de 20 tarjetas x 8 fotos: boto3 {base * 160 / 1000:.1f} ms, lote {results[2][1] * 160 / 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
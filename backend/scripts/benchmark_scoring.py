@@ -0,0 +1,109 @@
+"""
+Benchmark del scoring del feed (services/candidate_index.rank) sobre un
+índice sintético en memoria: compatibilidad + intereses + cercanía + actividad para
+todos los candidatos y top-k, sin BD ni HTTP.
+
+Uso:
+    python scripts/benchmark_scoring.py            # 10k, 100k, 1M
+    SIZES=5000,50000 RUNS=20 python scripts/benchmark_scoring.py
+"""
+import os
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.candidate_index import CandidateIndex  # noqa: E402
+from app.services.compat_scoring import encode_answers  # noqa: E402
+
+SIZES = [int(s) for s in os.getenv("SIZES", "10000,100000,1000000").split(",")]
+RUNS = int(os.getenv("RUNS", "10"))
+TOP_K = 21
+MIN_SHARED = int(os.getenv("MIN_SHARED", "0")) or None
+
+QUESTIONS = {
+    "q1_faith": ["low", "mid", "high"],
+    "q2_sabbath": ["flex", "regular", "strict"],
+    "q3_scripture": ["rare", "sometimes", "daily"],
+    "q4_temple": ["future", "sometimes", "priority"],
+    "q5_callings": ["duty", "joy", "balance", "support"],
+    "q6_family": ["soon", "later", "open"],
+}
+
+
+def build_index(n: int, rng: np.random.Generator) -> CandidateIndex:
+    idx = CandidateIndex(ttl_seconds=10**9)
+    idx._reset(n)
+    today = date.today()
+    now = datetime.now(timezone.utc)
+    genders = ["male", "female"]
+    lats = rng.uniform(25.0, 32.0, n)
+    lons = rng.uniform(-106.0, -98.0, n)
+    ages = rng.integers(18, 60, n)
+    idle_h = rng.exponential(72.0, n)
+    # Pocas combinaciones distintas de respuestas, como en la realidad
+    pool = [
+        encode_answers({q: rng.choice(opts).item() for q, opts in QUESTIONS.items()})
+        for _ in range(256)
+    ]
+    answered = rng.random(n) < 0.7
+    # ~5 intereses de 30 por usuario
+    interest_bits = rng.integers(0, 30, (n, 5))
+    masks = np.bitwise_or.reduce(np.left_shift(1, interest_bits), axis=1)
+    for i in range(n):
+        idx._append(
+            i + 1,
+            genders[i % 2], genders[(i + 1) % 2],
+            today - timedelta(days=int(ages[i]) * 365),
+            float(lats[i]), float(lons[i]),
+            True, True,
+            now - timedelta(hours=float(idle_h[i])),
+            int(masks[i]),
+            pool[i % len(pool)] if answered[i] else None,
+        )
+    idx._built_at = time.monotonic()
+    return idx
+
+
+def main():
+    rng = np.random.default_rng(42)
+    print(f"top_k={TOP_K} runs={RUNS} min_shared_interests={MIN_SHARED}")
+    for n in SIZES:
+        t0 = time.perf_counter()
+        idx = build_index(n, rng)
+        build_s = time.perf_counter() - t0
+
+        viewer = 1  # male -> ve mujeres
+        excluded = np.unique(rng.integers(1, n + 1, min(n // 10, 2000)))
+        times = []
+        for _ in range(RUNS):
+            t0 = time.perf_counter()
+            idx.rank(
+                limit=TOP_K,
+                exclude_ids=excluded,
+                exclude_id=viewer,
+                candidate_gender="female",
+                viewer_gender="male",
+                min_age=25,
+                max_age=40,
+                lat=28.7,
+                lon=-100.5,
+                max_distance_km=300,
+                min_shared_interests=MIN_SHARED,
+            )
+            times.append((time.perf_counter() - t0) * 1000)
+
+        p95 = statistics.quantiles(times, n=20)[-1] if len(times) >= 20 else max(times)
+        print(
+            f"users={n:>9,} build={build_s:6.1f}s "
+            f"rank avg={statistics.mean(times):8.2f}ms p95={p95:8.2f}ms min={min(times):8.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Cuenta las consultas SQL de GET /chats con 10 y 200 conversaciones (BD SQLite
+temporal, sin tocar celestya.db): deben ser las mismas sin importar cuántas
+conversaciones haya (sello del ETag + bandeja en una sola consulta).
+El resumen de cada conversación se siembra ya calculado, como lo dejan
+send_message y mark_read.
+También recorre la bandeja paginada con `limit` y revisa orden, último
+mensaje y no leídos contra lo sembrado.
+
+Uso:
+    python scripts/check_chats_queries.py
+    SIZES=10,200,1000 python scripts/check_chats_queries.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("JWT_SECRET", "check-chats-queries-" + "x" * 32)
+os.environ["ENV"] = "development"
+os.environ.pop("DATABASE_URL", None)
+os.chdir(tempfile.mkdtemp(prefix="celestya-chats-"))  # ./celestya.db temporal
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.orm.attributes import flag_modified  # noqa: E402
+
+from app import models  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+from app.enums import AgeBucket  # noqa: E402
+from app.main import app  # noqa: E402
+from app.security import create_access_token  # noqa: E402
+
+SIZES = [int(s) for s in os.getenv("SIZES", "10,200").split(",")]
+MESSAGES_PER_CHAT = 3
+
+
+def seed(db, n: int, tag: str):
+    """Un usuario con `n` conversaciones; la i-ésima con actividad más reciente cuanto mayor i."""
+    def user(email):
+        return models.User(
+            email=email, password_hash="x", name=email.split("@")[0], birthdate=date(1995, 1, 1),
+            age_bucket=AgeBucket.B_26_45, email_verified=True, interests=[], gallery_photo_keys=[],
+        )
+
+    me = user(f"me_{tag}@example.com")
+    peers = [user(f"peer_{tag}_{i}@example.com") for i in range(n)]
+    db.add_all([me, *peers])
+    db.flush()
+
+    base = datetime(2026, 1, 1)
+    expected = []
+    for i, peer in enumerate(peers):
+        at = base + timedelta(minutes=i)
+        conv = models.Conversation(user_a_id=me.id, user_b_id=peer.id, created_at=at, updated_at=at)
+        db.add(conv)
+        db.flush()
+        msgs = []
+        for j in range(MESSAGES_PER_CHAT):
+            sender = peer.id if j % 2 == 0 else me.id
+            msgs.append(models.Message(
+                conversation_id=conv.id, sender_id=sender, body=f"m{j}", created_at=at,
+                read_at=at if i % 2 == 0 else None,
+            ))
+        db.add_all(msgs)
+        db.flush()
+        unread = 0 if i % 2 == 0 else sum(1 for m in msgs if m.sender_id != me.id)
+        conv.last_message_id, conv.last_message_at, conv.unread_a = msgs[-1].id, at, unread
+        flag_modified(conv, "updated_at")  # si no, el UPDATE del resumen aplica onupdate=now()
+        expected.append((conv.id, msgs[-1].id, unread))
+    db.commit()
+    expected.reverse()  # más reciente primero
+    return me.id, expected
+
+
+def main():
+    client = TestClient(app)
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    counts = {}
+    for n in SIZES:
+        db = SessionLocal()
+        me_id, expected = seed(db, n, str(n))
+        db.close()
+        headers = {"Authorization": f"Bearer {create_access_token(me_id)}"}
+
+        statements.clear()
+        r = client.get("/chats", headers=headers)
+        assert r.status_code == 200, r.text
+        sql = [s for s in statements if "conversations" in s or "messages" in s]
+        counts[n] = len(sql)
+        got = [(c["id"], c["last_message"]["id"], c["unread_count"]) for c in r.json()]
+        assert got == expected, "bandeja distinta de lo sembrado"
+
+        r304 = client.get("/chats", headers={**headers, "If-None-Match": r.headers["ETag"]})
+        assert r304.status_code == 304
+
+        # Paginado: recorre todo con limit=7
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 7, **({"cursor": cursor} if cursor else {})}
+            page = client.get("/chats", params=params, headers=headers)
+            assert page.status_code == 200, page.text
+            seen += [c["id"] for c in page.json()]
+            cursor = page.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert seen == [c for c, _, _ in expected], "paginación incompleta o desordenada"
+
+        print(f"{n:>5} conversaciones: {counts[n]} consultas a conversations/messages (paginado OK)")
+
+    assert len(set(counts.values())) == 1, f"el número de consultas crece con las conversaciones: {counts}"
+    print("OK: número de consultas constante")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Verifica que el resumen denormalizado de conversations (last_message_id,
+last_message_at, unread_a, unread_b) coincida con la tabla messages, ver
+app/jobs/conversation_summary_check.py. Sale con código 1 si hay diferencias
+(sin --fix), para usarlo en cron/CI.
+
+Uso (con DATABASE_URL del entorno):
+    python scripts/check_conversation_summary.py
+    python scripts/check_conversation_summary.py --fix
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.jobs.conversation_summary_check import run_conversation_summary_check_job  # noqa: E402
+
+
+def main():
+    fix = "--fix" in sys.argv[1:]
+    stats = run_conversation_summary_check_job(fix=fix)
+    print(
+        f"revisadas={stats['checked']} inconsistentes={stats['inconsistent']}"
+        f"{' (corregidas)' if fix and stats['inconsistent'] else ''}"
+    )
+    if stats["sample"]:
+        print(f"ids: {stats['sample']}")
+    if stats["inconsistent"] and not fix:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Comprueba (BD SQLite temporal, sin tocar celestya.db) que GET /matches/suggested
+siga más allá de la cabeza precalculada (feed_candidates) cuando los filtros
+del request dejan pocos candidatos en ella: todas las páginas salvo la última
+vienen llenas, no se repiten ids, next_cursor solo es null al final y el
+recorrido completo da el mismo conjunto que el feed en vivo. Se corre con el
+índice en memoria y con la ruta SQL.
+
+Uso:
+    python scripts/check_feed_precompute_handoff.py
+    CANDIDATES=600 python scripts/check_feed_precompute_handoff.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("JWT_SECRET", "check-feed-handoff-" + "x" * 32)
+os.environ["ENV"] = "development"
+os.environ["FEED_PRECOMPUTE_MAX_CANDIDATES"] = os.getenv("HEAD", "30")
+os.environ.pop("DATABASE_URL", None)
+os.chdir(tempfile.mkdtemp(prefix="celestya-feed-"))  # ./celestya.db temporal
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import models  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.enums import AgeBucket  # noqa: E402
+from app.main import app  # noqa: E402
+from app.routes import matches  # noqa: E402
+from app.security import create_access_token  # noqa: E402
+from app.services.candidate_index import candidate_index  # noqa: E402
+from app.services.impressions import impression_log  # noqa: E402
+
+CANDIDATES = int(os.getenv("CANDIDATES", "200"))
+# Restrictivos: ~1/3 pasa la edad y ~2/3 la distancia
+FILTERS = {"min_age": 35, "max_distance_km": 50}
+
+
+def seed(db) -> int:
+    def user(email, gender, birthdate, lat, lon):
+        return models.User(
+            email=email, password_hash="x", name=email.split("@")[0], birthdate=birthdate,
+            age_bucket=AgeBucket.B_26_45, gender=gender, lat=lat, lon=lon, email_verified=True,
+            profile_photo_key=f"uploads/{email}.png", interests=[], gallery_photo_keys=[],
+        )
+
+    me = user("me@example.com", "male", date(1990, 1, 1), 25.67, -100.31)
+    db.add(me)
+    for i in range(CANDIDATES):
+        far = i % 3 == 0
+        db.add(user(
+            f"c{i}@example.com", "female", date(1970 + i % 30, 1, 1),
+            25.67 + (2.0 if far else 0.01 * (i % 10)), -100.31,
+        ))
+    db.commit()
+    return me.id
+
+
+def walk(client: TestClient, user_id: int) -> tuple:
+    """Recorre el feed completo; devuelve (ids, tamaños de página, cursores null antes del final)."""
+    impression_log.clear(user_id)
+    headers = {"Authorization": f"Bearer {create_access_token(str(user_id))}"}
+    ids, sizes, cursor = [], [], None
+    while True:
+        params = {**FILTERS, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/matches/suggested", params=params, headers=headers).json()
+        ids += [m["id"] for m in body["matches"]]
+        sizes.append(len(body["matches"]))
+        cursor = body["next_cursor"]
+        if not cursor or len(sizes) > CANDIDATES:
+            return ids, sizes
+
+
+def check(client: TestClient, user_id: int, label: str) -> bool:
+    matches.FEED_PRECOMPUTE_ENABLED = False
+    live, _ = walk(client, user_id)
+    matches.FEED_PRECOMPUTE_ENABLED = True
+    ids, sizes = walk(client, user_id)
+
+    full_pages = all(n == matches.PAGE_SIZE for n in sizes[:-1])
+    ok = full_pages and len(ids) == len(set(ids)) and set(ids) == set(live) and len(sizes) > 1
+    print(f"{'OK ' if ok else 'MAL'} {label}: páginas {sizes}, servidos {len(ids)} "
+          f"(únicos {len(set(ids))}), en vivo {len(live)}")
+    return ok
+
+
+def main():
+    client = TestClient(app)
+    with client:  # startup: crea las tablas en la BD temporal
+        db = SessionLocal()
+        try:
+            user_id = seed(db)
+            candidate_index.invalidate()
+            candidate_index.ensure_fresh(db)
+            me = db.get(models.User, user_id)
+            head = matches.recompute_user_feed(db, me)
+        finally:
+            db.close()
+        print(f"cabeza precalculada: {head} de {CANDIDATES} candidatos, filtros {FILTERS}")
+
+        ok = check(client, user_id, "índice en memoria")
+        matches.CANDIDATE_INDEX_ENABLED = False
+        ok &= check(client, user_id, "SQL")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Revisa con EXPLAIN QUERY PLAN (BD SQLite temporal, sin tocar celestya.db) que
+las páginas de GET /chats/{id}/messages se resuelvan como rango sobre
+idx_messages_conversation_id_id, sin ordenar en memoria:
+primera página, hacia atrás (before_id), hacia adelante (after_id) y rango
+(after_id + before_id). Además recorre el historial en ambos sentidos contra
+lo sembrado y comprueba que `limit` fuera de rango da 422.
+
+Uso:
+    python scripts/explain_messages_pagination.py
+    MESSAGES=5000 python scripts/explain_messages_pagination.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("JWT_SECRET", "explain-messages-" + "x" * 32)
+os.environ["ENV"] = "development"
+os.environ.pop("DATABASE_URL", None)
+os.chdir(tempfile.mkdtemp(prefix="celestya-messages-"))  # ./celestya.db temporal
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+from app import models  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.enums import AgeBucket  # noqa: E402
+from app.main import app  # noqa: E402
+from app.routes.chats import MAX_MESSAGES_PAGE, _messages_page_query  # noqa: E402
+from app.security import create_access_token  # noqa: E402
+
+MESSAGES = int(os.getenv("MESSAGES", "500"))
+INDEX = "idx_messages_conversation_id_id"
+
+
+def seed(db):
+    """Dos conversaciones intercaladas para que el filtro por conversación importe."""
+    def user(email):
+        return models.User(
+            email=email, password_hash="x", name=email.split("@")[0], birthdate=date(1995, 1, 1),
+            age_bucket=AgeBucket.B_26_45, email_verified=True, interests=[], gallery_photo_keys=[],
+        )
+
+    me, peer, other = user("me@example.com"), user("peer@example.com"), user("other@example.com")
+    db.add_all([me, peer, other])
+    db.flush()
+    conv = models.Conversation(user_a_id=me.id, user_b_id=peer.id)
+    noise = models.Conversation(user_a_id=peer.id, user_b_id=other.id)
+    db.add_all([conv, noise])
+    db.flush()
+    for i in range(MESSAGES):
+        db.add(models.Message(conversation_id=conv.id, sender_id=me.id, body=f"m{i}"))
+        db.add(models.Message(conversation_id=noise.id, sender_id=peer.id, body=f"n{i}"))
+    db.commit()
+    ids = [
+        m.id for m in db.query(models.Message.id)
+        .filter(models.Message.conversation_id == conv.id).order_by(models.Message.id)
+    ]
+    return me.id, conv.id, ids
+
+
+def plan(db, query) -> list:
+    compiled = query.statement.compile(db.bind, compile_kwargs={"literal_binds": True})
+    return [row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+
+
+def check_plans(db, chat_id: int, ids: list) -> bool:
+    mid, quarter = ids[len(ids) // 2], ids[len(ids) // 4]
+    cases = {
+        "primera página": dict(),
+        "before_id": dict(before_id=mid),
+        "after_id": dict(after_id=mid),
+        "after_id + before_id": dict(after_id=quarter, before_id=mid),
+    }
+    ok = True
+    for name, kwargs in cases.items():
+        steps = plan(db, _messages_page_query(db, chat_id, limit=20, **kwargs))
+        uses_index = any(INDEX in s and "SEARCH" in s for s in steps)
+        sorts = any("TEMP B-TREE" in s for s in steps)
+        good = uses_index and not sorts
+        ok &= good
+        print(f"{'OK ' if good else 'MAL'} {name:<22} {' | '.join(steps)}")
+    return ok
+
+
+def check_api(client: TestClient, user_id: int, chat_id: int, ids: list) -> bool:
+    headers = {"Authorization": f"Bearer {create_access_token(str(user_id))}"}
+    url = f"/chats/{chat_id}/messages"
+
+    backward, before = [], None
+    while True:
+        params = {"limit": MAX_MESSAGES_PAGE, **({"before_id": before} if before else {})}
+        page = client.get(url, params=params, headers=headers).json()
+        if not page:
+            break
+        backward += [m["id"] for m in page]
+        before = page[-1]["id"]
+
+    forward, after = [], ids[0] - 1
+    while True:
+        page = client.get(url, params={"limit": 37, "after_id": after}, headers=headers).json()
+        if not page:
+            break
+        forward += [m["id"] for m in page]
+        after = page[-1]["id"]
+
+    bad_limits = [
+        client.get(url, params={"limit": value}, headers=headers).status_code
+        for value in (0, MAX_MESSAGES_PAGE + 1)
+    ]
+    ok = backward == ids[::-1] and forward == ids and bad_limits == [422, 422]
+    print(f"{'OK ' if ok else 'MAL'} API: hacia atrás {len(backward)}, hacia adelante {len(forward)}, "
+          f"limit fuera de rango -> {bad_limits}")
+    return ok
+
+
+def main():
+    client = TestClient(app)
+    with client:  # startup: crea las tablas en la BD temporal
+        db = SessionLocal()
+        try:
+            user_id, chat_id, ids = seed(db)
+            db.execute(text("ANALYZE"))
+            ok = check_plans(db, chat_id, ids)
+        finally:
+            db.close()
+        ok &= check_api(client, user_id, chat_id, ids)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
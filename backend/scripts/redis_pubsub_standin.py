@@ -0,0 +1,128 @@
+"""
+Servidor mínimo que habla el protocolo de Redis (RESP2, y RESP3 tras HELLO 3,
+que es lo que negocia redis-py) solo para pub/sub: PING, SUBSCRIBE,
+UNSUBSCRIBE, PUBLISH (y responde OK a CLIENT/SELECT). Sirve
+para probar RedisBroker (app/services/chat_events.py) en local sin instalar
+Redis; no guarda datos ni implementa nada más.
+
+Uso:
+    python scripts/redis_pubsub_standin.py --port 6390
+    REDIS_URL=redis://127.0.0.1:6390/0 CHAT_BROKER=redis uvicorn app.main:app
+
+También se puede importar (ver scripts/benchmark_chat_ws.py):
+    server = await start_standin(port=0)
+"""
+import argparse
+import asyncio
+from typing import Dict, Set
+
+
+def _bulk(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _array(*items, kind: bytes = b"*") -> bytes:
+    """Arreglo RESP; kind=b">" para push de RESP3 (mensajes de pub/sub)."""
+    out = [kind + b"%d\r\n" % len(items)]
+    for item in items:
+        out.append(b":%d\r\n" % item if isinstance(item, int) else _bulk(item))
+    return b"".join(out)
+
+
+class PubSubStandin:
+    def __init__(self):
+        self.channels: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+        self.push_kind: Dict[asyncio.StreamWriter, bytes] = {}
+
+    async def _read_command(self, reader: asyncio.StreamReader):
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.strip().split()  # comando inline (telnet / redis-cli)
+        args = []
+        for _ in range(int(line[1:])):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscribed: Set[bytes] = set()
+        self.push_kind[writer] = b"*"
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                if not args:
+                    continue
+                cmd, rest = args[0].upper(), args[1:]
+                push = self.push_kind[writer]
+                if cmd == b"HELLO":
+                    proto = int(rest[0]) if rest else 2
+                    self.push_kind[writer] = b">" if proto == 3 else b"*"
+                    if proto == 3:
+                        writer.write(b"%1\r\n+proto\r\n:3\r\n")
+                    else:
+                        writer.write(_array(b"proto", 2))
+                elif cmd == b"PING":
+                    writer.write(_array(b"pong", b"", kind=push) if subscribed else b"+PONG\r\n")
+                elif cmd == b"SUBSCRIBE":
+                    for channel in rest:
+                        subscribed.add(channel)
+                        self.channels.setdefault(channel, set()).add(writer)
+                        writer.write(_array(b"subscribe", channel, len(subscribed), kind=push))
+                elif cmd == b"UNSUBSCRIBE":
+                    targets = rest or sorted(subscribed)
+                    if not targets:
+                        writer.write(_array(b"unsubscribe", None, 0, kind=push))
+                    for channel in targets:
+                        subscribed.discard(channel)
+                        self.channels.get(channel, set()).discard(writer)
+                        writer.write(_array(b"unsubscribe", channel, len(subscribed), kind=push))
+                elif cmd == b"PUBLISH" and len(rest) == 2:
+                    channel, message = rest
+                    receivers = list(self.channels.get(channel, ()))
+                    for target in receivers:
+                        target.write(_array(b"message", channel, message, kind=self.push_kind[target]))
+                    writer.write(b":%d\r\n" % len(receivers))
+                elif cmd in (b"CLIENT", b"SELECT"):
+                    writer.write(b"+OK\r\n")
+                else:
+                    writer.write(b"-ERR unknown command '%s'\r\n" % cmd.lower())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in subscribed:
+                self.channels.get(channel, set()).discard(writer)
+            self.push_kind.pop(writer, None)
+            writer.close()
+
+
+async def start_standin(host: str = "127.0.0.1", port: int = 6390) -> asyncio.AbstractServer:
+    """Arranca el servidor en el loop actual; port=0 elige uno libre."""
+    return await asyncio.start_server(PubSubStandin().handle, host, port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in de Redis solo para pub/sub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+
+    async def serve():
+        server = await start_standin(args.host, args.port)
+        print(f"pub/sub stand-in en redis://{args.host}:{args.port}/0")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
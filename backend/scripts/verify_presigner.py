@@ -0,0 +1,77 @@
+"""
+Verifica que SigV4Presigner (services/r2_client) produzca byte a byte la
+misma URL que boto3 generate_presigned_url para las mismas credenciales,
+fecha de firma y expiración (keys con espacios, unicode y símbolos). No
+necesita red ni credenciales reales.
+
+Uso:
+    python scripts/verify_presigner.py
+"""
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
+
+import boto3
+from botocore.config import Config
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.r2_client import SigV4Presigner  # noqa: E402
+
+ENDPOINT = "https://0123456789abcdef.r2.cloudflarestorage.com"
+ACCESS_KEY = "AKIDEXAMPLE"
+SECRET_KEY = "wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY"
+BUCKET = "celestya-media"
+
+KEYS = [
+    "uploads/a.jpg",
+    "uploads/u_1/gallery/3f2a.webp",
+    "voice/u_42/intro.m4a",
+    "uploads/con espacio (1).jpg",
+    "uploads/ñandú~tilde+plus&amp=eq.png",
+    "uploads/emoji-😀.jpg",
+    "uploads//doble//slash.jpg",
+]
+CASES = [
+    (datetime(2026, 10, 17, 13, 0, 0, tzinfo=timezone.utc), 900),
+    (datetime(2026, 10, 17, 23, 59, 59, tzinfo=timezone.utc), 4500),
+    (datetime(2026, 12, 31, 0, 0, 0, tzinfo=timezone.utc), 7 * 86400),
+]
+
+
+def boto3_url(client, key: str, expires: int, signed_at: datetime) -> str:
+    with mock.patch("botocore.auth.get_current_datetime", return_value=signed_at.replace(tzinfo=None)):
+        return client.generate_presigned_url(
+            "get_object", Params={"Bucket": BUCKET, "Key": key}, ExpiresIn=expires
+        )
+
+
+def main():
+    failures = 0
+    for region in ["auto", "us-east-1"]:
+        client = boto3.client(
+            "s3",
+            region_name=region,
+            endpoint_url=ENDPOINT,
+            aws_access_key_id=ACCESS_KEY,
+            aws_secret_access_key=SECRET_KEY,
+            config=Config(signature_version="s3v4"),
+        )
+        presigner = SigV4Presigner(ENDPOINT, ACCESS_KEY, SECRET_KEY, region, BUCKET)
+        for signed_at, expires in CASES + [(CASES[0][0] + timedelta(days=1), 900)]:
+            batch = presigner.presign_get_many(KEYS, expires, signed_at)
+            for key in KEYS:
+                expected = boto3_url(client, key, expires, signed_at)
+                for got in (batch[key], presigner.presign_get(key, expires, signed_at)):
+                    if got != expected:
+                        failures += 1
+                        print(f"❌ {region} {signed_at.isoformat()} {key!r}\n   boto3: {expected}\n   ours:  {got}")
+
+    total = 2 * (len(CASES) + 1) * len(KEYS) * 2
+    print(f"{total - failures}/{total} URLs idénticas a boto3")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()